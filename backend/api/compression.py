@@ -0,0 +1,41 @@
+"""
+响应压缩
+客户端支持gzip且响应体超过阈值时压缩JSON/文本响应；流式响应（SSE）和文件响应不处理
+"""
+import gzip
+
+from flask import Blueprint, request
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+
+
+def create_compression_blueprint(min_size=1024, level=6):
+    """
+    创建压缩蓝图，为整个应用注册响应压缩
+
+    Args:
+        min_size: 小于该字节数的响应不压缩（压缩收益不抵开销）
+        level: gzip压缩级别（1-9）
+    """
+    compression_bp = Blueprint('compression', __name__)
+
+    @compression_bp.after_app_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or request.method == 'HEAD' or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if not request.accept_encodings['gzip']:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    return compression_bp
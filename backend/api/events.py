@@ -0,0 +1,71 @@
+"""
+事件推送API路由（SSE）
+- /api/events/session/<id>: 单个会话的新对话轮次、评分任务进度、会话过期/删除
+- /api/events/dashboard: 教师看板，会话创建/活动/评分完成/过期/删除
+客户端用EventSource订阅，断线重连时浏览器自动带上Last-Event-ID续传
+"""
+import json
+
+from flask import Blueprint, Response, request, stream_with_context
+
+from backend.utils.response import APIResponse
+from backend.models.sp import patient_manager
+from backend.services.event_hub import event_hub, session_channel, DASHBOARD_CHANNEL
+
+
+def _last_seq():
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('since', -1, type=int)
+    return last_event_id
+
+
+def _stream(subscription):
+    def generate():
+        # 先发送重连间隔，客户端和中间代理尽快确认连接建立
+        yield "retry: 3000\n\n"
+        for event in subscription:
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            payload = json.dumps(event["data"], ensure_ascii=False)
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # 客户端断开时（含流尚未开始）释放订阅
+    response.call_on_close(subscription.close)
+    return response
+
+
+def create_events_blueprint(keepalive=15.0):
+    """创建事件推送蓝图"""
+    events_bp = Blueprint('events', __name__)
+
+    @events_bp.route('/api/events/session/<session_id>', methods=['GET'])
+    def session_events(session_id):
+        """订阅单个会话的事件"""
+        if not patient_manager.session_exists(session_id):
+            return APIResponse.error(f"会话 {session_id} 不存在", 404)
+        subscription = event_hub.subscribe(session_channel(session_id), _last_seq(), keepalive)
+        if subscription is None:
+            return APIResponse.error("推送连接数已满，请改用轮询", 503)
+        return _stream(subscription)
+
+    @events_bp.route('/api/events/dashboard', methods=['GET'])
+    def dashboard_events():
+        """订阅教师看板事件"""
+        subscription = event_hub.subscribe(DASHBOARD_CHANNEL, _last_seq(), keepalive)
+        if subscription is None:
+            return APIResponse.error("推送连接数已满，请改用轮询", 503)
+        return _stream(subscription)
+
+    @events_bp.route('/api/events/stats', methods=['GET'])
+    def events_stats():
+        """推送频道与订阅者数量"""
+        return APIResponse.success(event_hub.stats(), "获取推送统计成功")
+
+    return events_bp
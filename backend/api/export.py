@@ -0,0 +1,78 @@
+"""
+会话导出API路由
+- /api/export/sessions: 批量导出（按预设病例、病人姓名、疾病筛选，或用 session_ids 指定）
+- /api/export/session/<id>: 导出单个会话
+format 参数: jsonl（默认）/ jsonl.gz / parquet，响应为流式下载
+"""
+import time
+
+from flask import Blueprint, Response, request, stream_with_context
+
+from utils.response import APIResponse
+from backend.models.sp import patient_manager
+from backend.services.export_service import EXPORT_FORMATS, resolve_format, iter_export
+
+
+def _export_response(session_ids, requested_format):
+    export_format = resolve_format(requested_format)
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"sp-sessions-{time.strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return Response(
+        stream_with_context(iter_export(session_ids, export_format)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            # 请求parquet但服务器未安装pyarrow时为jsonl.gz
+            'X-Export-Format': export_format,
+            'X-Export-Sessions': str(len(session_ids))
+        }
+    )
+
+
+def create_export_blueprint(session_manager):
+    """创建导出蓝图"""
+    export_bp = Blueprint('export', __name__)
+
+    @export_bp.route('/api/export/sessions', methods=['GET'])
+    def export_sessions():
+        """
+        批量导出会话（按最后活动时间倒序）
+
+        查询参数: format；session_ids 逗号分隔的会话ID；
+        不指定 session_ids 时按 preset、patient_name、disease 筛选全部会话
+        """
+        try:
+            export_format = request.args.get('format', 'jsonl')
+            if request.args.get('session_ids'):
+                session_ids = [s for s in request.args['session_ids'].split(',') if s]
+                missing = [s for s in session_ids if not patient_manager.session_exists(s)]
+                if missing:
+                    return APIResponse.error(f"会话不存在: {', '.join(missing[:10])}", 404)
+            else:
+                _, sessions = session_manager.query_sessions(
+                    preset_file=request.args.get('preset') or None,
+                    patient_name=request.args.get('patient_name') or None,
+                    disease=request.args.get('disease') or None
+                )
+                session_ids = [s["session_id"] for s in sessions]
+            return _export_response(session_ids, export_format)
+
+        except ValueError as e:
+            return APIResponse.error(str(e), 400)
+        except Exception as e:
+            return APIResponse.error(f"导出会话失败: {str(e)}")
+
+    @export_bp.route('/api/export/session/<session_id>', methods=['GET'])
+    def export_session(session_id):
+        """导出单个会话"""
+        try:
+            if not patient_manager.session_exists(session_id):
+                return APIResponse.error(f"会话 {session_id} 不存在", 404)
+            return _export_response([session_id], request.args.get('format', 'jsonl'))
+
+        except ValueError as e:
+            return APIResponse.error(str(e), 400)
+        except Exception as e:
+            return APIResponse.error(f"导出会话失败: {str(e)}")
+
+    return export_bp
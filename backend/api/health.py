@@ -1,16 +1,43 @@
 """
 健康检查API路由
+- /api/health/live: 存活检查，进程能处理请求即返回200，不做任何其他工作
+- /api/health/ready: 就绪检查，启动预热完成前和优雅停止期间返回503
+- /api/health: 详细状态（清理过期会话、熔断状态）
 """
 from flask import Blueprint
 from datetime import datetime
 
 from utils.response import APIResponse
+from engine.circuit_breaker import get_all_breakers
+from backend.services.warmup_service import warmup_state
 
 
 def create_health_blueprint(session_manager):
     """创建健康检查蓝图"""
     health_bp = Blueprint('health', __name__)
     
+    @health_bp.route('/api/health/live', methods=['GET'])
+    def liveness():
+        """存活检查"""
+        return APIResponse.success({"status": "alive"}, "服务存活")
+    
+    @health_bp.route('/api/health/ready', methods=['GET'])
+    def readiness():
+        """
+        就绪检查：预热完成前、必需的预热步骤失败时返回503及各步骤进度，优雅停止期间同样返回503；
+        其他步骤（如模型连接）失败时仍就绪，在 failed_steps 中列出
+        """
+        warmup = warmup_state.to_dict()
+        if warmup["draining"]:
+            return APIResponse.error("服务正在停止", 503, warmup)
+        if not warmup["ready"]:
+            if warmup["finished"]:
+                return APIResponse.error(f"服务预热失败: {', '.join(warmup['failed_steps'])}", 503, warmup)
+            return APIResponse.error("服务预热中", 503, warmup)
+        if warmup["failed_steps"]:
+            return APIResponse.success(warmup, f"服务已就绪（预热步骤失败: {', '.join(warmup['failed_steps'])}）")
+        return APIResponse.success(warmup, "服务已就绪")
+    
     @health_bp.route('/api/health', methods=['GET'])
     def health_check():
         """健康检查接口"""
@@ -19,8 +46,13 @@ def create_health_blueprint(session_manager):
         # 清理过期会话
         expired_count = session_manager.clean_expired_sessions()
         
+        # 模型服务熔断状态：任一熔断器断开时评分会使用本地降级评估
+        breakers = get_all_breakers()
+        degraded = any(b["state"] != "closed" for b in breakers)
+        
         health_info = {
-            "status": "running",
+            "status": (("degraded" if degraded else "running") if warmup_state.ready
+                       else "warmup_failed" if warmup_state.finished else "warming_up"),
             "timestamp": datetime.now().isoformat(),
             "active_sessions": session_manager.get_session_count(),
             "expired_sessions_cleaned": expired_count,
@@ -28,6 +60,10 @@ def create_health_blueprint(session_manager):
                 "debug": current_app.config.get('DEBUG', False),
                 "model_name": current_app.config.get('MODEL_NAME', 'unknown'),
                 "max_sessions": current_app.config.get('MAX_SESSIONS', 100)
+            },
+            "model_provider": {
+                "degraded": degraded,
+                "circuit_breakers": breakers
             }
         }
         return APIResponse.success(health_info, "服务正常运行")
@@ -0,0 +1,46 @@
+"""
+指标API路由
+/metrics 为Prometheus文本格式，/api/metrics 为带分位数的JSON快照
+"""
+import time
+
+from flask import Blueprint, Response, g, request
+
+from utils.response import APIResponse
+from backend.models.sp import patient_manager
+from observability.metrics import REGISTRY, HTTP_REQUEST_SECONDS, ACTIVE_SESSIONS
+
+
+def create_metrics_blueprint():
+    """创建指标蓝图，同时为整个应用注册请求耗时统计"""
+    metrics_bp = Blueprint('metrics', __name__)
+
+    ACTIVE_SESSIONS.set_function(lambda: patient_manager.session_count)
+
+    @metrics_bp.before_app_request
+    def start_request_timer():
+        g._request_start = time.perf_counter()
+
+    @metrics_bp.after_app_request
+    def record_request_latency(response):
+        start = g.pop('_request_start', None)
+        if start is not None:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                blueprint=request.blueprint or "app",
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    @metrics_bp.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus文本格式指标"""
+        return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @metrics_bp.route('/api/metrics', methods=['GET'])
+    def metrics_summary():
+        """指标快照（直方图给出p50/p95/p99）"""
+        return APIResponse.success(REGISTRY.snapshot(), "获取指标成功")
+
+    return metrics_bp
@@ -3,9 +3,16 @@
 提供AI驱动的评分报告和分析功能
 """
 
-from flask import Blueprint, request, jsonify
+import json
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from backend.utils.response import APIResponse
-from models.sp import patient_manager
+from backend.models.sp import patient_manager
+from backend.services.report_job_service import report_job_manager
+from backend.services.analytics_service import analytics_store
+
+# 批量评分并发AI调用数上限
+MAX_BATCH_WORKERS = 32
 
 
 def create_scoring_blueprint():
@@ -26,6 +33,110 @@ def create_scoring_blueprint():
         except Exception as e:
             return APIResponse.error(f"获取评分报告失败: {str(e)}")
     
+    @scoring_bp.route('/api/scoring/report/<session_id>/jobs', methods=['POST'])
+    def start_report_job(session_id):
+        """启动异步评分报告任务，返回任务ID"""
+        try:
+            sp = patient_manager.get_session(session_id)
+            if not sp:
+                return APIResponse.error("会话不存在")
+            
+            job = report_job_manager.submit(session_id, sp)
+            return APIResponse.success(job.to_dict(), "评分任务已启动")
+            
+        except Exception as e:
+            return APIResponse.error(f"启动评分任务失败: {str(e)}")
+    
+    @scoring_bp.route('/api/scoring/jobs/<job_id>', methods=['GET'])
+    def get_report_job(job_id):
+        """查询评分任务状态和进度，完成后附带报告"""
+        job = report_job_manager.get_job(job_id)
+        if not job:
+            return APIResponse.error("评分任务不存在", 404)
+        
+        return APIResponse.success(job.to_dict(include_result=job.is_finished), "获取评分任务成功")
+    
+    @scoring_bp.route('/api/scoring/jobs/<job_id>/stream', methods=['GET'])
+    def stream_report_job(job_id):
+        """以SSE推送评分任务的部分结果"""
+        job = report_job_manager.get_job(job_id)
+        if not job:
+            return APIResponse.error("评分任务不存在", 404)
+        
+        # 支持EventSource断线重连时从上次事件之后继续
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+        if last_event_id is None:
+            last_event_id = request.args.get('since', -1, type=int)
+        start = last_event_id + 1
+        
+        def generate():
+            for event in job.iter_events(start=max(start, 0)):
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["type"] == "completed":
+                    event = dict(event, report=job.result)
+                payload = json.dumps(event, ensure_ascii=False)
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {payload}\n\n"
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    @scoring_bp.route('/api/scoring/batch', methods=['POST'])
+    def batch_grade():
+        """批量评分：按会话ID或导出记录评分，结果以JSONL/CSV流式返回"""
+        from modules.batch_scoring import BatchGrader, iter_formatted
+        
+        data = request.get_json() or {}
+        session_ids = data.get('session_ids', [])
+        transcripts = list(data.get('transcripts', []))
+        fmt = data.get('format', 'jsonl')
+        
+        if fmt not in ('jsonl', 'csv'):
+            return APIResponse.error("format 必须是 jsonl 或 csv")
+        try:
+            workers = int(data.get('workers', 8))
+        except (TypeError, ValueError):
+            workers = 0
+        if workers < 1:
+            return APIResponse.error("workers 必须是正整数")
+        workers = min(workers, MAX_BATCH_WORKERS)
+        
+        for session_id in session_ids:
+            sp = patient_manager.get_session(session_id)
+            if not sp:
+                transcripts.append({"session_id": session_id, "error": "会话不存在"})
+                continue
+            transcripts.append({
+                "session_id": session_id,
+                "case_data": sp.data.data,
+                "messages": sp.get_conversation_history()
+            })
+        
+        if not transcripts:
+            return APIResponse.error("session_ids 或 transcripts 不能为空")
+        
+        grader = BatchGrader(
+            engine=_batch_engine(session_ids),
+            max_workers=workers,
+            requests_per_minute=data.get('requests_per_minute'),
+            threshold=data.get('threshold', 60.0)
+        )
+        
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(iter_formatted(grader.grade(transcripts), fmt)), mimetype=mimetype)
+    
+    def _batch_engine(session_ids):
+        """复用第一个存在的会话的引擎，否则使用默认引擎"""
+        for session_id in session_ids:
+            sp = patient_manager.get_session(session_id)
+            if sp:
+                return sp.engine
+        return None
+    
     @scoring_bp.route('/api/scoring/summary/<session_id>', methods=['GET'])
     def get_score_summary(session_id):
         """获取评分摘要"""
@@ -132,40 +243,11 @@ def create_scoring_blueprint():
     
     @scoring_bp.route('/api/scoring/stats', methods=['GET'])
     def get_global_stats():
-        """获取全局统计信息"""
+        """获取全局统计信息（读取评分报告的增量汇总，不触发任何评分计算）"""
         try:
-            all_summaries = patient_manager.get_all_sessions_summary()
-            
-            # 计算统计信息
-            total_sessions = len(all_summaries)
-            total_conversations = sum(s.get('conversation_count', 0) for s in all_summaries)
-            
-            # 获取所有评分信息
-            scores = []
-            scoring_methods = []
-            for session_id in patient_manager.list_sessions():
-                sp = patient_manager.get_session(session_id)
-                if sp:
-                    score_summary = sp.get_score_summary()
-                    # 使用推荐得分（智能评分）
-                    score = score_summary.get('recommended_score', score_summary.get('percentage', 0))
-                    scores.append(score)
-                    scoring_methods.append(score_summary.get('scoring_method', 'traditional'))
-            
-            avg_score = sum(scores) / len(scores) if scores else 0
-            
-            stats = {
-                "total_sessions": total_sessions,
-                "total_conversations": total_conversations,
-                "average_score": round(avg_score, 2),
-                "scoring_method": "AI智能评分" if "intelligent" in str(scoring_methods) else "传统评分",
-                "score_distribution": {
-                    "excellent": len([s for s in scores if s >= 90]),
-                    "good": len([s for s in scores if 80 <= s < 90]),
-                    "average": len([s for s in scores if 70 <= s < 80]),
-                    "poor": len([s for s in scores if s < 70])
-                }
-            }
+            stats = analytics_store.snapshot(top_missed=request.args.get('top', 10, type=int))
+            stats["total_sessions"] = patient_manager.session_count
+            stats["scoring_method"] = "AI智能评分" if stats["scored_sessions"] else "传统评分"
             
             return APIResponse.success(stats, "获取统计信息成功")
             
@@ -1,11 +1,31 @@
 """
 SP会话API路由
 """
-from flask import Blueprint, request
+import time
+
+from flask import Blueprint, Response, request
 
 from utils.response import APIResponse
 from services.sp_service import SPService
 
+# 对话历史单页最多返回的轮数
+MAX_HISTORY_PAGE = 200
+MAX_SESSIONS_PAGE = 500
+MAX_BULK_CREATE = 1000
+
+
+def _non_negative_int(name, value, default):
+    """解析非负整数查询参数"""
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = -1
+    if number < 0:
+        raise ValueError(f"{name} 必须是非负整数")
+    return number
+
 
 def create_sp_blueprint(session_manager):
     """创建SP会话蓝图"""
@@ -32,6 +52,42 @@ def create_sp_blueprint(session_manager):
         except Exception as e:
             return APIResponse.error(f"创建SP会话失败: {str(e)}")
     
+    @sp_bp.route('/api/sp/sessions/bulk', methods=['POST'])
+    def create_sp_sessions_bulk():
+        """
+        为同一预设病例批量创建会话
+        
+        请求体: preset_file，以及 session_ids（会话ID列表）或 count + prefix
+        （生成 <prefix>-001 ... ，prefix 默认为 exam-<时间>）
+        """
+        try:
+            data = request.json or {}
+            preset_file = data.get('preset_file')
+            if not preset_file:
+                return APIResponse.error("preset_file 不能为空")
+            
+            session_ids = data.get('session_ids')
+            if session_ids is None:
+                count = _non_negative_int('count', data.get('count'), 0)
+                # 先检查数量再生成会话ID，超大的count不会分配巨大的列表
+                if count > MAX_BULK_CREATE:
+                    return APIResponse.error(f"单次最多创建 {MAX_BULK_CREATE} 个会话")
+                prefix = data.get('prefix') or f"exam-{time.strftime('%Y%m%d%H%M%S')}"
+                width = max(3, len(str(count)))
+                session_ids = [f"{prefix}-{i:0{width}d}" for i in range(1, count + 1)]
+            elif not isinstance(session_ids, list) or not all(isinstance(s, str) and s for s in session_ids):
+                return APIResponse.error("session_ids 必须是非空字符串列表")
+            if len(session_ids) > MAX_BULK_CREATE:
+                return APIResponse.error(f"单次最多创建 {MAX_BULK_CREATE} 个会话")
+            
+            result = sp_service.create_sp_sessions_bulk(preset_file, session_ids)
+            return APIResponse.success(result, f"已创建 {result['count']} 个SP会话")
+        
+        except ValueError as e:
+            return APIResponse.error(str(e))
+        except Exception as e:
+            return APIResponse.error(f"批量创建SP会话失败: {str(e)}")
+    
     @sp_bp.route('/api/sp/session/<session_id>/chat', methods=['POST'])
     def chat_with_sp(session_id: str):
         """与SP进行对话"""
@@ -49,10 +105,28 @@ def create_sp_blueprint(session_manager):
     
     @sp_bp.route('/api/sp/session/<session_id>/history', methods=['GET'])
     def get_chat_history(session_id: str):
-        """获取对话历史"""
+        """
+        获取对话历史
+        查询参数: cursor（或since）起始轮次下标，limit 本页轮数（最多 MAX_HISTORY_PAGE）
+        有新消息前重复请求返回304（If-None-Match）
+        """
         try:
-            history_data = sp_service.get_chat_history(session_id)
-            return APIResponse.success(history_data, "获取对话历史成功")
+            cursor = _non_negative_int('cursor', request.args.get('cursor', request.args.get('since')), 0)
+            limit = _non_negative_int('limit', request.args.get('limit'), None)
+            if limit is not None:
+                limit = min(limit, MAX_HISTORY_PAGE)
+            
+            etag = sp_service.get_history_etag(session_id)
+            if etag and request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                history_data = sp_service.get_chat_history(session_id, cursor, limit)
+                response = APIResponse.success(history_data, "获取对话历史成功")
+            if etag:
+                # 压缩会改变响应字节，使用弱ETag
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
         
         except ValueError as e:
             return APIResponse.error(str(e))
@@ -73,19 +147,45 @@ def create_sp_blueprint(session_manager):
     
     @sp_bp.route('/api/sp/sessions', methods=['GET'])
     def list_sessions():
-        """列出所有活跃的会话"""
+        """
+        列出活跃的会话（按最后活动时间倒序）
+        
+        查询参数: offset、limit（不传时返回全部，最多 MAX_SESSIONS_PAGE）分页；
+        preset、patient_name 精确筛选，disease 包含筛选；count_only=true 时只返回数量
+        """
         try:
-            # 清理过期会话
+            offset = _non_negative_int('offset', request.args.get('offset'), 0)
+            limit = _non_negative_int('limit', request.args.get('limit'), None)
+            if limit is not None:
+                limit = min(limit, MAX_SESSIONS_PAGE)
+            count_only = request.args.get('count_only', 'false').lower() == 'true'
+            
+            # 清理过期会话（只检查活动索引开头的过期部分）
             session_manager.clean_expired_sessions()
             
-            sessions = session_manager.get_all_sessions()
+            total, sessions = session_manager.query_sessions(
+                offset, limit,
+                preset_file=request.args.get('preset') or None,
+                patient_name=request.args.get('patient_name') or None,
+                disease=request.args.get('disease') or None,
+                count_only=count_only
+            )
+            data = {
+                "total_sessions": total,
+                "max_sessions": session_manager.max_sessions
+            }
+            if not count_only:
+                data.update({
+                    "offset": offset,
+                    "limit": limit,
+                    "has_more": offset + len(sessions) < total,
+                    "sessions": sessions
+                })
             
-            return APIResponse.success({
-                "total_sessions": len(sessions),
-                "max_sessions": session_manager.max_sessions,
-                "sessions": sessions
-            }, f"获取到 {len(sessions)} 个活跃会话")
+            return APIResponse.success(data, f"获取到 {total} 个活跃会话")
         
+        except ValueError as e:
+            return APIResponse.error(str(e), 400)
         except Exception as e:
             return APIResponse.error(f"获取会话列表失败: {str(e)}")
     
@@ -0,0 +1,55 @@
+"""
+请求追踪API路由
+为每个请求按采样率开启追踪，并提供慢追踪查看接口
+"""
+from flask import Blueprint, g, request
+
+from utils.response import APIResponse
+from observability.tracing import get_tracer, start_trace, current_trace_id
+
+
+def create_tracing_blueprint():
+    """创建追踪蓝图，同时为整个应用注册请求级根span"""
+    tracing_bp = Blueprint('tracing', __name__)
+
+    @tracing_bp.before_app_request
+    def begin_request_trace():
+        force = request.headers.get('X-Trace', '').lower() in ('1', 'true')
+        root = start_trace(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                           force=force, method=request.method, path=request.path)
+        g._trace_root = root.__enter__()
+
+    @tracing_bp.after_app_request
+    def add_trace_header(response):
+        trace_id = current_trace_id()
+        if trace_id:
+            response.headers['X-Trace-Id'] = trace_id
+        root = g.get('_trace_root')
+        if root is not None:
+            root.set_attribute('status', response.status_code)
+        return response
+
+    @tracing_bp.teardown_app_request
+    def end_request_trace(error):
+        root = g.pop('_trace_root', None)
+        if root is not None:
+            root.__exit__(type(error) if error else None, error, None)
+
+    @tracing_bp.route('/api/admin/traces', methods=['GET'])
+    def list_slow_traces():
+        """最近的慢追踪"""
+        limit = request.args.get('limit', 20, type=int)
+        return APIResponse.success({
+            "tracer": get_tracer().snapshot(),
+            "traces": get_tracer().recent_slow_traces(limit)
+        }, "获取慢追踪成功")
+
+    @tracing_bp.route('/api/admin/traces/<trace_id>', methods=['GET'])
+    def get_trace(trace_id):
+        """单个慢追踪的完整span列表"""
+        trace = get_tracer().get_trace(trace_id)
+        if trace is None:
+            return APIResponse.error("追踪不存在或已被淘汰", 404)
+        return APIResponse.success(trace, "获取追踪成功")
+
+    return tracing_bp
@@ -0,0 +1,65 @@
+"""
+流量录制
+将API请求按JSONL逐行记录（时间戳、方法、路径、请求体、状态码、耗时），
+记录文件可由 benchmarks/replay_traffic.py 按原始节奏或加速回放
+"""
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, g, request
+
+# 不录制的路径前缀（监控与管理接口）
+SKIP_PREFIXES = ('/metrics', '/api/metrics', '/api/admin', '/api/health')
+
+
+class TrafficRecorder:
+    """线程安全的JSONL追加写入器"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+def create_traffic_blueprint(path: str):
+    """创建流量录制蓝图，为整个应用注册请求记录钩子"""
+    traffic_bp = Blueprint('traffic', __name__)
+    recorder = TrafficRecorder(path)
+    print(f"📼 流量录制已开启: {path}")
+
+    @traffic_bp.before_app_request
+    def mark_request_start():
+        g._traffic_start = time.time()
+
+    @traffic_bp.after_app_request
+    def record_request(response):
+        start = g.pop('_traffic_start', None)
+        if start is None or not request.path.startswith('/api/') or request.path.startswith(SKIP_PREFIXES):
+            return response
+        record = {
+            "ts": round(start, 6),
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.time() - start) * 1000, 3)
+        }
+        if request.query_string:
+            record["query"] = request.query_string.decode('utf-8', 'replace')
+        body = request.get_json(silent=True)
+        if body is not None:
+            record["body"] = body
+        recorder.write(record)
+        return response
+
+    return traffic_bp
@@ -24,6 +24,10 @@ def create_app(config_name='default'):
     # 加载配置
     app.config.from_object(config[config_name])
     
+    # 紧凑的UTF-8 JSON输出（中文不再转义为\uXXXX），安装了orjson时使用orjson
+    from utils.serialization import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    
     # 配置CORS
     CORS(app, origins=app.config.get('CORS_ORIGINS', ['*']))
     
@@ -41,11 +45,35 @@ def create_app(config_name='default'):
         max_sessions=app.config.get('MAX_SESSIONS', 100),
         session_timeout=app.config.get('SESSION_TIMEOUT', 3600)
     )
+    # 会话生命周期 → 分析统计和事件推送（在清理线程启动前注册，过期会话同样通知订阅者）
+    from backend.models.sp import patient_manager
+    from backend.services.session_events import session_event_publisher
+    patient_manager.add_listener(session_event_publisher)
+    session_manager.start_cleanup_thread(app.config.get('SESSION_SWEEP_INTERVAL', 60))
     
-    # 注册蓝图
+    # 注册蓝图（追踪最先注册，根span覆盖其余请求钩子）
+    from api.tracing import create_tracing_blueprint
+    app.register_blueprint(create_tracing_blueprint())
+    # 响应压缩（在追踪之后注册，压缩耗时计入请求span）
+    if app.config.get('RESPONSE_GZIP_MIN_SIZE', 0) > 0:
+        from api.compression import create_compression_blueprint
+        app.register_blueprint(create_compression_blueprint(app.config['RESPONSE_GZIP_MIN_SIZE'],
+                                                            app.config.get('RESPONSE_GZIP_LEVEL', 6)))
     app.register_blueprint(create_health_blueprint(session_manager))
     app.register_blueprint(create_preset_blueprint())
     app.register_blueprint(create_sp_blueprint(session_manager))
+    # 注册事件推送API（会话更新、教师看板）
+    from api.events import create_events_blueprint
+    from backend.services.event_hub import event_hub
+    # 推送连接数上限不超过服务线程的四分之一，看板连接再多也不会占满线程池
+    subscriber_limit = max(1, app.config.get('SERVE_THREADS', 64) // 4)
+    configured_subscribers = app.config.get('EVENTS_MAX_SUBSCRIBERS', 0)
+    event_hub.max_subscribers = (min(configured_subscribers, subscriber_limit)
+                                 if configured_subscribers > 0 else subscriber_limit)
+    app.register_blueprint(create_events_blueprint(app.config.get('EVENTS_KEEPALIVE', 15.0)))
+    # 注册会话导出API
+    from api.export import create_export_blueprint
+    app.register_blueprint(create_export_blueprint(session_manager))
     # 注册检查报告API
     from api.exam import create_exam_blueprint
     app.register_blueprint(create_exam_blueprint(session_manager))
@@ -55,6 +83,17 @@ def create_app(config_name='default'):
     # 注册评分系统API
     from api.scoring import create_scoring_blueprint
     app.register_blueprint(create_scoring_blueprint())
+    # 注册指标API（含全局请求耗时统计）
+    from api.metrics import create_metrics_blueprint
+    app.register_blueprint(create_metrics_blueprint())
+    # 流量录制（可选）
+    if app.config.get('TRAFFIC_RECORD_PATH'):
+        from api.traffic import create_traffic_blueprint
+        app.register_blueprint(create_traffic_blueprint(app.config['TRAFFIC_RECORD_PATH']))
+    
+    # 启动预热在后台进行，完成前 /api/health/ready 返回503
+    from backend.services.warmup_service import start_warmup
+    start_warmup(app.config.get('WARMUP_ENABLED', True))
     
     # 错误处理器
     @app.errorhandler(404)
@@ -73,14 +112,21 @@ def print_available_routes():
     print("🏥 AI标准化病人后端服务启动中...")
     print("📋 可用接口:")
     print("  GET  /api/health                    - 健康检查")
+    print("  GET  /api/health/live               - 存活检查")
+    print("  GET  /api/health/ready              - 就绪检查（预热完成后返回200）")
+    print("  GET  /metrics                       - Prometheus指标")
     print("  GET  /api/sp/presets                - 获取预设病例")
     print("  POST /api/sp/session/create         - 创建SP会话")
+    print("  POST /api/sp/sessions/bulk          - 批量创建SP会话（同一预设病例）")
     print("  POST /api/sp/session/<id>/chat      - 与SP对话")
     print("  GET  /api/sp/session/<id>/history   - 获取对话历史")
     print("  GET  /api/sp/session/<id>/info      - 获取会话信息")
     print("  GET  /api/sp/sessions               - 获取所有会话")
     print("  DELETE /api/sp/session/<id>         - 删除会话")
     print("  POST /api/sp/data/validate          - 验证SP数据")
+    print("  GET  /api/export/sessions           - 批量导出会话（jsonl / jsonl.gz / parquet）")
+    print("  GET  /api/events/session/<id>       - 订阅会话更新（SSE）")
+    print("  GET  /api/events/dashboard          - 订阅教师看板更新（SSE）")
     print()
 
 
@@ -24,6 +24,25 @@ class Config:
     # 会话配置
     MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 100))
     SESSION_TIMEOUT = int(os.environ.get('SESSION_TIMEOUT', 3600))  # 秒
+    SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', 60))  # 秒，0为不在后台清理
+    
+    # 服务线程数（backend/serve.py 启动时按 --threads 设置）
+    SERVE_THREADS = int(os.environ.get('SERVE_THREADS', 64))
+    
+    # 事件推送（SSE）：心跳间隔与最大同时连接数（每个连接在断开前占用一个服务线程，
+    # 最多占用 SERVE_THREADS 的四分之一，其余线程留给对话等请求；0为按线程数自动确定）
+    EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE', 15))
+    EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 0))
+    
+    # 启动预热（预设病例、提示模板、模型连接）；WARMUP_REQUEST 为true时额外发一次极小的模型请求
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+    
+    # 响应压缩：客户端支持gzip且响应体不小于该字节数时压缩（0为关闭）
+    RESPONSE_GZIP_MIN_SIZE = int(os.environ.get('RESPONSE_GZIP_MIN_SIZE', 1024))
+    RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 6))
+    
+    # 流量录制（设置后将API请求追加写入该JSONL文件，供 benchmarks/replay_traffic.py 回放）
+    TRAFFIC_RECORD_PATH = os.environ.get('TRAFFIC_RECORD_PATH', '')
     
     @classmethod
     def validate_config(cls):
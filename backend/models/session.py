@@ -1,8 +1,10 @@
 """
 会话管理模型
 """
+import bisect
+import threading
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
 # 导入SP相关模块
@@ -11,6 +13,7 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from .sp import SP
+from backend.models.sp import patient_manager
 
 
 class SessionManager:
@@ -21,34 +24,73 @@ class SessionManager:
         self.session_metadata: Dict[str, Dict] = {}
         self.max_sessions = max_sessions
         self.session_timeout = session_timeout
+        self._cleanup_thread = None
+        # 按最后活动时间升序的 (last_activity, session_id) 列表：
+        # 列表接口倒序分页，过期会话总在列表开头
+        self._activity_index: List[Tuple[float, str]] = []
+        self._lock = threading.RLock()
+    
+    def _index_remove(self, session_id: str) -> None:
+        metadata = self.session_metadata.get(session_id)
+        if metadata is None:
+            return
+        key = (metadata["last_activity"], session_id)
+        i = bisect.bisect_left(self._activity_index, key)
+        if i < len(self._activity_index) and self._activity_index[i] == key:
+            del self._activity_index[i]
     
     def clean_expired_sessions(self) -> int:
-        """清理过期的会话"""
-        current_time = time.time()
-        expired_sessions = []
-        
-        for session_id, metadata in self.session_metadata.items():
-            if current_time - metadata.get('last_activity', 0) > self.session_timeout:
-                expired_sessions.append(session_id)
+        """清理过期的会话（同时通知该会话和看板的订阅者）"""
+        cutoff = time.time() - self.session_timeout
+        with self._lock:
+            # 活动索引升序，过期会话是开头的一段
+            expired = bisect.bisect_left(self._activity_index, (cutoff, ""))
+            expired_sessions = [session_id for _, session_id in self._activity_index[:expired]]
+            del self._activity_index[:expired]
+            for session_id in expired_sessions:
+                self.current_sp_sessions.pop(session_id, None)
+                self.session_metadata.pop(session_id, None)
         
         for session_id in expired_sessions:
-            if session_id in self.current_sp_sessions:
-                del self.current_sp_sessions[session_id]
-            if session_id in self.session_metadata:
-                del self.session_metadata[session_id]
+            patient_manager.delete_session(session_id, reason="expired")
         
         return len(expired_sessions)
+
+    def start_cleanup_thread(self, interval: float = 60) -> None:
+        """后台定期清理过期会话（不再依赖健康检查请求触发清理）"""
+        if interval <= 0 or self._cleanup_thread is not None:
+            return
+
+        def sweep():
+            while True:
+                time.sleep(interval)
+                try:
+                    cleaned = self.clean_expired_sessions()
+                    if cleaned:
+                        print(f"🧹 已清理 {cleaned} 个过期会话")
+                except Exception as e:
+                    print(f"⚠️ 清理过期会话失败: {e}")
+
+        self._cleanup_thread = threading.Thread(target=sweep, name="session-sweeper", daemon=True)
+        self._cleanup_thread.start()
     
     def create_session(self, session_id: str, sp: SP, preset_file: str = None) -> None:
         """创建新会话"""
-        self.current_sp_sessions[session_id] = sp
-        self.session_metadata[session_id] = {
-            "created_at": time.time(),
-            "last_activity": time.time(),
-            "message_count": 0,
-            "preset_file": preset_file,
-            "patient_name": sp.data.basics.get("name", "未知") if isinstance(sp.data.basics, dict) else "未知"
-        }
+        now = time.time()
+        with self._lock:
+            self._index_remove(session_id)
+            self.current_sp_sessions[session_id] = sp
+            self.session_metadata[session_id] = {
+                "created_at": now,
+                "last_activity": now,
+                "message_count": 0,
+                "preset_file": preset_file,
+                "patient_name": sp.data.basics.get("name", "未知") if isinstance(sp.data.basics, dict) else "未知",
+                "disease": sp.data.disease,
+                # 创建时间不变，格式化一次
+                "created_at_iso": datetime.fromtimestamp(now).isoformat()
+            }
+            bisect.insort(self._activity_index, (now, session_id))
     
     def get_session(self, session_id: str) -> SP:
         """获取会话"""
@@ -60,18 +102,23 @@ class SessionManager:
     
     def update_activity(self, session_id: str) -> None:
         """更新会话活动时间"""
-        if session_id in self.session_metadata:
-            self.session_metadata[session_id]["last_activity"] = time.time()
-            self.session_metadata[session_id]["message_count"] += 1
+        with self._lock:
+            metadata = self.session_metadata.get(session_id)
+            if metadata is None:
+                return
+            self._index_remove(session_id)
+            metadata["last_activity"] = time.time()
+            metadata["message_count"] += 1
+            # 最新的活动通常插入在末尾
+            bisect.insort(self._activity_index, (metadata["last_activity"], session_id))
     
     def delete_session(self, session_id: str) -> Dict[str, Any]:
         """删除会话并返回会话信息"""
-        session_info = self.session_metadata.get(session_id, {})
-        
-        if session_id in self.current_sp_sessions:
-            del self.current_sp_sessions[session_id]
-        if session_id in self.session_metadata:
-            del self.session_metadata[session_id]
+        with self._lock:
+            session_info = self.session_metadata.get(session_id, {})
+            self._index_remove(session_id)
+            self.current_sp_sessions.pop(session_id, None)
+            self.session_metadata.pop(session_id, None)
         
         return session_info
     
@@ -83,24 +130,60 @@ class SessionManager:
         """检查是否达到最大会话数量"""
         return len(self.current_sp_sessions) >= self.max_sessions
     
-    def get_all_sessions(self) -> list:
-        """获取所有会话信息"""
-        sessions = []
-        for session_id, sp in self.current_sp_sessions.items():
-            metadata = self.session_metadata.get(session_id, {})
-            sessions.append({
-                "session_id": session_id,
-                "patient_name": metadata.get("patient_name", "未知"),
-                "disease": sp.data.disease,
-                "message_count": metadata.get("message_count", 0),
-                "created_at": datetime.fromtimestamp(metadata.get("created_at", 0)).isoformat() if metadata.get("created_at") else "未知",
-                "last_activity": datetime.fromtimestamp(metadata.get("last_activity", 0)).isoformat() if metadata.get("last_activity") else "未知",
-                "status": "active"
-            })
+    def _session_entry(self, session_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "session_id": session_id,
+            "patient_name": metadata.get("patient_name", "未知"),
+            "disease": metadata.get("disease", ""),
+            "message_count": metadata.get("message_count", 0),
+            "created_at": metadata.get("created_at_iso", "未知"),
+            "last_activity": datetime.fromtimestamp(metadata["last_activity"]).isoformat(),
+            "status": "active"
+        }
+    
+    def query_sessions(self, offset: int = 0, limit: Optional[int] = None,
+                       preset_file: Optional[str] = None, patient_name: Optional[str] = None,
+                       disease: Optional[str] = None, count_only: bool = False) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        按最后活动时间倒序查询会话
         
-        # 按最后活动时间排序
-        sessions.sort(key=lambda x: x["last_activity"], reverse=True)
-        return sessions
+        Args:
+            offset, limit: 分页（limit为None时返回offset之后的全部）
+            preset_file, patient_name: 精确匹配
+            disease: 包含匹配
+            count_only: 只统计数量，不构造会话信息
+            
+        Returns:
+            (符合条件的会话总数, 当前页的会话信息)
+        """
+        end = None if limit is None else offset + limit
+        with self._lock:
+            if preset_file is None and patient_name is None and disease is None:
+                total = len(self._activity_index)
+                if count_only:
+                    return total, []
+                stop = total - offset
+                start = 0 if end is None else max(total - end, 0)
+                page_ids = [session_id for _, session_id in reversed(self._activity_index[start:max(stop, 0)])]
+            else:
+                total = 0
+                page_ids = []
+                for _, session_id in reversed(self._activity_index):
+                    metadata = self.session_metadata[session_id]
+                    if ((preset_file is not None and metadata.get("preset_file") != preset_file)
+                            or (patient_name is not None and metadata.get("patient_name") != patient_name)
+                            or (disease is not None and disease not in (metadata.get("disease") or ""))):
+                        continue
+                    if not count_only and total >= offset and (end is None or total < end):
+                        page_ids.append(session_id)
+                    total += 1
+            
+            return total, [self._session_entry(session_id, self.session_metadata[session_id])
+                           for session_id in page_ids]
+    
+    def get_all_sessions(self) -> list:
+        """获取所有会话信息（按最后活动时间倒序）"""
+        return self.query_sessions()[1]
     
     def get_session_metadata(self, session_id: str) -> Dict[str, Any]:
         """获取会话元数据"""
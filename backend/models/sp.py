@@ -2,10 +2,16 @@
 重构的标准化病人模型 - 基于新的面向对象架构
 """
 import os
-from typing import Dict, Any, List, Optional, Literal
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Literal, Callable
 from sp_data import Sp_data
 from modules.intelligent_scoring import IntelligentScoringSystem
-from engine.gpt import GPTEngine
+from engine.factory import create_engine
+from engine.base_engine import PURPOSE_CHAT
+from observability.metrics import CACHE_REQUESTS, SESSIONS_CREATED
+from observability.tracing import span, traced
 
 # 导入新的核心模块
 try:
@@ -22,6 +28,25 @@ except ImportError:
         pass
 
 
+# 按项目根目录定位，与启动时的工作目录无关（start_all / serve 在 backend/ 下启动）
+DEFAULT_PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                   "prompts", "standard_patient.txt")
+
+# 提示模板：路径 → (修改时间, 模板文本)，在提示词编辑器中保存后按修改时间重新读取
+_template_cache: Dict[str, tuple] = {}
+
+
+def load_prompt_template(path: str) -> str:
+    """读取提示模板（按文件修改时间缓存），文件不存在时抛出FileNotFoundError"""
+    mtime = os.path.getmtime(path)
+    cached = _template_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = (mtime, f.read())
+        _template_cache[path] = cached
+    return cached[1]
+
+
 class StandardPatient:
     """标准化病人类 - 重构版本，实现更好的面向对象设计"""
     
@@ -29,7 +54,9 @@ class StandardPatient:
                  data: Sp_data,
                  engine,
                  prompt_path: Optional[str] = None,
-                 session_id: Optional[str] = None):
+                 session_id: Optional[str] = None,
+                 preset_file: Optional[str] = None,
+                 template: Optional["StandardPatient"] = None):
         """
         初始化标准化病人
         
@@ -38,23 +65,43 @@ class StandardPatient:
             engine: AI引擎
             prompt_path: 提示文件路径
             session_id: 会话ID
+            preset_file: 病例预设文件名（自定义病例为None），用于分预设统计
+            template: 同一病例、同一提示模板的已有会话，复用其渲染好的系统提示和评分问题点
         """
         self._data = data
         self._engine = engine
         self._session_id = session_id or "default"
-        self._prompt_path = prompt_path or os.path.join("prompts", "standard_patient.txt")
+        self.preset_file = preset_file
+        self._prompt_path = prompt_path or DEFAULT_PROMPT_PATH
         
         # 初始化对话相关组件
         self._messages: List[Dict[str, str]] = []
         self._conversation_count = 0
         self._start_time = None
+        self.created_at = time.time()
+        # 配对的对话轮次（医生提问 + 病人回复），随对话增量追加，历史接口按下标分页
+        self._turns: List[Dict[str, str]] = []
+        self._pending_user_message: Optional[str] = None
         
         # 初始化系统消息
-        self._system_message = self._load_system_message()
+        if template is not None:
+            self._system_message = template._system_message
+        else:
+            self._system_message = self._load_system_message()
         self._messages.append({"role": "system", "content": self._system_message})
         
         # 智能评分系统 - 始终启用
-        self._scoring_system = IntelligentScoringSystem(self._data.data, engine=self._engine)
+        self._scoring_system = IntelligentScoringSystem(
+            self._data.data, engine=self._engine,
+            question_templates=template._scoring_system.question_items if template is not None else None
+        )
+        
+        # 评分计算会重置问题项状态，同一会话的评分必须串行；
+        # 报告缓存到对话发生变化为止
+        self._scoring_lock = threading.Lock()
+        self._report_cache = None  # (cache_key, report)
+        # 评分报告生成回调 report_listener(sp, report)，由会话管理器设置
+        self.report_listener: Optional[Callable[["StandardPatient", Dict[str, Any]], None]] = None
     
     def _load_system_message(self) -> str:
         """加载系统提示消息"""
@@ -73,9 +120,7 @@ class StandardPatient:
         
         # 加载提示模板
         try:
-            with open(self._prompt_path, 'r', encoding='utf-8') as f:
-                template = f.read()
-            return template.format(**context)
+            return load_prompt_template(self._prompt_path).format(**context)
         except FileNotFoundError:
             basics = case_data.get("basics", {})
             name = basics.get("name", "Unknown") if isinstance(basics, dict) else "Unknown"
@@ -86,14 +131,17 @@ class StandardPatient:
         if not message.strip():
             raise ValueError("消息内容不能为空")
         
-        # 记录用户消息
-        self._record_user_message(message)
-        
-        # 生成AI响应
-        response = self._generate_response()
-        
-        # 记录助手消息
-        self._record_assistant_message(response)
+        with span("StandardPatient.speak", session_id=self._session_id):
+            # 记录用户消息
+            with span("StandardPatient.record_user_message"):
+                self._record_user_message(message)
+            
+            # 生成AI响应
+            response = self._generate_response()
+            
+            # 记录助手消息
+            with span("StandardPatient.record_assistant_message"):
+                self._record_assistant_message(response)
         
         return response
     
@@ -101,21 +149,29 @@ class StandardPatient:
         """记录用户消息"""
         self._messages.append({"role": "user", "content": message})
         self._conversation_count += 1
+        self._pending_user_message = message
         
         # 记录到评分系统
         self._scoring_system.record_message(message, "user")
     
     def _generate_response(self) -> str:
-        """生成AI响应"""
-        return self._engine.get_response(self._messages)
+        """生成AI响应（交互式对话，优先于后台评分调用）"""
+        return self._engine.get_response(self._messages, purpose=PURPOSE_CHAT)
     
     def _record_assistant_message(self, response: str) -> None:
         """记录助手响应"""
         self._messages.append({"role": "assistant", "content": response})
+        self._append_turn(response)
         
         # 记录到评分系统
         self._scoring_system.record_message(response, "assistant")
     
+    def _append_turn(self, response: str) -> None:
+        """病人回复与最近一条未配对的医生提问组成一轮（模型调用失败留下的提问不成轮）"""
+        if self._pending_user_message is not None:
+            self._turns.append({"user_message": self._pending_user_message, "sp_response": response})
+            self._pending_user_message = None
+    
     def get_conversation_summary(self) -> Dict[str, Any]:
         """获取对话摘要"""
         user_messages = [msg for msg in self._messages if msg["role"] == "user"]
@@ -131,15 +187,40 @@ class StandardPatient:
             "conversation_count": self._conversation_count
         }
     
-    def get_score_report(self) -> Dict[str, Any]:
-        """获取评分报告（延迟计算）"""
-        self._scoring_system.calculate_scores_from_history()
-        return self._scoring_system.get_detailed_report()
+    def _scoring_cache_key(self) -> tuple:
+        """评分缓存键：对话长度和评分阈值不变时报告不变"""
+        return (len(self._scoring_system.conversation_history), self._scoring_system.threshold)
+    
+    def get_cached_score_report(self) -> Optional[Dict[str, Any]]:
+        """获取仍然有效的缓存评分报告，没有则返回None"""
+        cache = self._report_cache
+        if cache and cache[0] == self._scoring_cache_key():
+            return cache[1]
+        return None
+    
+    @traced("StandardPatient.get_score_report")
+    def get_score_report(self, progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
+        """获取评分报告（延迟计算，对话未变化时直接返回缓存）"""
+        with self._scoring_lock:
+            cached = self.get_cached_score_report()
+            if cached is not None:
+                CACHE_REQUESTS.inc(cache="score_report", result="hit")
+                return cached
+            
+            CACHE_REQUESTS.inc(cache="score_report", result="miss")
+            cache_key = self._scoring_cache_key()
+            self._scoring_system.calculate_scores_from_history(progress_callback=progress_callback)
+            report = self._scoring_system.get_detailed_report()
+            # 降级评估的报告只是模型不可用时的临时结果：不缓存、不计入统计，下次请求重新评分
+            if not report.get("degraded"):
+                self._report_cache = (cache_key, report)
+                if self.report_listener is not None:
+                    self.report_listener(self, report)
+            return report
     
     def get_score_summary(self) -> Dict[str, Any]:
         """获取评分摘要（延迟计算）"""
-        self._scoring_system.calculate_scores_from_history()
-        return self._scoring_system.calculate_score()
+        return self.get_score_report()["score_summary"]
     
     def get_suggestions(self) -> List[str]:
         """获取改进建议"""
@@ -170,8 +251,10 @@ class StandardPatient:
         self._messages.append({"role": role, "content": message})
         if role == "user":
             self._conversation_count += 1
+            self._pending_user_message = message
             self._scoring_system.record_message(message, role)
         elif role == "assistant":
+            self._append_turn(message)
             self._scoring_system.record_message(message, role)
     
     def get_conversation_history(self) -> List[Dict[str, str]]:
@@ -179,6 +262,36 @@ class StandardPatient:
         # 跳过系统消息，返回用户和助手的对话
         return [msg for msg in self._messages if msg["role"] in ["user", "assistant"]]
     
+    def get_turns(self, start: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """配对的对话轮次 [start, start+limit)，开销只与返回的轮数有关"""
+        end = None if limit is None else start + limit
+        return self._turns[start:end]
+    
+    @property
+    def turn_count(self) -> int:
+        """完整的对话轮数"""
+        return len(self._turns)
+    
+    @property
+    def history_version(self) -> int:
+        """对话历史版本（消息数），每条新消息递增，用于历史接口的ETag"""
+        return len(self._messages)
+    
+    def export_record(self) -> Dict[str, Any]:
+        """批量导出用的会话记录：病例信息 + 配对的对话轮次（不含系统提示），已评分时附推荐得分"""
+        cached = self.get_cached_score_report()
+        return {
+            "session_id": self._session_id,
+            "preset_file": self.preset_file,
+            "patient_name": self.patient_name,
+            "disease": self._data.disease,
+            "chief_complaint": self.chief_complaint,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "turn_count": len(self._turns),
+            "turns": self._turns[:],
+            "score": cached["score_summary"].get("recommended_score") if cached else None
+        }
+    
     def export_session_data(self) -> Dict[str, Any]:
         """导出会话数据（向后兼容）"""
         return self.export_conversation()
@@ -251,16 +364,20 @@ class PatientFactory:
     def create_sp(case_data: Sp_data, 
                   engine=None, 
                   prompt_path=None, 
-                  session_id=None) -> StandardPatient:
+                  session_id=None,
+                  preset_file=None,
+                  template=None) -> StandardPatient:
         """创建SP实例"""
         if engine is None:
-            engine = GPTEngine()
+            engine = create_engine()
         
         return StandardPatient(
             data=case_data,
             engine=engine,
             prompt_path=prompt_path,
-            session_id=session_id
+            session_id=session_id,
+            preset_file=preset_file,
+            template=template
         )
     
     @staticmethod  
@@ -273,7 +390,7 @@ class PatientFactory:
         sp_data.load_from_json(preset_path)
         
         if engine is None:
-            engine = GPTEngine()
+            engine = create_engine()
         
         return PatientFactory.create_sp(
             case_data=sp_data,
@@ -283,34 +400,84 @@ class PatientFactory:
         )
 
 
+class SessionListener:
+    """会话生命周期回调，由服务层实现并注册到会话管理器（统计、事件推送），模型层不依赖具体服务"""
+
+    def session_created(self, sp: StandardPatient) -> None:
+        pass
+
+    def session_removed(self, sp: StandardPatient, reason: str) -> None:
+        """会话被删除（reason: deleted / expired）"""
+        pass
+
+    def report_generated(self, sp: StandardPatient, report: Dict[str, Any]) -> None:
+        """生成了新的评分报告（不含降级评估的报告）"""
+        pass
+
+
 class PatientManager:
     """病人会话管理器"""
     
     def __init__(self):
         self.active_sessions: Dict[str, StandardPatient] = {}
+        # 病人姓名 → {会话ID: SP}，按姓名查找会话时不扫描全部会话
+        self._sessions_by_patient_name: Dict[str, Dict[str, StandardPatient]] = {}
+        self._listeners: List[SessionListener] = []
+
+    def add_listener(self, listener: SessionListener) -> None:
+        """注册会话生命周期回调（重复注册忽略）"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _report_generated(self, sp: StandardPatient, report: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            listener.report_generated(sp, report)
 
     def create_session(self, session_id: str, case_data: Sp_data, 
-                      engine=None, prompt_path=None) -> StandardPatient:
-        """创建新的SP会话"""
+                      engine=None, prompt_path=None, preset_file=None,
+                      template=None, notify: bool = True) -> StandardPatient:
+        """创建新的SP会话（notify为False时不回调 session_created，由批量创建统一推送）"""
         sp = PatientFactory.create_sp(
             case_data=case_data,
             engine=engine,
             prompt_path=prompt_path,
-            session_id=session_id
+            session_id=session_id,
+            preset_file=preset_file,
+            template=template
         )
+        sp.report_listener = self._report_generated
+        self._unindex(session_id)
         self.active_sessions[session_id] = sp
+        self._sessions_by_patient_name.setdefault(sp.patient_name, {})[session_id] = sp
+        SESSIONS_CREATED.inc()
+        if notify:
+            for listener in self._listeners:
+                listener.session_created(sp)
         return sp
 
     def get_session(self, session_id: str) -> Optional[StandardPatient]:
         """获取会话"""
         return self.active_sessions.get(session_id)
 
-    def delete_session(self, session_id: str) -> bool:
-        """删除会话"""
-        if session_id in self.active_sessions:
-            del self.active_sessions[session_id]
-            return True
-        return False
+    def delete_session(self, session_id: str, reason: str = "deleted") -> bool:
+        """删除会话，并回调 session_removed（reason: deleted / expired）"""
+        sp = self._unindex(session_id)
+        if sp is None:
+            return False
+        for listener in self._listeners:
+            listener.session_removed(sp, reason)
+        return True
+
+    def _unindex(self, session_id: str) -> Optional[StandardPatient]:
+        """从会话表和姓名索引中移除会话，返回被移除的SP"""
+        sp = self.active_sessions.pop(session_id, None)
+        if sp is not None:
+            same_name = self._sessions_by_patient_name.get(sp.patient_name)
+            if same_name is not None:
+                same_name.pop(session_id, None)
+                if not same_name:
+                    del self._sessions_by_patient_name[sp.patient_name]
+        return sp
 
     def session_exists(self, session_id: str) -> bool:
         """检查会话是否存在"""
@@ -327,13 +494,13 @@ class PatientManager:
         
     def get_sessions_by_patient_name(self, patient_name: str) -> List[StandardPatient]:
         """根据病人姓名查找会话"""
-        return [sp for sp in self.active_sessions.values() 
-                if sp.patient_name == patient_name]
+        return list(self._sessions_by_patient_name.get(patient_name, {}).values())
     
     def clear_all_sessions(self) -> int:
         """清除所有会话，返回清除的数量"""
         count = len(self.active_sessions)
-        self.active_sessions.clear()
+        for session_id in list(self.active_sessions):
+            self.delete_session(session_id)
         return count
 
     def get_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
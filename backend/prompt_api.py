@@ -16,14 +16,15 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from prompt_loader import PromptLoader
 from sp_data import Sp_data
-from engine.gpt import GPTEngine
-from models.sp import SP
 
 PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'prompts')
 BACKUP_DIR = os.path.join(PROMPT_DIR, 'backups')
 
-# 确保备份目录存在
-os.makedirs(BACKUP_DIR, exist_ok=True)
+
+def _backup_dir():
+    """备份目录，首次写入时创建（导入模块时不做文件系统操作）"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    return BACKUP_DIR
 
 prompt_bp = Blueprint('prompt', __name__)
 
@@ -90,7 +91,7 @@ def backup_prompt():
     content = data.get('content')
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     backup_name = f"{filename.replace('.txt','')}_{timestamp}.txt"
-    backup_path = os.path.join(BACKUP_DIR, backup_name)
+    backup_path = os.path.join(_backup_dir(), backup_name)
     with open(backup_path, 'w', encoding='utf-8') as f:
         f.write(content)
     return APIResponse.success(backup_name, "副本保存成功")
@@ -107,7 +108,7 @@ def save_prompt():
     # 先备份原文件
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     backup_name = f"{filename.replace('.txt','')}_before_{timestamp}.txt"
-    backup_path = os.path.join(BACKUP_DIR, backup_name)
+    backup_path = os.path.join(_backup_dir(), backup_name)
     shutil.copy(path, backup_path)
     # 覆盖保存
     with open(path, 'w', encoding='utf-8') as f:
@@ -117,6 +118,8 @@ def save_prompt():
 # 获取所有副本列表
 @prompt_bp.route('/api/prompt/backups', methods=['GET'])
 def list_backups():
+    if not os.path.isdir(BACKUP_DIR):
+        return APIResponse.success([], "获取副本列表成功")
     files = [f for f in os.listdir(BACKUP_DIR) if f.endswith('.txt')]
     return APIResponse.success(files, "获取副本列表成功")
 
@@ -154,7 +157,9 @@ def test_prompt():
     temp_path = os.path.join(PROMPT_DIR, 'temp_test_prompt.txt')
     with open(temp_path, 'w', encoding='utf-8') as f:
         f.write(prompt_content)
-    # 构造SP
+    # 构造SP（模型客户端较重，按需导入）
+    from engine.gpt import GPTEngine
+    from models.sp import SP
     sp_data = Sp_data()
     sp_data.data = context
     sp = SP(sp_data, GPTEngine(), prompt_path=temp_path)
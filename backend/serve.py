@@ -0,0 +1,220 @@
+"""
+生产环境服务入口
+用多线程WSGI服务器运行后端，替代 app.py 中带重载器的Flask开发服务器：
+- 已安装 gunicorn 时使用 gthread 工作进程（多进程 × 多线程）
+- 否则使用内置的线程池服务器（单进程，基于werkzeug）
+
+收到 SIGTERM/SIGINT 后就绪检查先返回503，停止接受新连接，等待进行中的请求
+（对话轮次）和评分任务完成，最多等待 graceful_timeout 秒。
+
+注意：会话保存在进程内存中，多个工作进程之间不共享。workers>1 时需要在前面
+按会话ID做粘性路由，否则请保持 workers=1、用 threads 扩展并发。
+每个打开的事件推送连接（/api/events/...，教师看板）在断开前占用一个线程，
+推送连接数上限按 threads 的四分之一确定，超出时返回503（客户端回退到轮询）。
+
+用法:
+    python backend/serve.py --threads 64
+    python backend/serve.py --server gunicorn --workers 2 --threads 8
+环境变量: SERVE_HOST SERVE_PORT SERVE_WORKERS SERVE_THREADS SERVE_GRACEFUL_TIMEOUT SERVE_SERVER
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 与 app.py 直接运行时相同的导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# 空闲的keep-alive连接最多占用工作线程这么多秒
+KEEPALIVE_TIMEOUT = 5
+
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    """空闲连接超时后关闭，避免长连接长期占用线程池"""
+
+    timeout = KEEPALIVE_TIMEOUT
+
+    def log_request(self, code="-", size="-"):
+        # 访问日志由指标中间件统计，不逐条打印
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """固定大小线程池处理连接的WSGI服务器，记录进行中的连接数用于优雅停止"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads):
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self._in_flight = 0
+        self._in_flight_cond = threading.Condition()
+        super().__init__(host, port, app, handler=_KeepAliveRequestHandler)
+
+    def process_request(self, request, client_address):
+        with self._in_flight_cond:
+            self._in_flight += 1
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._in_flight_cond:
+                self._in_flight -= 1
+                self._in_flight_cond.notify_all()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def drain(self, timeout: float) -> bool:
+        """等待进行中的连接处理完毕，超时返回False"""
+        deadline = time.time() + timeout
+        with self._in_flight_cond:
+            while self._in_flight:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._in_flight_cond.wait(remaining)
+        self._pool.shutdown(wait=False)
+        return True
+
+
+def _start_draining():
+    from backend.services.warmup_service import warmup_state
+    from backend.services.event_hub import event_hub
+    warmup_state.start_draining()
+    # 事件推送连接不会自行结束，关闭频道让其立即返回，不占用排空时间
+    event_hub.shutdown()
+
+
+def _wait_report_jobs(timeout: float) -> bool:
+    from backend.services.report_job_service import report_job_manager
+    active = report_job_manager.active_jobs
+    if active:
+        print(f"⏳ 等待 {active} 个评分任务完成...")
+    return report_job_manager.wait_idle(max(0.0, timeout))
+
+
+def serve_builtin(host, port, threads, graceful_timeout):
+    """内置线程池服务器（单进程）"""
+    from app import create_app
+
+    server = PooledWSGIServer(host, port, create_app(os.environ.get('ENVIRONMENT', 'production')), threads)
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    serve_thread = threading.Thread(target=server.serve_forever, name="http-accept", daemon=True)
+    serve_thread.start()
+    print(f"🚀 后端服务已启动: http://{host}:{port}（内置线程池服务器，{threads} 线程）")
+
+    while not stop.wait(0.5):
+        pass
+
+    print("🛑 收到停止信号，开始优雅停止...")
+    start = time.time()
+    _start_draining()
+    server.shutdown()
+    if not server.drain(graceful_timeout):
+        print(f"⚠️ {graceful_timeout:.0f}秒内仍有 {server.in_flight} 个连接未完成，强制停止")
+    if not _wait_report_jobs(graceful_timeout - (time.time() - start)):
+        print("⚠️ 评分任务未在停止时限内完成")
+    server.server_close()
+    print(f"✅ 后端服务已停止（耗时 {time.time() - start:.2f}秒）")
+
+
+def serve_gunicorn(host, port, workers, threads, graceful_timeout):
+    """gunicorn gthread 工作进程（多进程 × 多线程），每个工作进程各自创建应用和预热"""
+    from gunicorn.app.base import BaseApplication
+
+    def post_worker_init(worker):
+        # 在gunicorn自己的停止处理之前先把就绪检查置为503
+        original = worker.handle_exit
+
+        def handle_exit(signum, frame):
+            _start_draining()
+            original(signum, frame)
+
+        signal.signal(signal.SIGTERM, handle_exit)
+
+    def worker_exit(server, worker):
+        _wait_report_jobs(graceful_timeout)
+
+    class _Application(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                "graceful_timeout": int(graceful_timeout),
+                # 模型调用可能较慢，工作进程心跳超时要长于单次对话
+                "timeout": max(120, int(graceful_timeout)),
+                "keepalive": KEEPALIVE_TIMEOUT,
+                "post_worker_init": post_worker_init,
+                "worker_exit": worker_exit
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import create_app
+            return create_app(os.environ.get('ENVIRONMENT', 'production'))
+
+    print(f"🚀 后端服务启动中: http://{host}:{port}（gunicorn gthread，{workers} 进程 × {threads} 线程）")
+    _Application().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生产环境后端服务")
+    parser.add_argument("--host", default=os.environ.get('SERVE_HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('SERVE_PORT', 3000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('SERVE_WORKERS', 1)),
+                        help="工作进程数（会话不跨进程共享，>1时需要粘性路由）")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get('SERVE_THREADS', 64)),
+                        help="每个工作进程的线程数")
+    parser.add_argument("--graceful-timeout", type=float,
+                        default=float(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 30)),
+                        help="优雅停止时等待进行中请求的最长秒数")
+    parser.add_argument("--server", choices=("auto", "gunicorn", "builtin"),
+                        default=os.environ.get('SERVE_SERVER', 'auto'),
+                        help="auto: 已安装gunicorn时使用gunicorn，否则使用内置服务器")
+    args = parser.parse_args()
+    # 应用按线程数确定推送连接数上限（创建应用前设置）
+    os.environ['SERVE_THREADS'] = str(args.threads)
+
+    server = args.server
+    if server != "builtin":
+        try:
+            import gunicorn  # noqa: F401
+            server = "gunicorn"
+        except ImportError:
+            if server == "gunicorn":
+                parser.error("未安装gunicorn（pip install gunicorn）")
+            server = "builtin"
+
+    if server == "gunicorn":
+        if args.workers > 1:
+            print(f"⚠️ {args.workers} 个工作进程之间不共享会话，请确保按会话ID粘性路由")
+        serve_gunicorn(args.host, args.port, args.workers, args.threads, args.graceful_timeout)
+    else:
+        if args.workers > 1:
+            print("⚠️ 内置服务器只支持单进程，已忽略 --workers（安装gunicorn以使用多进程）")
+        serve_builtin(args.host, args.port, args.threads, args.graceful_timeout)
+
+
+if __name__ == '__main__':
+    main()
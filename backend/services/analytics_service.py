@@ -0,0 +1,153 @@
+"""
+评分分析服务
+评分报告生成后以事件形式写入分析存储，存储增量维护各项汇总：
+得分均值与分布、按分类和按问题点的遗漏率、按预设病例的统计。
+统计接口直接读取汇总结果，不再对每个会话重新评分。
+
+同一会话重新评分时先撤回上一次的贡献再计入新报告，汇总始终对应每个会话的最新报告。
+"""
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Any, Optional, Tuple
+
+# 得分分布按10分一档，100分计入最后一档
+SCORE_BUCKETS = 10
+CUSTOM_PRESET = "custom"
+
+
+def _score_bucket(score: float) -> int:
+    return min(SCORE_BUCKETS - 1, max(0, int(score // (100 / SCORE_BUCKETS))))
+
+
+class _Contribution:
+    """单个会话最新报告对汇总的贡献，用于重新评分时撤回"""
+
+    __slots__ = ("score", "preset", "conversations", "categories", "questions")
+
+    def __init__(self, report: Dict[str, Any], preset: str):
+        summary = report.get("score_summary", {})
+        self.score = float(summary.get("recommended_score", summary.get("percentage", 0)) or 0)
+        self.preset = preset
+        self.conversations = int(report.get("conversation_count", 0))
+        self.categories: Dict[str, Tuple[int, int]] = {
+            category: (stats.get("total_questions", 0), stats.get("asked_questions", 0))
+            for category, stats in summary.get("category_stats", {}).items()
+        }
+        # (分类, 问题) → 是否问到
+        self.questions: Dict[Tuple[str, str], bool] = {}
+        for key, asked in (("fully_matched_questions", True), ("partially_matched_questions", False),
+                           ("missed_questions", False)):
+            for item in report.get(key, []):
+                self.questions[(item.get("category", ""), item.get("question", ""))] = asked
+
+
+class AnalyticsStore:
+    """评分报告事件的增量汇总，读取开销与会话数无关"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contributions: Dict[str, _Contribution] = {}
+        self._reset_aggregates()
+
+    def _reset_aggregates(self):
+        self.sessions = 0
+        self.score_sum = 0.0
+        self.score_sq_sum = 0.0
+        self.conversations = 0
+        self.buckets = [0] * SCORE_BUCKETS
+        self.categories = defaultdict(lambda: [0, 0])    # 分类 → [问题点总数, 问到数]
+        self.questions = defaultdict(lambda: [0, 0])     # (分类, 问题) → [评分次数, 问到次数]
+        self.presets = defaultdict(lambda: [0, 0.0])     # 预设 → [会话数, 得分和]
+
+    def _apply(self, contribution: _Contribution, sign: int) -> None:
+        """计入（sign=1）或撤回（sign=-1）一个会话的贡献（调用方持有锁）"""
+        self.sessions += sign
+        self.score_sum += sign * contribution.score
+        self.score_sq_sum += sign * contribution.score ** 2
+        self.conversations += sign * contribution.conversations
+        self.buckets[_score_bucket(contribution.score)] += sign
+        for category, (total, asked) in contribution.categories.items():
+            stats = self.categories[category]
+            stats[0] += sign * total
+            stats[1] += sign * asked
+        for key, asked in contribution.questions.items():
+            stats = self.questions[key]
+            stats[0] += sign
+            stats[1] += sign * asked
+        preset = self.presets[contribution.preset]
+        preset[0] += sign
+        preset[1] += sign * contribution.score
+
+    def record_report(self, session_id: str, report: Dict[str, Any], preset: Optional[str] = None) -> None:
+        """评分报告生成事件：撤回该会话上一次的贡献，计入新报告"""
+        if not report or "score_summary" not in report:
+            return
+        contribution = _Contribution(report, preset or CUSTOM_PRESET)
+        with self._lock:
+            previous = self._contributions.get(session_id)
+            if previous is not None:
+                self._apply(previous, -1)
+            self._apply(contribution, 1)
+            self._contributions[session_id] = contribution
+
+    def release(self, session_id: str) -> None:
+        """会话已删除，不会再被重新评分：保留其汇总，只释放撤回所需的明细"""
+        with self._lock:
+            self._contributions.pop(session_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._contributions.clear()
+            self._reset_aggregates()
+
+    def snapshot(self, top_missed: int = 10) -> Dict[str, Any]:
+        """当前汇总结果"""
+        with self._lock:
+            sessions = self.sessions
+            mean = self.score_sum / sessions if sessions else 0.0
+            variance = max(0.0, self.score_sq_sum / sessions - mean ** 2) if sessions else 0.0
+            buckets = list(self.buckets)
+            categories = {
+                category: {
+                    "total_questions": total,
+                    "asked_questions": asked,
+                    "miss_rate": round((1 - asked / total) * 100, 2) if total else 0.0
+                }
+                for category, (total, asked) in self.categories.items() if total
+            }
+            questions = [
+                {"category": category, "question": question, "evaluated": evaluated,
+                 "miss_rate": round((1 - asked / evaluated) * 100, 2)}
+                for (category, question), (evaluated, asked) in self.questions.items() if evaluated
+            ]
+            presets = {
+                preset: {"sessions": count, "average_score": round(total / count, 2)}
+                for preset, (count, total) in self.presets.items() if count
+            }
+            conversations = self.conversations
+
+        questions.sort(key=lambda q: (-q["miss_rate"], -q["evaluated"]))
+        width = 100 // SCORE_BUCKETS
+        return {
+            "scored_sessions": sessions,
+            "total_conversations": conversations,
+            "average_score": round(mean, 2),
+            "score_stddev": round(math.sqrt(variance), 2),
+            "score_distribution": {
+                "excellent": buckets[9],
+                "good": buckets[8],
+                "average": buckets[7],
+                "poor": sum(buckets[:7])
+            },
+            "score_histogram": [
+                {"range": f"{i * width}-{(i + 1) * width}", "count": count} for i, count in enumerate(buckets)
+            ],
+            "category_miss_rates": categories,
+            "most_missed_questions": questions[:top_missed],
+            "presets": presets
+        }
+
+
+# 全局实例
+analytics_store = AnalyticsStore()
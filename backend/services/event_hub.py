@@ -0,0 +1,153 @@
+"""
+会话事件推送中心
+每个会话一个频道（session:<会话ID>），教师看板一个频道（dashboard）。
+发布方（对话、评分任务、会话过期/删除）只追加事件并唤醒该频道的订阅者，
+同一频道的所有SSE连接共用一个等待条件和最近事件缓冲，断线重连时按序号（Last-Event-ID）续传。
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Iterator, Optional
+
+DASHBOARD_CHANNEL = "dashboard"
+
+
+def session_channel(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+class _Channel:
+    """一个频道：最近事件缓冲 + 订阅者集合（共用一个条件变量）"""
+
+    __slots__ = ("events", "next_seq", "subscribers", "closed", "condition")
+
+    def __init__(self, buffer_size: int):
+        self.events = deque(maxlen=buffer_size)
+        self.next_seq = 0
+        self.subscribers = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+
+class EventHub:
+    """按频道扇出事件，订阅者数量不影响发布开销"""
+
+    def __init__(self, buffer_size: int = 100, max_subscribers: int = 1000):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._channels: Dict[str, _Channel] = {}
+        self._lock = threading.Lock()
+        self._subscribers = 0
+
+    def _channel(self, name: str) -> _Channel:
+        channel = self._channels.get(name)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.setdefault(name, _Channel(self.buffer_size))
+        return channel
+
+    def publish(self, channel_name: str, event_type: str, data: Dict[str, Any]) -> None:
+        """发布事件；频道不存在时创建（订阅前发生的事件可在重连续传时补发）"""
+        channel = self._channel(channel_name)
+        with channel.condition:
+            channel.events.append({"seq": channel.next_seq, "type": event_type,
+                                   "time": time.time(), "data": data})
+            channel.next_seq += 1
+            channel.condition.notify_all()
+
+    def close(self, channel_name: str, event_type: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> None:
+        """发布最后一个事件（如有）后关闭频道，订阅者收完缓冲中的事件后结束"""
+        if event_type is not None:
+            self.publish(channel_name, event_type, data or {})
+        with self._lock:
+            channel = self._channels.pop(channel_name, None)
+        if channel is not None:
+            with channel.condition:
+                channel.closed = True
+                channel.condition.notify_all()
+
+    def shutdown(self) -> None:
+        """关闭所有频道（服务停止时），正在推送的连接随之结束，不占用排空时间"""
+        with self._lock:
+            names = list(self._channels)
+        for name in names:
+            self.close(name)
+
+    def subscribe(self, channel_name: str, last_seq: int = -1,
+                  keepalive: float = 15.0) -> Optional["Subscription"]:
+        """订阅频道；订阅者已满时返回None"""
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                return None
+            self._subscribers += 1
+        channel = self._channel(channel_name)
+        with channel.condition:
+            channel.subscribers += 1
+        return Subscription(self, channel, last_seq, keepalive)
+
+    def _release(self, channel: _Channel) -> None:
+        with channel.condition:
+            channel.subscribers -= 1
+        with self._lock:
+            self._subscribers -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            channels = list(self._channels.items())
+            total = self._subscribers
+        return {
+            "channels": len(channels),
+            "subscribers": total,
+            "dashboard_subscribers": next((c.subscribers for name, c in channels if name == DASHBOARD_CHANNEL), 0)
+        }
+
+
+class Subscription:
+    """
+    一个订阅者，迭代产出事件
+
+    先补发缓冲中序号大于last_seq的事件，之后阻塞等待新事件，
+    等待超过keepalive秒产出None（便于调用方发送心跳），频道关闭后结束。
+    客户端断开时调用close()释放订阅（可重复调用）
+    """
+
+    def __init__(self, hub: EventHub, channel: _Channel, last_seq: int, keepalive: float):
+        self._hub = hub
+        self._channel = channel
+        self._last_seq = last_seq
+        self._keepalive = keepalive
+        self._released = False
+        self._release_lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[Optional[Dict[str, Any]]]:
+        channel = self._channel
+        try:
+            while not self._released:
+                with channel.condition:
+                    if (not channel.events or channel.events[-1]["seq"] <= self._last_seq) and not channel.closed:
+                        channel.condition.wait(timeout=self._keepalive)
+                    pending = [e for e in channel.events if e["seq"] > self._last_seq]
+                    closed = channel.closed
+
+                if not pending:
+                    if closed:
+                        return
+                    yield None
+                    continue
+
+                for event in pending:
+                    yield event
+                self._last_seq = pending[-1]["seq"]
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+        self._hub._release(self._channel)
+
+
+# 全局实例
+event_hub = EventHub()
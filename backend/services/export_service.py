@@ -0,0 +1,147 @@
+"""
+会话批量导出服务
+按会话逐条生成导出记录（病例信息 + 对话轮次），边生成边输出，内存占用与导出的会话总数无关：
+- jsonl: 每行一个会话
+- jsonl.gz: 同上，gzip流式压缩
+- parquet: 列式存储（zstd压缩），每 PARQUET_ROW_GROUP 个会话写一个行组；需要安装pyarrow，
+  未安装时回退到 jsonl.gz
+"""
+import zlib
+from functools import lru_cache
+from typing import Dict, Any, Iterable, Iterator, List
+
+from backend.models.sp import patient_manager
+from backend.utils.serialization import dumps_bytes
+
+# 格式 → (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "jsonl.gz": ("application/gzip", "jsonl.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+# 累积到该字节数再输出一块，避免每个会话一次写入
+FLUSH_BYTES = 64 * 1024
+PARQUET_ROW_GROUP = 500
+
+
+@lru_cache(maxsize=None)
+def _pyarrow():
+    """首次导出parquet时才导入pyarrow（连带numpy，导入耗时较长），未安装时返回None"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    schema = pa.schema([
+        ("session_id", pa.string()),
+        ("preset_file", pa.string()),
+        ("patient_name", pa.string()),
+        ("disease", pa.string()),
+        ("chief_complaint", pa.string()),
+        ("created_at", pa.string()),
+        ("turn_count", pa.int32()),
+        ("turns", pa.list_(pa.struct([("user_message", pa.string()), ("sp_response", pa.string())]))),
+        ("score", pa.float64())
+    ])
+    return pa, pq, schema
+
+
+def resolve_format(export_format: str) -> str:
+    """校验导出格式；请求parquet但未安装pyarrow时回退到jsonl.gz"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}，可选: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "parquet" and _pyarrow() is None:
+        return "jsonl.gz"
+    return export_format
+
+
+def iter_records(session_ids: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """逐个生成会话记录；导出过程中被删除或过期的会话跳过"""
+    for session_id in session_ids:
+        sp = patient_manager.get_session(session_id)
+        if sp is not None:
+            yield sp.export_record()
+
+
+def _iter_jsonl(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    buffer = bytearray()
+    for record in records:
+        buffer += dumps_bytes(record)
+        buffer += b"\n"
+        if len(buffer) >= FLUSH_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _iter_jsonl_gz(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    # wbits=31: 带gzip头，可直接用 gzip/zcat 解压
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in _iter_jsonl(records):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink:
+    """ParquetWriter的输出目标：收集写入的字节，由生成器按行组取走"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_parquet(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    pa, pq, schema = _pyarrow()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= PARQUET_ROW_GROUP:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+                yield sink.take()
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def iter_export(session_ids: Iterable[str], export_format: str) -> Iterator[bytes]:
+    """按格式流式输出会话（export_format 需先经 resolve_format 处理）"""
+    records = iter_records(session_ids)
+    if export_format == "parquet":
+        return _iter_parquet(records)
+    if export_format == "jsonl.gz":
+        return _iter_jsonl_gz(records)
+    return _iter_jsonl(records)
@@ -3,8 +3,13 @@
 """
 import os
 import json
+import threading
 from typing import List, Dict, Any
 
+# 已解析的预设：路径 → (修改时间, 病例数据)，文件修改后重新解析
+_preset_cache: Dict[str, tuple] = {}
+_preset_cache_lock = threading.Lock()
+
 
 class PresetService:
     """预设病例服务类"""
@@ -50,3 +55,36 @@ class PresetService:
     def preset_exists(filename: str) -> bool:
         """检查预设文件是否存在"""
         return os.path.exists(PresetService.get_preset_path(filename))
+    
+    @staticmethod
+    def load_preset(filename: str) -> Dict[str, Any]:
+        """
+        读取并解析预设病例（按文件修改时间缓存）
+        返回顶层字典的浅拷贝：会话只替换顶层字段，嵌套内容在会话间共享且只读
+        """
+        path = PresetService.get_preset_path(filename)
+        mtime = os.path.getmtime(path)
+        cached = _preset_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            cached = (mtime, data)
+            with _preset_cache_lock:
+                _preset_cache[path] = cached
+        return dict(cached[1])
+    
+    @staticmethod
+    def warm_up() -> int:
+        """预解析全部预设病例，返回成功解析的数量"""
+        presets_dir = PresetService.get_presets_directory()
+        if not os.path.exists(presets_dir):
+            return 0
+        loaded = 0
+        for file in os.listdir(presets_dir):
+            if file.endswith('.json'):
+                try:
+                    PresetService.load_preset(file)
+                    loaded += 1
+                except Exception as e:
+                    print(f"预解析预设文件 {file} 时出错: {e}")
+        return loaded
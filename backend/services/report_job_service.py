@@ -0,0 +1,221 @@
+"""
+评分报告异步任务服务
+评分报告需要 N×M 次AI调用，放到后台线程执行，客户端通过轮询或SSE获取进度
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Iterator
+
+from observability.metrics import CACHE_REQUESTS
+from observability.tracing import start_trace, current_trace_id
+from backend.services.event_hub import event_hub, session_channel, DASHBOARD_CHANNEL
+
+
+class ReportJob:
+    """单个评分报告任务"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    def __init__(self, session_id: str, total_pairs: int = 0):
+        self.job_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.status = self.PENDING
+        self.total_pairs = total_pairs
+        self.evaluated_pairs = 0
+        self.events: List[Dict[str, Any]] = []  # 部分结果事件，供SSE按序号续传
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.trace_id: Optional[str] = None
+        self._condition = threading.Condition()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.COMPLETED, self.FAILED)
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        """追加事件并唤醒等待中的SSE订阅者，同时转发到会话频道"""
+        with self._condition:
+            event["seq"] = len(self.events)
+            self.events.append(event)
+            self._condition.notify_all()
+        event_hub.publish(session_channel(self.session_id), f"score_{event['type']}",
+                          dict(event, job_id=self.job_id))
+        if event["type"] == self.COMPLETED:
+            event_hub.publish(DASHBOARD_CHANNEL, "session_scored", {
+                "session_id": self.session_id,
+                "job_id": self.job_id,
+                "cached": self.cached
+            })
+
+    def mark_running(self) -> None:
+        self.status = self.RUNNING
+        self._publish({"type": "started", "total_pairs": self.total_pairs})
+
+    def record_progress(self, evaluated_pairs: int, total_pairs: int, question_item, evaluation: Dict[str, Any]) -> None:
+        """评分系统的进度回调"""
+        self.evaluated_pairs = evaluated_pairs
+        self.total_pairs = total_pairs
+        self._publish({
+            "type": "progress",
+            "evaluated_pairs": evaluated_pairs,
+            "total_pairs": total_pairs,
+            "question": question_item.question,
+            "category": question_item.category,
+            "message": evaluation.get("message", ""),
+            "overall_score": evaluation.get("overall_score", 0),
+            "is_match": evaluation.get("is_match", False),
+            "best_match_score": question_item.best_match_score,
+            "is_asked": question_item.is_asked
+        })
+
+    def complete(self, report: Dict[str, Any], cached: bool = False) -> None:
+        self.result = report
+        self.cached = cached
+        self.evaluated_pairs = self.total_pairs
+        self.finished_at = time.time()
+        self.status = self.COMPLETED
+        self._publish({"type": "completed", "cached": cached})
+
+    def fail(self, error: str) -> None:
+        self.error = error
+        self.finished_at = time.time()
+        self.status = self.FAILED
+        self._publish({"type": "failed", "error": error})
+
+    def iter_events(self, start: int = 0, keepalive: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        从指定序号开始迭代事件，直到任务结束
+
+        等待超过keepalive秒没有新事件时产出None，便于调用方发送心跳
+        """
+        index = start
+        while True:
+            with self._condition:
+                if index >= len(self.events) and not self.is_finished:
+                    self._condition.wait(timeout=keepalive)
+                pending = self.events[index:]
+                finished = self.is_finished
+
+            if not pending:
+                if finished:
+                    return
+                yield None
+                continue
+
+            for event in pending:
+                yield event
+            index += len(pending)
+
+    def to_dict(self, include_result: bool = False) -> Dict[str, Any]:
+        """转换为字典格式"""
+        progress = (self.evaluated_pairs / self.total_pairs * 100) if self.total_pairs else (100.0 if self.is_finished else 0.0)
+        data = {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "evaluated_pairs": self.evaluated_pairs,
+            "total_pairs": self.total_pairs,
+            "progress": round(progress, 1),
+            "cached": self.cached,
+            "error": self.error,
+            "trace_id": self.trace_id,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "finished_at": datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None
+        }
+        if include_result:
+            data["report"] = self.result
+        return data
+
+
+class ReportJobManager:
+    """评分报告任务管理器"""
+
+    def __init__(self, max_workers: int = 4, job_ttl: int = 3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._jobs: Dict[str, ReportJob] = {}
+        self._active_by_session: Dict[str, str] = {}  # session_id -> 进行中的job_id
+        self._lock = threading.Lock()
+        self.job_ttl = job_ttl
+
+    def submit(self, session_id: str, sp) -> ReportJob:
+        """
+        提交评分报告任务
+
+        同一会话已有进行中的任务时直接复用；报告缓存有效时任务立即完成
+        """
+        with self._lock:
+            self._prune_finished_jobs()
+
+            active_id = self._active_by_session.get(session_id)
+            if active_id and active_id in self._jobs and not self._jobs[active_id].is_finished:
+                return self._jobs[active_id]
+
+            job = ReportJob(session_id, total_pairs=sp.scoring_system.get_total_pairs())
+            self._jobs[job.job_id] = job
+
+            cached = sp.get_cached_score_report()
+            if cached is not None:
+                CACHE_REQUESTS.inc(cache="score_report", result="hit")
+                job.complete(cached, cached=True)
+                return job
+
+            self._active_by_session[session_id] = job.job_id
+
+        self._executor.submit(self._run_job, job, sp, current_trace_id())
+        return job
+
+    def _run_job(self, job: ReportJob, sp, parent_trace_id: Optional[str] = None) -> None:
+        """在工作线程中执行评分（提交请求被追踪时，任务也单独追踪）"""
+        job.mark_running()
+        try:
+            with start_trace("report_job", force=parent_trace_id is not None, session_id=job.session_id,
+                             job_id=job.job_id, parent_trace_id=parent_trace_id):
+                job.trace_id = current_trace_id()
+                report = sp.get_score_report(progress_callback=job.record_progress)
+            job.complete(report)
+        except Exception as e:
+            job.fail(str(e))
+        finally:
+            with self._lock:
+                if self._active_by_session.get(job.session_id) == job.job_id:
+                    del self._active_by_session[job.session_id]
+
+    @property
+    def active_jobs(self) -> int:
+        """进行中的任务数"""
+        with self._lock:
+            return len(self._active_by_session)
+
+    def wait_idle(self, timeout: float) -> bool:
+        """等待进行中的任务全部完成（优雅停止时使用），超时返回False"""
+        deadline = time.time() + timeout
+        while self.active_jobs:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def get_job(self, job_id: str) -> Optional[ReportJob]:
+        """获取任务"""
+        return self._jobs.get(job_id)
+
+    def _prune_finished_jobs(self) -> None:
+        """清理超过保留时间的已完成任务（调用方持有锁）"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.is_finished and now - job.finished_at > self.job_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# 全局实例
+report_job_manager = ReportJobManager()
@@ -0,0 +1,34 @@
+"""
+会话生命周期事件服务
+注册到 patient_manager 后：会话创建、删除/过期时通知看板和该会话的订阅者，
+评分报告生成时计入分析统计，会话删除后释放其统计明细
+"""
+from typing import Dict, Any
+
+from backend.models.sp import SessionListener, StandardPatient
+from backend.services.analytics_service import analytics_store
+from backend.services.event_hub import event_hub, session_channel, DASHBOARD_CHANNEL
+
+
+class SessionEventPublisher(SessionListener):
+    """把会话生命周期转发给分析统计和事件推送中心"""
+
+    def session_created(self, sp: StandardPatient) -> None:
+        event_hub.publish(DASHBOARD_CHANNEL, "session_created", {
+            "session_id": sp.session_id,
+            "patient_name": sp.patient_name,
+            "preset_file": sp.preset_file
+        })
+
+    def session_removed(self, sp: StandardPatient, reason: str) -> None:
+        analytics_store.release(sp.session_id)
+        event = {"session_id": sp.session_id, "patient_name": sp.patient_name}
+        event_hub.close(session_channel(sp.session_id), f"session_{reason}", event)
+        event_hub.publish(DASHBOARD_CHANNEL, f"session_{reason}", event)
+
+    def report_generated(self, sp: StandardPatient, report: Dict[str, Any]) -> None:
+        analytics_store.record_report(sp.session_id, report, sp.preset_file)
+
+
+# 全局实例
+session_event_publisher = SessionEventPublisher()
@@ -3,7 +3,7 @@ SP会话服务
 """
 import os
 import sys
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 # 导入SP相关模块
@@ -11,9 +11,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 from backend.models.sp import StandardPatient, patient_manager
 from sp_data import Sp_data
-from engine.gpt import GPTEngine
+from engine.factory import create_engine
 from backend.models.session import SessionManager
 from backend.services.preset_service import PresetService
+from backend.services.event_hub import event_hub, session_channel, DASHBOARD_CHANNEL
+from observability.tracing import traced
 
 
 class SPService:
@@ -38,15 +40,14 @@ class SPService:
         if preset_file:
             if not PresetService.preset_exists(preset_file):
                 raise ValueError(f"预设文件 {preset_file} 不存在")
-            preset_path = PresetService.get_preset_path(preset_file)
-            sp_data.load_from_json(preset_path)
+            sp_data.data = PresetService.load_preset(preset_file)
         elif custom_data:
             sp_data.data = custom_data
         else:
             raise ValueError("必须提供 preset_file 或 custom_data")
         # 创建增强SP实例
-        engine = GPTEngine()
-        sp = patient_manager.create_session(session_id, sp_data, engine)
+        engine = create_engine()
+        sp = patient_manager.create_session(session_id, sp_data, engine, preset_file=preset_file)
         
         # 也在原有的session_manager中注册，保持兼容性
         self.session_manager.create_session(session_id, sp, preset_file)
@@ -63,6 +64,56 @@ class SPService:
             "created_at": datetime.fromtimestamp(metadata["created_at"]).isoformat()
         }
     
+    @traced("SPService.create_sp_sessions_bulk")
+    def create_sp_sessions_bulk(self, preset_file: str, session_ids: List[str]) -> Dict[str, Any]:
+        """
+        为同一预设病例批量创建会话（考试开始时一次性为全体学生创建）
+        
+        病例只加载一次，所有会话共用解析后的病例数据；系统提示只渲染一次、
+        评分问题点只解析一次，其余会话以第一个会话为模板复制。
+        任一会话ID无效时不创建任何会话。
+        """
+        if not session_ids:
+            raise ValueError("至少需要创建一个会话")
+        if len(set(session_ids)) != len(session_ids):
+            raise ValueError("会话ID不能重复")
+        existing = [s for s in session_ids if self.session_manager.session_exists(s)]
+        if existing:
+            raise ValueError(f"会话已存在: {', '.join(existing[:10])}")
+        if self.session_manager.get_session_count() + len(session_ids) > self.session_manager.max_sessions:
+            raise ValueError(f"超过最大会话数量限制（{self.session_manager.max_sessions}）")
+        if not PresetService.preset_exists(preset_file):
+            raise ValueError(f"预设文件 {preset_file} 不存在")
+        
+        sp_data = Sp_data()
+        sp_data.data = PresetService.load_preset(preset_file)
+        
+        template = None
+        for session_id in session_ids:
+            sp = patient_manager.create_session(session_id, sp_data, create_engine(), preset_file=preset_file,
+                                                template=template, notify=False)
+            self.session_manager.create_session(session_id, sp, preset_file)
+            if template is None:
+                template = sp
+        
+        # 看板只需刷新一次
+        event_hub.publish(DASHBOARD_CHANNEL, "sessions_created", {
+            "preset_file": preset_file,
+            "count": len(session_ids)
+        })
+        
+        basics = sp_data.basics if isinstance(sp_data.basics, dict) else {}
+        return {
+            "preset_file": preset_file,
+            "patient_name": basics.get("name", "未知"),
+            "disease": sp_data.disease,
+            "chief_complaint": sp_data.data.get("chief_complaint", ""),
+            "count": len(session_ids),
+            "session_ids": session_ids,
+            "created_at": datetime.now().isoformat()
+        }
+    
+    @traced("SPService.chat_with_sp")
     def chat_with_sp(self, session_id: str, message: str) -> Dict[str, Any]:
         """与SP进行对话（优化版）"""
         # 直接从patient_manager获取会话，简化查找逻辑
@@ -75,63 +126,79 @@ class SPService:
         
         # 核心对话处理
         response = sp.speak(message)
+        self.session_manager.update_activity(session_id)
         
         # 简化的响应构造
-        return {
+        result = {
             "session_id": session_id,
             "user_message": message,
             "sp_response": response,
             "timestamp": datetime.now().isoformat(),
-            "message_count": sp.conversation_count  # 直接使用SP的计数
+            "message_count": sp.conversation_count,  # 直接使用SP的计数
+            "turn_index": sp.turn_count - 1
         }
+        # 推送给正在查看该会话的教师，看板只需知道有新活动
+        event_hub.publish(session_channel(session_id), "turn", result)
+        event_hub.publish(DASHBOARD_CHANNEL, "session_activity", {
+            "session_id": session_id,
+            "message_count": result["message_count"]
+        })
+        return result
     
-    def get_chat_history(self, session_id: str) -> Dict[str, Any]:
-        """获取对话历史"""
-        # 优先从patient_manager获取会话
+    def _find_session(self, session_id: str):
+        """查找会话，优先从patient_manager获取"""
         sp = patient_manager.get_session(session_id)
         if not sp:
             # 兼容性：从原有session_manager获取
             if not self.session_manager.session_exists(session_id):
                 raise ValueError(f"会话 {session_id} 不存在")
             sp = self.session_manager.get_session(session_id)
+        return sp
+    
+    def get_history_etag(self, session_id: str) -> Optional[str]:
+        """对话历史的ETag（会话创建时间 + 消息数），有新消息才变化；旧版会话返回None"""
+        sp = self._find_session(session_id)
+        if not hasattr(sp, 'history_version'):
+            return None
+        return f"{int(sp.created_at * 1000):x}-{sp.history_version}"
+    
+    def get_chat_history(self, session_id: str, cursor: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        获取对话历史
+        
+        Args:
+            cursor: 起始轮次下标；增量轮询时传入客户端已有的轮数，只返回之后的新轮次
+            limit: 本页最多返回的轮数，默认返回cursor之后的全部
+        """
+        sp = self._find_session(session_id)
         
-        # 使用增强SP的方法获取对话历史
-        if hasattr(sp, 'get_conversation_history'):
-            conversation_history = sp.get_conversation_history()
-            history = []
-            
-            # 将对话历史转换为配对格式
-            for i in range(0, len(conversation_history), 2):
-                if i + 1 < len(conversation_history):
-                    user_msg = conversation_history[i]
-                    assistant_msg = conversation_history[i + 1]
-                    
-                    if user_msg["role"] == "user" and assistant_msg["role"] == "assistant":
-                        history.append({
-                            "user_message": user_msg["content"],
-                            "sp_response": assistant_msg["content"],
-                            "timestamp": f"第{len(history)+1}轮对话"
-                        })
+        if hasattr(sp, 'get_turns'):
+            # 增量维护的轮次列表，只复制本页
+            total = sp.turn_count
+            turns = sp.get_turns(cursor, limit)
         else:
-            # 兼容性：使用原有方法
-            history = []
+            # 兼容性：旧版会话从消息列表配对
+            paired = []
             for i, memory in enumerate(sp.memories):
                 if memory["role"] != "user" or i == 0:  # 跳过第一条系统消息
                     continue
-                
-                user_msg = memory["content"]
                 # 查找对应的助手回复
                 if i + 1 < len(sp.memories) and sp.memories[i + 1]["role"] == "assistant":
-                    assistant_msg = sp.memories[i + 1]["content"]
-                    history.append({
-                        "user_message": user_msg,
-                        "sp_response": assistant_msg,
-                        "timestamp": f"第{len(history)+1}轮对话"
-                    })
+                    paired.append({"user_message": memory["content"], "sp_response": sp.memories[i + 1]["content"]})
+            total = len(paired)
+            turns = paired[cursor:None if limit is None else cursor + limit]
         
+        history = [
+            {**turn, "timestamp": f"第{cursor + n + 1}轮对话"}
+            for n, turn in enumerate(turns)
+        ]
+        next_cursor = cursor + len(history)
         return {
             "session_id": session_id,
-            "total_messages": len(history),
+            "total_messages": total,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor < total,
             "history": history
         }
     
@@ -153,6 +220,7 @@ class SPService:
         
         # 获取会话信息用于返回
         session_info = self.session_manager.delete_session(session_id)
+        patient_manager.delete_session(session_id)
         
         return {
             "session_id": session_id,
@@ -0,0 +1,175 @@
+"""
+启动预热服务
+应用创建后在后台线程中依次预热：解析全部预设病例、读取提示模板并加载评分模块、
+建立到模型服务的连接（可选再发一次极小的请求）。全部步骤完成后才报告就绪，
+/api/health/ready 据此返回200或503；存活检查与预热无关。
+
+提示模板是必需步骤：模板缺失或为空时对话无法使用，预热失败，就绪检查持续返回503。
+其他步骤失败只记录错误，不阻止就绪（模型服务不可达时评分仍可使用本地降级评估），
+失败的步骤在就绪检查的 failed_steps 中列出。
+进程开始优雅停止后就绪检查重新返回503，负载均衡不再分配新请求。
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+
+WARMUP_STEPS = ("presets", "prompt_templates", "model_connection")
+# 失败时不报告就绪的步骤
+REQUIRED_WARMUP_STEPS = ("prompt_templates",)
+
+
+class WarmupState:
+    """预热进度，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.draining = False
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at: Optional[float] = None
+            self.finished_at: Optional[float] = None
+            self.steps: Dict[str, Dict[str, Any]] = {
+                name: {"status": "pending"} for name in WARMUP_STEPS
+            }
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def failed_steps(self) -> List[str]:
+        with self._lock:
+            return [name for name, step in self.steps.items() if step["status"] == "failed"]
+
+    @property
+    def ready(self) -> bool:
+        return self.finished and not any(name in REQUIRED_WARMUP_STEPS for name in self.failed_steps)
+
+    def run_step(self, name: str, action: Callable[[], Any]) -> None:
+        """执行一个预热步骤并记录耗时、结果或错误"""
+        with self._lock:
+            self.steps[name] = {"status": "running"}
+        start = time.time()
+        try:
+            detail = action()
+            step = {"status": "done"}
+            if detail is not None:
+                step["detail"] = detail
+        except Exception as e:
+            print(f"⚠️ 预热步骤 {name} 失败: {e}")
+            step = {"status": "failed", "error": str(e)}
+        step["seconds"] = round(time.time() - start, 3)
+        with self._lock:
+            self.steps[name] = step
+
+    def run(self, steps: List[tuple]) -> None:
+        self.started_at = time.time()
+        for name, action in steps:
+            self.run_step(name, action)
+        self.finished_at = time.time()
+        failed = self.failed_steps
+        suffix = f"（失败步骤: {', '.join(failed)}）" if failed else ""
+        print(f"🔥 预热完成，耗时 {self.finished_at - self.started_at:.2f}秒{suffix}")
+
+    def start(self, steps: List[tuple]) -> bool:
+        """在后台线程中预热，已开始过则返回False"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True)
+        self._thread.start()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready
+
+    def mark_ready(self) -> None:
+        """关闭预热时直接视为就绪"""
+        now = time.time()
+        with self._lock:
+            self.started_at = self.started_at or now
+            self.finished_at = now
+            for step in self.steps.values():
+                if step["status"] == "pending":
+                    step["status"] = "skipped"
+
+    def start_draining(self) -> None:
+        """进程开始优雅停止：就绪检查返回503，进行中的请求继续处理"""
+        self.draining = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            started_at, finished_at = self.started_at, self.finished_at
+            steps = {name: dict(step) for name, step in self.steps.items()}
+        failed = [name for name, step in steps.items() if step["status"] == "failed"]
+        return {
+            "ready": (finished_at is not None and not self.draining
+                      and not any(name in REQUIRED_WARMUP_STEPS for name in failed)),
+            "finished": finished_at is not None,
+            "draining": self.draining,
+            "failed_steps": failed,
+            "started_at": datetime.fromtimestamp(started_at).isoformat() if started_at else None,
+            "warmup_seconds": round(finished_at - started_at, 3) if finished_at and started_at else None,
+            "steps": steps
+        }
+
+
+def _warm_presets():
+    from backend.services.preset_service import PresetService
+    return {"presets": PresetService.warm_up()}
+
+
+def _warm_prompt_templates():
+    """读取对话提示模板，并加载评分模块（含numpy），首个评分报告不再承担导入开销；模板缺失或为空时失败"""
+    from backend.models.sp import DEFAULT_PROMPT_PATH, load_prompt_template
+    import modules.score_aggregation  # noqa: F401
+    template = load_prompt_template(DEFAULT_PROMPT_PATH)
+    if not template.strip():
+        raise ValueError(f"提示模板为空: {DEFAULT_PROMPT_PATH}")
+    return {"template_chars": len(template)}
+
+
+def _warm_model_connection(request: bool):
+    from engine.factory import create_engine
+    engine = create_engine()
+    seconds = engine.warm_up(request=request)
+    return {"engine": type(engine).__name__, "request": request,
+            "connect_seconds": round(seconds, 3) if seconds is not None else None}
+
+
+def warmup_steps(warm_request: bool = False) -> List[tuple]:
+    return [
+        ("presets", _warm_presets),
+        ("prompt_templates", _warm_prompt_templates),
+        ("model_connection", lambda: _warm_model_connection(warm_request))
+    ]
+
+
+def start_warmup(enabled: bool = True, warm_request: Optional[bool] = None) -> WarmupState:
+    """
+    开始启动预热（每个进程只执行一次）
+
+    Args:
+        enabled: 关闭时立即报告就绪
+        warm_request: 是否向模型服务发一次极小的请求，默认读取 WARMUP_REQUEST 环境变量
+    """
+    if not enabled:
+        warmup_state.mark_ready()
+        return warmup_state
+    if warm_request is None:
+        warm_request = os.environ.get('WARMUP_REQUEST', 'false').lower() == 'true'
+    if warmup_state.start(warmup_steps(warm_request)):
+        print("🔥 启动预热中（预设病例 / 提示模板 / 模型连接）...")
+    return warmup_state
+
+
+# 全局实例
+warmup_state = WarmupState()
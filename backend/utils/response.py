@@ -4,6 +4,22 @@ API响应工具类
 from flask import jsonify
 from typing import Any
 
+from observability.tracing import current_trace_id
+
+
+def _envelope(code: int, success: bool, message: str, data: Any) -> dict:
+    """响应信封；请求被追踪时附带trace_id，便于定位慢请求"""
+    body = {
+        "code": code,
+        "success": success,
+        "message": message,
+        "data": data
+    }
+    trace_id = current_trace_id()
+    if trace_id:
+        body["trace_id"] = trace_id
+    return body
+
 
 class APIResponse:
     """统一的API响应格式"""
@@ -11,19 +27,9 @@ class APIResponse:
     @staticmethod
     def success(data: Any = None, message: str = "操作成功"):
         """成功响应"""
-        return jsonify({
-            "code": 200,
-            "success": True,
-            "message": message,
-            "data": data
-        })
+        return jsonify(_envelope(200, True, message, data))
     
     @staticmethod
-    def error(message: str = "操作失败", code: int = 400):
+    def error(message: str = "操作失败", code: int = 400, data: Any = None):
         """错误响应"""
-        return jsonify({
-            "code": code,
-            "success": False,
-            "message": message,
-            "data": None
-        }), code
+        return jsonify(_envelope(code, False, message, data)), code
@@ -0,0 +1,44 @@
+"""
+JSON序列化
+Flask默认的JSON输出把中文转义为\\uXXXX（每个字符6字节）、按键排序，调试模式下还会缩进。
+FastJSONProvider 输出紧凑的UTF-8 JSON；安装了orjson时由orjson直接生成字节，否则使用标准库json。
+"""
+import json
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    # 日期交给Flask的默认处理（保持原有格式），非字符串键与numpy值按orjson规则转换
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(obj: Any, default=None) -> bytes:
+    """序列化为紧凑的UTF-8 JSON字节"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # 超出orjson支持范围（如超过64位的整数），回退到标准库
+            pass
+    return json.dumps(obj, default=default, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """紧凑、不转义中文的JSON输出"""
+
+    ensure_ascii = False
+    sort_keys = False
+    compact = True
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        """序列化为UTF-8字节"""
+        return dumps_bytes(obj, self.default)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
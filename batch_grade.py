@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+批量评分命令行工具
+考试结束后对导出的会话记录统一评分，结果流式写入JSONL或CSV
+
+用法:
+    python batch_grade.py transcripts.jsonl -o results.csv --preset acute_mi_scoring.json
+    python batch_grade.py a.json b.json -o results.jsonl --workers 16 --rpm 300
+    python batch_grade.py archive.jsonl -o v1.csv --record responses.sqlite     # 调用模型并录制
+    python batch_grade.py archive.jsonl -o v2.csv --replay responses.sqlite --threshold 70  # 零调用重评
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from modules.batch_scoring import BatchGrader, load_transcripts, write_results
+from engine.stub import StubEngine
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI标准化病人批量评分")
+    parser.add_argument("transcripts", nargs="+", help="导出的会话记录文件（JSON数组或JSONL）")
+    parser.add_argument("-o", "--output", required=True, help="输出文件，.csv 输出CSV，其余输出JSONL")
+    parser.add_argument("--preset", help="记录未携带病例数据时使用的预设病例文件")
+    parser.add_argument("--workers", type=int, default=8, help="并发AI调用数")
+    parser.add_argument("--rpm", type=float, default=None, help="全局每分钟请求上限")
+    parser.add_argument("--threshold", type=float, default=60.0, help="匹配阈值")
+    parser.add_argument("--with-context", action="store_true", help="评估时使用对话上下文（并按上下文去重，默认不使用）")
+    parser.add_argument("--stub", action="store_true", help="使用离线桩引擎（不调用模型）")
+    StubEngine.add_parser_args(parser)
+    store = parser.add_mutually_exclusive_group()
+    store.add_argument("--record", metavar="STORE", help="录制模型响应到该SQLite文件（已录制的请求直接复用）")
+    store.add_argument("--replay", metavar="STORE", help="只从该SQLite文件回放模型响应，不调用模型")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    transcripts = []
+    for path in args.transcripts:
+        transcripts.extend(load_transcripts(path))
+
+    default_case_data = None
+    if args.preset:
+        from backend.services.preset_service import PresetService
+        preset_path = args.preset if os.path.exists(args.preset) else PresetService.get_preset_path(args.preset)
+        with open(preset_path, 'r', encoding='utf-8') as f:
+            default_case_data = json.load(f)
+
+    engine = None
+    if args.stub:
+        engine = StubEngine(latency=args.stub_latency)
+    if args.record or args.replay:
+        from engine.factory import create_engine
+        from engine.record_replay import RecordingEngine, ReplayEngine
+        if args.replay:
+            # 回放 --stub 录制的响应时按桩引擎的模型名查找
+            engine = ReplayEngine(args.replay, model_name=StubEngine._model_name if args.stub else None)
+        else:
+            engine = RecordingEngine(engine or create_engine(), args.record)
+
+    grader = BatchGrader(
+        engine=engine,
+        max_workers=args.workers,
+        requests_per_minute=args.rpm,
+        threshold=args.threshold,
+        include_context_in_key=args.with_context,
+        default_case_data=default_case_data
+    )
+
+    print(f"📚 共 {len(transcripts)} 份记录，开始批量评分...")
+    start_time = time.time()
+    count = write_results(grader.grade(transcripts), args.output)
+    elapsed = time.time() - start_time
+
+    stats = grader.stats
+    print(f"✅ 已写出 {count} 条结果到 {args.output}")
+    print(f"   ⏱️ 耗时: {elapsed:.2f}秒")
+    print(f"   🔢 评估对: {stats.get('total_pairs', 0)}，实际调用: {stats.get('unique_evaluations', 0)}，"
+          f"去重节省: {stats.get('deduplicated_evaluations', 0)}")
+    cohort = stats.get("cohort")
+    if cohort and cohort["sessions"]:
+        print(f"   📈 班级得分: 平均 {cohort['mean_score']}，中位数 {cohort['median_score']}，"
+              f"P10 {cohort['p10_score']}，P90 {cohort['p90_score']}")
+    usage = stats.get("token_usage")
+    if usage:
+        print(f"   🧮 Token用量: prompt {usage['prompt_tokens']}，completion {usage['completion_tokens']}")
+    if hasattr(engine, "store"):
+        print(f"   📼 响应存储: 命中 {engine.stats['hits']}，未命中 {engine.stats['misses']}，"
+              f"共 {len(engine.store)} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+批量评分吞吐基准
+使用桩引擎模拟固定延迟的模型调用，测量每分钟可评分的会话数，
+并对比逐会话串行评分（原报告接口的方式）与批量去重并发评分
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.stub import StubEngine
+from modules.batch_scoring import BatchGrader
+from modules.intelligent_scoring import IntelligentScoringSystem
+
+PRESET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "presets", "acute_mi_scoring.json")
+
+# 学生常用的问诊语句，多名学生之间高度重复
+QUESTION_POOL = [
+    "您好，哪里不舒服？", "疼痛多久了？", "疼痛在什么位置？", "是什么样的疼？",
+    "疼痛会放射到别的地方吗？", "有什么诱因吗？", "休息后能缓解吗？", "以前有高血压吗？",
+    "有糖尿病吗？", "抽烟吗？", "家里人有心脏病吗？", "有没有出汗、恶心？",
+    "吃过什么药吗？", "有药物过敏吗？", "平时喝酒吗？", "以前有过类似情况吗？"
+]
+
+
+def make_transcripts(case_data, sessions, turns, seed=42):
+    rng = random.Random(seed)
+    transcripts = []
+    for n in range(sessions):
+        messages = []
+        for question in rng.sample(QUESTION_POOL, min(turns, len(QUESTION_POOL))):
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": "嗯，是的。"})
+        transcripts.append({"session_id": f"student_{n:03d}", "case_data": case_data, "messages": messages})
+    return transcripts
+
+
+def bench_sequential(transcripts, latency):
+    engine = StubEngine(latency=latency)
+    start = time.time()
+    for transcript in transcripts:
+        system = IntelligentScoringSystem(transcript["case_data"], engine=engine)
+        for msg in transcript["messages"]:
+            system.record_message(msg["content"], msg["role"])
+        system.calculate_scores_from_history()
+        system.get_detailed_report()
+    return time.time() - start, engine.call_count
+
+
+def bench_batch(transcripts, latency, workers):
+    engine = StubEngine(latency=latency)
+    grader = BatchGrader(engine=engine, max_workers=workers)
+    start = time.time()
+    for _ in grader.grade(transcripts):
+        pass
+    return time.time() - start, engine.call_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量评分吞吐基准")
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="桩引擎每次调用延迟（秒）")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--skip-sequential", action="store_true")
+    parser.add_argument("--json", action="store_true", help="输出机器可读的JSON结果")
+    args = parser.parse_args()
+
+    with open(PRESET_PATH, 'r', encoding='utf-8') as f:
+        case_data = json.load(f)
+    transcripts = make_transcripts(case_data, args.sessions, args.turns)
+
+    results = {"sessions": args.sessions, "turns": args.turns, "latency": args.latency, "workers": args.workers}
+
+    # 评分系统会打印进度，基准中屏蔽
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not args.skip_sequential:
+            elapsed, calls = bench_sequential(transcripts, args.latency)
+            results["sequential"] = {"seconds": round(elapsed, 3), "model_calls": calls,
+                                     "sessions_per_minute": round(args.sessions / elapsed * 60, 1)}
+        elapsed, calls = bench_batch(transcripts, args.latency, args.workers)
+        results["batch"] = {"seconds": round(elapsed, 3), "model_calls": calls,
+                            "sessions_per_minute": round(args.sessions / elapsed * 60, 1)}
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+        return
+
+    print("📊 批量评分吞吐基准")
+    print(f"   会话数: {args.sessions}  每会话轮数: {args.turns}  模拟延迟: {args.latency}s  并发: {args.workers}")
+    for mode in ("sequential", "batch"):
+        if mode in results:
+            r = results[mode]
+            print(f"   {mode:<10} {r['seconds']:>8.2f}s  调用 {r['model_calls']:>6}  {r['sessions_per_minute']:>8.1f} 会话/分钟")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+考试开始时的会话创建耗时
+以生产服务器（backend/serve.py，桩引擎）启动后端，为同一预设病例创建N个会话，对比：
+- individual: 多个并发客户端各自调用 /api/sp/session/create（考试开始时全体学生同时进入）
+- bulk: 一次调用 /api/sp/sessions/bulk
+
+后端监听3000端口，运行前需确保该端口空闲（先停止 start_all.py）
+
+用法:
+    python benchmarks/bench_bulk_create.py
+    python benchmarks/bench_bulk_create.py --sessions 500 --concurrency 200 --json
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench_serving import BASE_URL, start_server, stop_server, percentile
+
+PRESET_FILE = "acute_mi_scoring.json"
+
+
+def create_individually(sessions, concurrency):
+    prefix = uuid.uuid4().hex[:8]
+    local = threading.local()
+    latencies, errors = [], []
+
+    def create(i):
+        http = getattr(local, "http", None)
+        if http is None:
+            http = local.http = requests.Session()
+        start = time.perf_counter()
+        response = http.post(f"{BASE_URL}/api/sp/session/create",
+                             json={"session_id": f"{prefix}-{i}", "preset_file": PRESET_FILE}, timeout=60)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200 or not response.json().get("success"):
+            errors.append(response.status_code)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(create, range(sessions)))
+    wall = time.perf_counter() - start
+    return {
+        "mode": "individual",
+        "sessions": sessions - len(errors),
+        "errors": len(errors),
+        "wall_seconds": round(wall, 3),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1)
+    }
+
+
+def create_bulk(sessions):
+    start = time.perf_counter()
+    response = requests.post(f"{BASE_URL}/api/sp/sessions/bulk",
+                             json={"preset_file": PRESET_FILE, "count": sessions,
+                                   "prefix": f"bulk-{uuid.uuid4().hex[:8]}"}, timeout=120)
+    wall = time.perf_counter() - start
+    created = response.json().get("data", {}).get("count", 0) if response.status_code == 200 else 0
+    return {
+        "mode": "bulk",
+        "sessions": created,
+        "errors": 0 if created == sessions else 1,
+        "wall_seconds": round(wall, 3),
+        "p50_ms": round(wall * 1000, 1),
+        "p99_ms": round(wall * 1000, 1)
+    }
+
+
+def measure(mode, sessions, concurrency, threads):
+    # 每种方式使用新启动的服务器，互不影响
+    process = start_server("builtin", threads, 1, 0)
+    try:
+        if mode == "bulk":
+            return create_bulk(sessions)
+        return create_individually(sessions, concurrency)
+    finally:
+        stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量创建会话耗时（桩引擎）")
+    parser.add_argument("--sessions", type=int, default=500, help="创建的会话数")
+    parser.add_argument("--concurrency", type=int, default=200, help="individual 方式的并发客户端数")
+    parser.add_argument("--threads", type=int, default=64, help="服务器线程数")
+    parser.add_argument("--json", action="store_true", help="输出机器可读的JSON结果")
+    args = parser.parse_args()
+
+    results = [measure(mode, args.sessions, args.concurrency, args.threads) for mode in ("individual", "bulk")]
+
+    if args.json:
+        print(json.dumps({"sessions": args.sessions, "concurrency": args.concurrency, "results": results},
+                         ensure_ascii=False))
+        return
+
+    print("📊 会话创建耗时")
+    print(f"   会话数: {args.sessions}  并发客户端: {args.concurrency}  服务器线程: {args.threads}")
+    for r in results:
+        rate = r["sessions"] / r["wall_seconds"] if r["wall_seconds"] else 0.0
+        print(f"   {r['mode']:<10} 总耗时 {r['wall_seconds']:>7.3f}s  {rate:>8.1f} 个/秒  "
+              f"p50 {r['p50_ms']:>7.1f}ms  p99 {r['p99_ms']:>7.1f}ms  错误 {r['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+限速器与自适应并发基准
+启动会注入429的本地桩模型服务，同时发起交互式对话和后台评分调用，
+统计服务端429次数、两类调用的延迟分位数以及最终并发窗口
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_model_server import start_stub_server
+from engine.base_engine import PURPOSE_CHAT, PURPOSE_SCORING
+from engine.rate_limiter import configure_rate_limiter
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(args):
+    server, state = start_stub_server(latency=args.latency, jitter=args.latency / 5, capacity=args.capacity,
+                                      error_rate_429=args.error_rate_429, retry_after=0.2)
+    os.environ["API_KEY"] = "stub"
+    from engine.gpt import GPTEngine
+    engine = GPTEngine(model_base=f"http://127.0.0.1:{server.server_address[1]}/v1")
+
+    limiter = None
+    if not args.no_limiter:
+        limiter = configure_rate_limiter(requests_per_minute=args.rpm, initial_concurrency=args.initial_concurrency,
+                                         max_concurrency=args.max_concurrency)
+    else:
+        configure_rate_limiter(initial_concurrency=10_000, max_concurrency=10_000)
+
+    latencies = {PURPOSE_CHAT: [], PURPOSE_SCORING: []}
+    failures = {PURPOSE_CHAT: 0, PURPOSE_SCORING: 0}
+    lock = threading.Lock()
+
+    def worker(purpose, count):
+        content = "请评估" if purpose == PURPOSE_SCORING else "医生您好"
+        for _ in range(count):
+            start = time.time()
+            try:
+                engine.get_response([{"role": "system", "content": content}, {"role": "user", "content": "胸痛"}],
+                                    purpose=purpose)
+                with lock:
+                    latencies[purpose].append(time.time() - start)
+            except Exception:
+                with lock:
+                    failures[purpose] += 1
+
+    threads = [threading.Thread(target=worker, args=(PURPOSE_SCORING, args.calls)) for _ in range(args.scoring_threads)]
+    threads += [threading.Thread(target=worker, args=(PURPOSE_CHAT, args.calls // 4)) for _ in range(args.chat_threads)]
+
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.time() - start
+    server.shutdown()
+
+    return {
+        "limiter": not args.no_limiter,
+        "elapsed_seconds": round(elapsed, 2),
+        "server": state.stats,
+        "failures": failures,
+        "chat_p50": round(percentile(latencies[PURPOSE_CHAT], 0.5), 3),
+        "chat_p95": round(percentile(latencies[PURPOSE_CHAT], 0.95), 3),
+        "scoring_p50": round(percentile(latencies[PURPOSE_SCORING], 0.5), 3),
+        "scoring_p95": round(percentile(latencies[PURPOSE_SCORING], 0.95), 3),
+        "limiter_state": limiter.snapshot() if limiter else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="限速器与自适应并发基准")
+    parser.add_argument("--capacity", type=int, default=6, help="桩服务并发容量，超出返回429")
+    parser.add_argument("--error-rate-429", type=float, default=0.02)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--scoring-threads", type=int, default=16)
+    parser.add_argument("--chat-threads", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=20, help="每个评分线程的调用次数")
+    parser.add_argument("--rpm", type=float, default=None)
+    parser.add_argument("--initial-concurrency", type=int, default=8)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--no-limiter", action="store_true", help="关闭限速作为对照")
+    args = parser.parse_args()
+    print(json.dumps(run(args), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
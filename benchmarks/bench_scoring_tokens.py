@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+评分提示词token基准
+在 acute_mi_scoring.json 病例上用桩引擎跑一次完整评分报告，统计每份报告的prompt/completion token数，
+对比旧版提示词（每个(消息, 问题点)对都重复评分规则和示例JSON）、共享系统消息的紧凑提示词，
+以及每条消息一次请求评估多个问题点的批量模式（消息和上下文只发送一次）
+
+token数按限速器相同的规则估算（中文约1.5字符/token），同时给出字符数便于换算
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.stub import StubEngine
+from modules.intelligent_scoring import IntelligentScoringAgent, IntelligentScoringSystem
+
+PRESET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "presets", "acute_mi_scoring.json")
+
+DOCTOR_QUESTIONS = [
+    "您好，哪里不舒服？", "疼痛多久了？", "疼痛在什么位置？", "是什么样的疼？",
+    "疼痛会放射到别的地方吗？", "有什么诱因吗？", "休息后能缓解吗？", "以前有高血压吗？",
+    "有糖尿病吗？", "抽烟吗？", "家里人有心脏病吗？", "有没有出汗、恶心？"
+]
+
+
+def legacy_messages(doctor_question, target_question, target_answer="", context=""):
+    """旧版提示词（改造前 evaluate_question_match 中的写法），仅用于对比"""
+    prompt = f"""
+你是一个医学问诊评估专家。请评估医生的问题是否有效询问了目标信息点。
+
+目标问题点: {target_question}
+标准答案: {target_answer}
+医生询问: {doctor_question}
+对话上下文: {context}
+
+请从以下几个维度评估:
+1. 语义匹配度(0-100): 医生问题与目标问题的语义相似程度
+2. 信息获取度(0-100): 医生问题能否获取到目标信息
+3. 专业性(0-100): 问题的医学专业性和准确性
+4. 完整性(0-100): 问题是否完整覆盖了目标信息点
+
+评估规则:
+- 即使用词不同，但能获取相同医学信息的问题应该给高分
+- 考虑医学术语的同义词和不同表达方式
+- 部分匹配也应该给予相应分数，不要求100%字面匹配
+- 考虑临床实际情况下的问诊习惯
+
+请返回JSON格式，格式如下：
+{{
+  "semantic_match": 85,
+  "information_coverage": 90,
+  "professionalism": 80,
+  "completeness": 75,
+  "overall_score": 82.5,
+  "is_match": true,
+  "confidence": 0.9,
+  "reasoning": "详细的评估理由",
+  "suggestions": "改进建议（如有）"
+}}
+
+overall_score是四个维度的加权平均(权重可以根据重要性调整)
+is_match: overall_score >= 60 为true
+confidence: 评估的置信度(0-1)
+"""
+    return [
+        {"role": "system", "content": "你是一个专业的医学问诊评估专家，擅长分析医生问诊质量。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+@contextlib.contextmanager
+def prompt_builder(builder):
+    """在作用域内替换评分提示词的构建函数"""
+    original = IntelligentScoringAgent.__dict__["build_messages"]
+    IntelligentScoringAgent.build_messages = staticmethod(builder)
+    try:
+        yield
+    finally:
+        IntelligentScoringAgent.build_messages = original
+
+
+class PromptRecordingEngine(StubEngine):
+    """记录每次请求的字符数，区分共享前缀（系统消息）和可变部分"""
+
+    def __init__(self):
+        super().__init__()
+        self.system_chars = 0
+        self.user_chars = 0
+
+    def get_response(self, memories, purpose=None, response_format=None):
+        for message in memories:
+            if message["role"] == "system":
+                self.system_chars += len(message["content"])
+            else:
+                self.user_chars += len(message["content"])
+        return super().get_response(memories, purpose=purpose, response_format=response_format)
+
+
+def run_report(case_data, turns, batch_size=1):
+    engine = PromptRecordingEngine()
+    system = IntelligentScoringSystem(case_data, engine=engine, batch_size=batch_size)
+    for question in DOCTOR_QUESTIONS[:turns]:
+        system.record_message(question, "user")
+        system.record_message("嗯，是的。", "assistant")
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.calculate_scores_from_history()
+    usage = system.token_usage
+    return {
+        "calls": usage["calls"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "prompt_tokens_per_call": round(usage["prompt_tokens"] / max(1, usage["calls"]), 1),
+        "system_chars": engine.system_chars,
+        "variable_chars": engine.user_chars
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评分提示词token基准")
+    parser.add_argument("--turns", type=int, default=8, help="医生提问轮数（最多12）")
+    parser.add_argument("--batch-size", type=int, default=12, help="批量模式每次请求的问题点数")
+    parser.add_argument("--json", action="store_true", help="输出机器可读的JSON结果")
+    args = parser.parse_args()
+
+    with open(PRESET_PATH, 'r', encoding='utf-8') as f:
+        case_data = json.load(f)
+    turns = max(1, min(args.turns, len(DOCTOR_QUESTIONS)))
+
+    with prompt_builder(legacy_messages):
+        before = run_report(case_data, turns)
+    after = run_report(case_data, turns)
+    batched = run_report(case_data, turns, batch_size=args.batch_size)
+    results = {
+        "case": os.path.basename(PRESET_PATH),
+        "turns": turns,
+        "batch_size": args.batch_size,
+        "before": before,
+        "after": after,
+        "batched": batched,
+        "prompt_reduction": round(1 - after["prompt_tokens"] / before["prompt_tokens"], 3),
+        "batched_prompt_reduction": round(1 - batched["prompt_tokens"] / before["prompt_tokens"], 3)
+    }
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+        return
+
+    print("📊 评分提示词token基准（每份报告）")
+    print(f"   病例: {results['case']}  医生提问: {turns}轮  批量大小: {args.batch_size}")
+    for label in ("before", "after", "batched"):
+        r = results[label]
+        print(f"   {label:<7} 调用 {r['calls']:>4}  prompt {r['prompt_tokens']:>7}  completion {r['completion_tokens']:>6}  "
+              f"每次调用 {r['prompt_tokens_per_call']:>6} prompt tokens  "
+              f"(系统消息 {r['system_chars']} 字符 / 可变部分 {r['variable_chars']} 字符)")
+    print(f"   prompt token 减少: 紧凑 {results['prompt_reduction'] * 100:.1f}%  "
+          f"批量 {results['batched_prompt_reduction'] * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
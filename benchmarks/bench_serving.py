@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+服务模式吞吐对比
+分别以Flask开发服务器（python backend/app.py）和生产服务器（backend/serve.py，内置线程池/gunicorn）
+启动后端，模型调用全部由桩引擎完成（MODEL_PROVIDER=stub，STUB_LATENCY 模拟模型延迟），
+用多个并发客户端各自创建会话并连续对话，统计对话请求的吞吐和延迟分位数
+
+开发服务器固定监听3000端口，运行前需确保该端口空闲（先停止 start_all.py）
+
+用法:
+    python benchmarks/bench_serving.py
+    python benchmarks/bench_serving.py --clients 64 --turns 5 --stub-latency 0.2 --json
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 3000
+BASE_URL = f"http://localhost:{PORT}"
+
+DOCTOR_QUESTIONS = [
+    "您好，哪里不舒服？", "疼痛多久了？", "疼痛在什么位置？", "是什么样的疼？",
+    "疼痛会放射到别的地方吗？", "有什么诱因吗？", "休息后能缓解吗？", "以前有高血压吗？"
+]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def server_command(mode, threads, workers):
+    if mode == "dev":
+        return [sys.executable, os.path.join(ROOT, "backend", "app.py")]
+    return [sys.executable, os.path.join(ROOT, "backend", "serve.py"), "--port", str(PORT),
+            "--server", mode, "--threads", str(threads), "--workers", str(workers)]
+
+
+def start_server(mode, threads, workers, stub_latency, timeout=30):
+    env = dict(os.environ, MODEL_PROVIDER="stub", STUB_LATENCY=str(stub_latency), MAX_SESSIONS="100000")
+    # 独立进程组：开发服务器的重载器会再启动一个子进程，停止时一起结束
+    process = subprocess.Popen(server_command(mode, threads, workers), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} 服务器启动失败（退出码 {process.returncode}）")
+        try:
+            if requests.get(f"{BASE_URL}/api/health/ready", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f"{mode} 服务器在 {timeout} 秒内未就绪")
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=40)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def run_client(turns, latencies, errors, lock):
+    """一个客户端：创建会话后连续对话（复用keep-alive连接）"""
+    http = requests.Session()
+    session_id = f"bench_{uuid.uuid4().hex[:12]}"
+    try:
+        response = http.post(f"{BASE_URL}/api/sp/session/create",
+                             json={"session_id": session_id, "preset_file": "acute_mi_scoring.json"}, timeout=60)
+        if response.status_code != 200:
+            raise RuntimeError(f"创建会话失败: {response.status_code}")
+        for n in range(turns):
+            start = time.perf_counter()
+            response = http.post(f"{BASE_URL}/api/sp/session/{session_id}/chat",
+                                 json={"message": DOCTOR_QUESTIONS[n % len(DOCTOR_QUESTIONS)]}, timeout=60)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(response.status_code)
+    except Exception as e:
+        with lock:
+            errors.append(str(e))
+    finally:
+        http.close()
+
+
+def measure(mode, clients, turns, threads, workers, stub_latency):
+    process = start_server(mode, threads, workers, stub_latency)
+    try:
+        latencies, errors, lock = [], [], threading.Lock()
+        workers_threads = [threading.Thread(target=run_client, args=(turns, latencies, errors, lock))
+                           for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in workers_threads:
+            thread.start()
+        for thread in workers_threads:
+            thread.join()
+        wall = time.perf_counter() - start
+    finally:
+        stop_server(process)
+
+    return {
+        "mode": mode,
+        "chat_requests": len(latencies),
+        "errors": len(errors),
+        "wall_seconds": round(wall, 3),
+        "chat_per_second": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务模式吞吐对比（桩引擎）")
+    parser.add_argument("--clients", type=int, default=32, help="并发客户端数（每个客户端一个会话）")
+    parser.add_argument("--turns", type=int, default=5, help="每个客户端的对话轮数")
+    parser.add_argument("--threads", type=int, default=16, help="生产服务器每个工作进程的线程数")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn工作进程数")
+    parser.add_argument("--stub-latency", type=float, default=0.1, help="桩引擎模拟的模型延迟（秒）")
+    parser.add_argument("--modes", default="dev,builtin,gunicorn",
+                        help="逗号分隔：dev / builtin / gunicorn（未安装gunicorn时跳过）")
+    parser.add_argument("--json", action="store_true", help="输出机器可读的JSON结果")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    if "gunicorn" in modes:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            modes.remove("gunicorn")
+
+    results = [measure(mode, args.clients, args.turns, args.threads, args.workers, args.stub_latency)
+               for mode in modes]
+
+    if args.json:
+        print(json.dumps({"clients": args.clients, "turns": args.turns, "stub_latency": args.stub_latency,
+                          "results": results}, ensure_ascii=False))
+        return
+
+    print("📊 服务模式吞吐对比")
+    print(f"   并发客户端: {args.clients}  每客户端对话: {args.turns}轮  桩延迟: {args.stub_latency * 1000:.0f}ms  "
+          f"线程: {args.threads}  进程: {args.workers}")
+    for r in results:
+        print(f"   {r['mode']:<9} {r['chat_per_second']:>8.2f} 次对话/秒  p50 {r['p50_ms']:>7.1f}ms  "
+              f"p95 {r['p95_ms']:>7.1f}ms  p99 {r['p99_ms']:>7.1f}ms  错误 {r['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+离线基准套件
+通过Flask测试客户端驱动完整后端，模型调用全部由桩引擎（MODEL_PROVIDER=stub）完成，
+结果不受网络波动影响，可在CI中运行并与基线结果对比
+
+场景:
+    session_create      创建会话耗时
+    chat_turn           单轮对话的框架开销（桩延迟为0）
+    report_generation   不同病例规模（隐藏问题数）与对话轮数下的评分报告耗时
+    concurrent          多会话并发（创建 → 多轮对话 → 评分）的吞吐
+
+用法:
+    python benchmarks/bench_suite.py --quick --output bench.json
+    python benchmarks/bench_suite.py --compare bench.json --tolerance 0.25
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.append(ROOT)
+
+PRESET_PATH = os.path.join(ROOT, "presets", "acute_mi_scoring.json")
+
+DOCTOR_QUESTIONS = [
+    "您好，哪里不舒服？", "疼痛多久了？", "疼痛在什么位置？", "是什么样的疼？",
+    "疼痛会放射到别的地方吗？", "有什么诱因吗？", "休息后能缓解吗？", "以前有高血压吗？",
+    "有糖尿病吗？", "抽烟吗？", "家里人有心脏病吗？", "有没有出汗、恶心？"
+]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latency_stats(seconds):
+    """耗时列表 → 毫秒分位数"""
+    return {
+        "count": len(seconds),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3) if seconds else 0.0,
+        "p50_ms": round(percentile(seconds, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 0.99) * 1000, 3)
+    }
+
+
+@contextlib.contextmanager
+def stub_config(latency=0.0, distribution="fixed", jitter=0.0, failure_rate=0.0, seed=42):
+    """在作用域内设置新建会话使用的桩引擎参数"""
+    values = {
+        "STUB_LATENCY": str(latency),
+        "STUB_LATENCY_DISTRIBUTION": distribution,
+        "STUB_LATENCY_JITTER": str(jitter),
+        "STUB_FAILURE_RATE": str(failure_rate),
+        "STUB_SEED": str(seed)
+    }
+    previous = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def make_case(base_case, question_count):
+    """以急性心梗病例为模板，生成指定数量隐藏问题的病例"""
+    template = base_case["hidden_questions"]
+    case = dict(base_case)
+    case["hidden_questions"] = [
+        dict(template[i % len(template)], question=f"{template[i % len(template)]['question']}（{i + 1}）")
+        for i in range(question_count)
+    ]
+    return case
+
+
+def build_app():
+    os.environ["MODEL_PROVIDER"] = "stub"
+    os.environ.setdefault("MAX_SESSIONS", "100000")
+    from app import create_app
+    with contextlib.redirect_stdout(io.StringIO()):
+        return create_app('testing')
+
+
+class Bench:
+    """基准场景集合，所有请求经Flask测试客户端发出"""
+
+    def __init__(self, app, base_case):
+        self.app = app
+        self.base_case = base_case
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _session_id(self, prefix):
+        with self._lock:
+            self._counter += 1
+            return f"bench_{prefix}_{self._counter}"
+
+    def create_session(self, client, case, prefix="s"):
+        session_id = self._session_id(prefix)
+        response = client.post('/api/sp/session/create', json={"session_id": session_id, "custom_data": case})
+        if response.status_code != 200:
+            raise RuntimeError(f"创建会话失败: {response.get_json()}")
+        return session_id
+
+    def chat(self, client, session_id, turns):
+        durations = []
+        for n in range(turns):
+            start = time.perf_counter()
+            response = client.post(f'/api/sp/session/{session_id}/chat',
+                                   json={"message": DOCTOR_QUESTIONS[n % len(DOCTOR_QUESTIONS)]})
+            durations.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"对话失败: {response.get_json()}")
+        return durations
+
+    def session_create(self, count):
+        client = self.app.test_client()
+        durations = []
+        with stub_config():
+            for _ in range(count):
+                start = time.perf_counter()
+                self.create_session(client, self.base_case, "create")
+                durations.append(time.perf_counter() - start)
+        return dict(latency_stats(durations), per_second=round(count / sum(durations), 1))
+
+    def chat_turn(self, turns):
+        client = self.app.test_client()
+        with stub_config():
+            session_id = self.create_session(client, self.base_case, "chat")
+            durations = self.chat(client, session_id, turns)
+        return latency_stats(durations)
+
+    def report_generation(self, question_counts, turn_counts, repeats):
+        results = []
+        client = self.app.test_client()
+        with stub_config():
+            for question_count in question_counts:
+                case = make_case(self.base_case, question_count)
+                for turns in turn_counts:
+                    durations = []
+                    for _ in range(repeats):
+                        session_id = self.create_session(client, case, "report")
+                        self.chat(client, session_id, turns)
+                        start = time.perf_counter()
+                        response = client.get(f'/api/scoring/report/{session_id}')
+                        durations.append(time.perf_counter() - start)
+                        if not response.get_json()["success"]:
+                            raise RuntimeError(f"评分失败: {response.get_json()}")
+                    pairs = question_count * turns
+                    best = min(durations)
+                    results.append({
+                        "hidden_questions": question_count,
+                        "turns": turns,
+                        "pairs": pairs,
+                        "seconds": round(best, 4),
+                        "us_per_pair": round(best / pairs * 1e6, 2)
+                    })
+        return results
+
+    def concurrent(self, sessions, turns, workers, latency, jitter):
+        def run_session(_):
+            client = self.app.test_client()
+            session_id = self.create_session(client, self.base_case, "conc")
+            durations = self.chat(client, session_id, turns)
+            client.get(f'/api/scoring/report/{session_id}')
+            return durations
+
+        with stub_config(latency=latency, distribution="lognormal" if jitter else "fixed", jitter=jitter):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                turn_durations = [d for durations in pool.map(run_session, range(sessions)) for d in durations]
+            elapsed = time.perf_counter() - start
+
+        return {
+            "sessions": sessions,
+            "turns": turns,
+            "workers": workers,
+            "stub_latency": latency,
+            "seconds": round(elapsed, 3),
+            "sessions_per_minute": round(sessions / elapsed * 60, 1),
+            "turn": latency_stats(turn_durations)
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    with open(PRESET_PATH, 'r', encoding='utf-8') as f:
+        base_case = json.load(f)
+
+    bench = Bench(build_app(), base_case)
+    concurrent_sessions = args.concurrent_sessions
+    if args.quick:
+        question_counts, turn_counts = [3, 12], [5, 20]
+        concurrent_sessions = min(concurrent_sessions, 16)
+    else:
+        question_counts, turn_counts = [3, 12, 25, 50], [5, 20, 50, 100]
+
+    # 后端和评分系统会打印大量日志，基准中屏蔽
+    with contextlib.redirect_stdout(io.StringIO()):
+        scenarios = {
+            "session_create": bench.session_create(args.sessions),
+            "chat_turn": bench.chat_turn(args.turns),
+            "report_generation": bench.report_generation(question_counts, turn_counts, args.repeats),
+            "concurrent": bench.concurrent(concurrent_sessions, args.concurrent_turns, args.workers,
+                                           args.latency, args.jitter)
+        }
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick
+        },
+        "scenarios": scenarios
+    }
+
+
+def _flatten(value, prefix=""):
+    """嵌套结果 → {路径: 数值}，报告列表按规模参数生成路径"""
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(_flatten(child, f"{prefix}.{key}" if prefix else key))
+        return items
+    if isinstance(value, list):
+        items = {}
+        for entry in value:
+            label = f"q{entry.get('hidden_questions')}_t{entry.get('turns')}"
+            items.update(_flatten(entry, f"{prefix}[{label}]"))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(current, baseline, tolerance, min_delta_ms=1.0):
+    """
+    与基线对比，返回退化项列表（耗时越大越差，吞吐越小越差）
+    亚毫秒级耗时波动较大，绝对差值小于min_delta_ms的耗时变化不计为退化
+    """
+    now = _flatten(current["scenarios"])
+    before = _flatten(baseline["scenarios"])
+    regressions = []
+    for key, value in now.items():
+        old = before.get(key)
+        if not old:
+            continue
+        metric = key.rsplit(".", 1)[-1]
+        if metric.endswith("_ms") or metric == "seconds":
+            scale = 1000 if metric == "seconds" else 1
+            if (value - old) * scale < min_delta_ms:
+                continue
+            change = value / old - 1
+        elif metric.startswith("per_") or metric.endswith("_per_minute"):
+            change = old / value - 1 if value else float("inf")
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": key, "baseline": old, "current": value, "regression": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准套件（桩引擎 + Flask测试客户端）")
+    parser.add_argument("--quick", action="store_true", help="缩小报告生成的规模网格，适合CI")
+    parser.add_argument("--sessions", type=int, default=50, help="会话创建场景的会话数")
+    parser.add_argument("--turns", type=int, default=50, help="单轮开销场景的对话轮数")
+    parser.add_argument("--repeats", type=int, default=2, help="报告生成每个规模重复次数（取最快）")
+    parser.add_argument("--concurrent-sessions", type=int, default=40)
+    parser.add_argument("--concurrent-turns", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=8, help="并发场景的客户端线程数")
+    parser.add_argument("--latency", type=float, default=0.05, help="并发场景的桩引擎延迟中位数（秒）")
+    parser.add_argument("--jitter", type=float, default=0.3, help="并发场景的对数正态延迟抖动，0为固定延迟")
+    parser.add_argument("--output", help="结果写入JSON文件")
+    parser.add_argument("--compare", help="与该基线JSON对比，有退化时以状态码1退出")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="耗时退化的最小绝对差值（毫秒）")
+    parser.add_argument("--json", action="store_true", help="向标准输出打印JSON结果")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        results["regressions"] = regressions
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+    else:
+        s = results["scenarios"]
+        print("📊 离线基准套件")
+        print(f"   会话创建  p50 {s['session_create']['p50_ms']}ms  p95 {s['session_create']['p95_ms']}ms")
+        print(f"   单轮开销  p50 {s['chat_turn']['p50_ms']}ms  p95 {s['chat_turn']['p95_ms']}ms")
+        for r in s["report_generation"]:
+            print(f"   评分报告  {r['hidden_questions']:>3}题 × {r['turns']:>3}轮  {r['seconds']:>8.4f}s  "
+                  f"{r['us_per_pair']:>8.1f}µs/对")
+        c = s["concurrent"]
+        print(f"   并发吞吐  {c['sessions_per_minute']} 会话/分钟  单轮p95 {c['turn']['p95_ms']}ms")
+        if args.compare:
+            if regressions:
+                print(f"❌ 相对基线退化 {len(regressions)} 项:")
+                for r in regressions:
+                    print(f"   {r['metric']}: {r['baseline']} → {r['current']} (+{r['regression'] * 100:.0f}%)")
+            else:
+                print("✅ 无超出容差的退化")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
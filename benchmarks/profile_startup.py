@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+后端启动耗时分析
+在子进程中用 python -X importtime 导入后端并创建应用，报告：
+- 导入耗时与 create_app 耗时
+- 累计导入耗时最高的模块
+- 按顶层包汇总的自身导入耗时
+
+用法:
+    python benchmarks/profile_startup.py
+    python benchmarks/profile_startup.py --top 30 --json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 与 backend/app.py 直接运行时相同的导入路径
+STARTUP_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {backend!r})
+sys.path.append({root!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({{"import_seconds": imported - start, "create_app_seconds": created - imported,
+                  "openai_loaded": "openai" in sys.modules, "numpy_loaded": "numpy" in sys.modules}}))
+"""
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出 → [(模块, 自身微秒, 累计微秒)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile(top):
+    script = STARTUP_SCRIPT.format(backend=os.path.join(ROOT, "backend"), root=ROOT)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "后端导入失败")
+
+    timing = json.loads(proc.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(proc.stderr)
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    return {
+        "import_seconds": round(timing["import_seconds"], 4),
+        "create_app_seconds": round(timing["create_app_seconds"], 4),
+        "openai_loaded": timing["openai_loaded"],
+        "numpy_loaded": timing["numpy_loaded"],
+        "modules_imported": len(rows),
+        "top_cumulative": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 2)}
+            for name, _, cumulative in sorted(rows, key=lambda r: -r[2])[:top]
+        ],
+        "top_packages": [
+            {"package": package, "self_ms": round(us / 1000, 2)}
+            for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端启动耗时分析")
+    parser.add_argument("--top", type=int, default=15, help="列出的模块/包数量")
+    parser.add_argument("--json", action="store_true", help="输出机器可读的JSON结果")
+    args = parser.parse_args()
+
+    result = profile(args.top)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    print("🚀 后端启动耗时")
+    print(f"   导入: {result['import_seconds'] * 1000:.1f}ms  create_app: {result['create_app_seconds'] * 1000:.1f}ms  "
+          f"模块数: {result['modules_imported']}")
+    print(f"   openai已加载: {result['openai_loaded']}  numpy已加载: {result['numpy_loaded']}")
+    print("   累计耗时最高的模块:")
+    for row in result["top_cumulative"]:
+        print(f"     {row['cumulative_ms']:>9.2f}ms  {row['module']}")
+    print("   按顶层包的自身耗时:")
+    for row in result["top_packages"]:
+        print(f"     {row['self_ms']:>9.2f}ms  {row['package']}")
+
+
+if __name__ == "__main__":
+    main()
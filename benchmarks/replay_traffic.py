@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+流量回放压测工具
+读取录制的API流量（JSONL，每行一个请求），按原始时间间隔（可加速）和并发上限回放到后端，
+统计每个接口的吞吐、延迟分位数和错误率，用于在笔记本上复现考试日的流量高峰
+
+流量来源:
+    - 后端设置 TRAFFIC_RECORD_PATH 后录制的真实流量
+    - 本工具 generate 子命令生成的合成考试流量
+    （仓库根目录的 requests.jsonl 是需求清单，不是流量记录）
+
+记录格式: {"ts": 时间戳秒, "method": "POST", "path": "/api/sp/session/s1/chat", "body": {...}}
+
+同一会话的请求在一个工作线程内按顺序回放；会话ID会加上本次运行的前缀，可重复回放同一文件。
+异步评分任务的轮询请求（/api/scoring/jobs/...）依赖运行时生成的任务ID，回放时跳过。
+
+用法:
+    python benchmarks/replay_traffic.py generate -o exam.jsonl --students 300 --ramp 120
+    python benchmarks/replay_traffic.py replay exam.jsonl --speedup 10 --concurrency 64
+    python benchmarks/replay_traffic.py replay exam.jsonl --base-url http://localhost:8080
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.append(ROOT)
+
+SKIP_PATH_PREFIXES = ("/api/scoring/jobs/",)
+HEX_ID = re.compile(r"^[0-9a-f]{32}$")
+
+DOCTOR_QUESTIONS = [
+    "您好，哪里不舒服？", "疼痛多久了？", "疼痛在什么位置？", "是什么样的疼？",
+    "疼痛会放射到别的地方吗？", "有什么诱因吗？", "休息后能缓解吗？", "以前有高血压吗？",
+    "有糖尿病吗？", "抽烟吗？", "家里人有心脏病吗？", "有没有出汗、恶心？",
+    "吃过什么药吗？", "有药物过敏吗？", "平时喝酒吗？", "以前有过类似情况吗？"
+]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def load_traffic(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["ts"])
+
+
+def generate_exam_traffic(students, ramp, turns, think_time, preset, report_mode, seed=42):
+    """合成考试流量：学生在ramp秒内陆续开始，每人问诊turns轮后获取评分报告"""
+    rng = random.Random(seed)
+    base = time.time()
+    records = []
+    for n in range(students):
+        session_id = f"exam_{n:04d}"
+        ts = base + rng.uniform(0, ramp)
+        records.append({"ts": ts, "method": "POST", "path": "/api/sp/session/create",
+                        "body": {"session_id": session_id, "preset_file": preset}})
+        for question in rng.sample(DOCTOR_QUESTIONS, min(turns, len(DOCTOR_QUESTIONS))):
+            ts += rng.expovariate(1.0 / think_time) if think_time > 0 else 0.0
+            records.append({"ts": ts, "method": "POST", "path": f"/api/sp/session/{session_id}/chat",
+                            "body": {"message": question}})
+        ts += 1.0
+        if report_mode == "job":
+            records.append({"ts": ts, "method": "POST", "path": f"/api/scoring/report/{session_id}/jobs"})
+        else:
+            records.append({"ts": ts, "method": "GET", "path": f"/api/scoring/report/{session_id}"})
+    return sorted(records, key=lambda r: r["ts"])
+
+
+class SessionRewriter:
+    """把录制的会话ID替换为带运行前缀的新ID，并给出接口分组名"""
+
+    def __init__(self, records, prefix):
+        self.prefix = prefix
+        self.session_ids = set()
+        for record in records:
+            body = record.get("body") or {}
+            if record["path"].endswith("/session/create") and body.get("session_id"):
+                self.session_ids.add(body["session_id"])
+
+    def session_of(self, record):
+        body = record.get("body") or {}
+        if body.get("session_id") in self.session_ids:
+            return body["session_id"]
+        for segment in record["path"].split("/"):
+            if segment in self.session_ids:
+                return segment
+        return None
+
+    def rewrite(self, record):
+        path = "/".join(self.prefix + s if s in self.session_ids else s for s in record["path"].split("/"))
+        body = record.get("body")
+        if isinstance(body, dict):
+            body = dict(body)
+            if body.get("session_id") in self.session_ids:
+                body["session_id"] = self.prefix + body["session_id"]
+            if isinstance(body.get("session_ids"), list):
+                body["session_ids"] = [self.prefix + s if s in self.session_ids else s for s in body["session_ids"]]
+        if record.get("query"):
+            path += "?" + record["query"]
+        return record["method"], path, body
+
+    def endpoint(self, record):
+        segments = ["<session_id>" if s in self.session_ids else ("<id>" if HEX_ID.match(s) else s)
+                    for s in record["path"].split("/")]
+        return f"{record['method']} {'/'.join(segments)}"
+
+
+class InProcessClient:
+    """经Flask测试客户端调用进程内后端（每个线程一个客户端）"""
+
+    def __init__(self, provider, stub_latency, stub_jitter):
+        os.environ["MODEL_PROVIDER"] = provider
+        os.environ["STUB_LATENCY"] = str(stub_latency)
+        os.environ["STUB_LATENCY_JITTER"] = str(stub_jitter)
+        os.environ["STUB_LATENCY_DISTRIBUTION"] = "lognormal" if stub_jitter else "fixed"
+        os.environ.setdefault("MAX_SESSIONS", "100000")
+        from app import create_app
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.app = create_app('testing')
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        payload = response.get_json(silent=True)
+        return response.status_code, payload
+
+
+class HttpClient:
+    """经HTTP调用已启动的后端服务"""
+
+    def __init__(self, base_url, timeout):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, self.base_url + path, json=body, timeout=self.timeout)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        return response.status_code, payload
+
+
+class Replayer:
+    """按会话分组、按时间表回放流量并统计"""
+
+    def __init__(self, client, records, speedup, concurrency, prefix):
+        self.client = client
+        self.records = [r for r in records if not r["path"].startswith(SKIP_PATH_PREFIXES)]
+        self.skipped = len(records) - len(self.records)
+        self.speedup = speedup
+        self.concurrency = concurrency
+        self.rewriter = SessionRewriter(self.records, prefix)
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(list)
+        self._errors = defaultdict(int)
+        self._lags = []
+
+    def _groups(self):
+        """同一会话的请求放在同一组内顺序执行，其余请求各自成组"""
+        groups = defaultdict(list)
+        singles = []
+        for record in self.records:
+            session_id = self.rewriter.session_of(record)
+            if session_id is None:
+                singles.append([record])
+            else:
+                groups[session_id].append(record)
+        ordered = list(groups.values()) + singles
+        return sorted(ordered, key=lambda group: group[0]["ts"])
+
+    def _run_group(self, group, origin, start):
+        for record in group:
+            scheduled = start + (record["ts"] - origin) / self.speedup
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lag = time.perf_counter() - scheduled
+
+            method, path, body = self.rewriter.rewrite(record)
+            endpoint = self.rewriter.endpoint(record)
+            request_start = time.perf_counter()
+            try:
+                status, payload = self.client.request(method, path, body)
+                failed = status >= 400 or (isinstance(payload, dict) and payload.get("success") is False)
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - request_start
+
+            with self._lock:
+                self._latencies[endpoint].append(elapsed)
+                self._lags.append(max(0.0, lag))
+                if failed:
+                    self._errors[endpoint] += 1
+
+    def run(self):
+        if not self.records:
+            return {"requests": 0, "skipped": self.skipped, "endpoints": {}}
+        origin = self.records[0]["ts"]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = [pool.submit(self._run_group, group, origin, start) for group in self._groups()]
+                for future in futures:
+                    future.result()
+        elapsed = time.perf_counter() - start
+
+        endpoints = {}
+        for endpoint, latencies in sorted(self._latencies.items()):
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "errors": self._errors[endpoint],
+                "error_rate": round(self._errors[endpoint] / len(latencies), 4),
+                "throughput_rps": round(len(latencies) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2)
+            }
+        total = sum(len(v) for v in self._latencies.values())
+        errors = sum(self._errors.values())
+        return {
+            "requests": total,
+            "skipped": self.skipped,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "seconds": round(elapsed, 3),
+            "recorded_span_seconds": round((self.records[-1]["ts"] - origin), 3),
+            "speedup": self.speedup,
+            "concurrency": self.concurrency,
+            "throughput_rps": round(total / elapsed, 2),
+            # 实际发出时间相对计划时间的滞后，持续增长说明并发上限或后端已饱和
+            "schedule_lag_p95_ms": round(percentile(self._lags, 0.95) * 1000, 2),
+            "endpoints": endpoints
+        }
+
+
+def print_report(result):
+    print("📊 流量回放结果")
+    print(f"   请求数 {result['requests']}（跳过 {result['skipped']}）  耗时 {result['seconds']}s  "
+          f"吞吐 {result['throughput_rps']} req/s  错误率 {result['error_rate'] * 100:.2f}%  "
+          f"调度滞后p95 {result['schedule_lag_p95_ms']}ms")
+    print(f"   {'接口':<48}{'请求':>7}{'错误率':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"   {endpoint:<48}{stats['requests']:>7}{stats['error_rate'] * 100:>8.2f}%"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制流量回放压测工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="生成合成考试流量")
+    gen.add_argument("-o", "--output", required=True)
+    gen.add_argument("--students", type=int, default=100)
+    gen.add_argument("--ramp", type=float, default=60.0, help="所有学生在该秒数内陆续开始")
+    gen.add_argument("--turns", type=int, default=10, help="每名学生问诊轮数")
+    gen.add_argument("--think-time", type=float, default=8.0, help="两轮之间的平均思考时间（秒）")
+    gen.add_argument("--preset", default="acute_mi_scoring.json")
+    gen.add_argument("--report-mode", choices=["sync", "job"], default="sync",
+                     help="考试结束时获取报告的方式：同步报告接口或异步任务")
+    gen.add_argument("--seed", type=int, default=42)
+
+    rep = sub.add_parser("replay", help="回放流量文件")
+    rep.add_argument("traffic", help="JSONL流量文件")
+    rep.add_argument("--speedup", type=float, default=1.0, help="时间加速倍数")
+    rep.add_argument("--concurrency", type=int, default=32, help="同时回放的会话数上限")
+    rep.add_argument("--base-url", help="回放到已启动的后端；不设置时在进程内启动后端")
+    rep.add_argument("--timeout", type=float, default=120.0, help="HTTP请求超时（秒）")
+    rep.add_argument("--provider", default="stub",
+                     help="进程内后端使用的 MODEL_PROVIDER：stub，或replay（回放 ENGINE_STORE_PATH 中录制的真实响应）")
+    rep.add_argument("--stub-latency", type=float, default=0.3, help="桩引擎延迟中位数（秒）")
+    rep.add_argument("--stub-jitter", type=float, default=0.3, help="桩引擎对数正态抖动，0为固定延迟")
+    rep.add_argument("--json", action="store_true", help="输出机器可读的JSON结果")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        records = generate_exam_traffic(args.students, args.ramp, args.turns, args.think_time,
+                                        args.preset, args.report_mode, args.seed)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"✅ 已生成 {len(records)} 条请求（{args.students} 名学生）: {args.output}")
+        return
+
+    records = load_traffic(args.traffic)
+    if args.base_url:
+        client = HttpClient(args.base_url, args.timeout)
+    else:
+        client = InProcessClient(args.provider, args.stub_latency, args.stub_jitter)
+
+    replayer = Replayer(client, records, args.speedup, args.concurrency, prefix=f"r{uuid.uuid4().hex[:6]}_")
+    result = replayer.run()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+本地桩模型服务
+实现OpenAI兼容的 /chat/completions 接口，可注入延迟、429限流和5xx错误，
+将 MODEL_BASE 指向本服务即可在不访问真实模型的情况下测试限速、重试和熔断
+
+用法:
+    python benchmarks/stub_model_server.py --port 8900 --capacity 4 --error-rate-429 0.05
+    MODEL_BASE=http://localhost:8900/v1 API_KEY=stub python backend/app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+SCORING_REPLY = {
+    "semantic_match": 75,
+    "information_coverage": 70,
+    "professionalism": 80,
+    "completeness": 70,
+    "overall_score": 72.5,
+    "is_match": True,
+    "confidence": 0.8,
+    "reasoning": "桩模型服务固定评估结果",
+    "suggestions": ""
+}
+
+
+class StubModelState:
+    """服务端共享状态：并发计数与注入统计"""
+
+    def __init__(self, latency=0.2, jitter=0.05, capacity=None, error_rate_429=0.0,
+                 error_rate_5xx=0.0, retry_after=1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.capacity = capacity
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "5xx": 0}
+        self.lock = threading.Lock()
+
+
+def make_handler(state: StubModelState):
+    class StubModelHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with state.lock:
+                    self._send_json(200, dict(state.stats, in_flight=state.in_flight))
+            else:
+                self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            with state.lock:
+                state.stats["requests"] += 1
+                over_capacity = state.capacity is not None and state.in_flight >= state.capacity
+                if over_capacity or random.random() < state.error_rate_429:
+                    state.stats["429"] += 1
+                    throttled = True
+                else:
+                    throttled = False
+                    state.in_flight += 1
+
+            if throttled:
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                                {"Retry-After": str(state.retry_after)})
+                return
+
+            try:
+                time.sleep(max(0.0, random.gauss(state.latency, state.jitter)))
+                if random.random() < state.error_rate_5xx:
+                    with state.lock:
+                        state.stats["5xx"] += 1
+                    self._send_json(503, {"error": {"message": "Service unavailable", "type": "server_error"}})
+                    return
+
+                messages = request.get("messages", [])
+                is_scoring = bool(messages) and "评估" in (messages[0].get("content") or "")
+                content = json.dumps(SCORING_REPLY, ensure_ascii=False) if is_scoring else "医生，我这几天一直不太舒服。"
+                prompt_tokens = int(sum(len(m.get("content") or "") for m in messages) / 1.5)
+                completion_tokens = int(len(content) / 1.5)
+
+                with state.lock:
+                    state.stats["ok"] += 1
+                self._send_json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub-model"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
+                })
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubModelHandler
+
+
+def start_stub_server(port=0, **kwargs):
+    """在后台线程启动桩服务，返回 (server, state)；port=0 时自动分配端口"""
+    state = StubModelState(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI兼容的本地桩模型服务")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="平均响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟标准差（秒）")
+    parser.add_argument("--capacity", type=int, default=None, help="并发超过该值时返回429")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="随机返回429的概率")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="随机返回503的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429响应的Retry-After秒数")
+    args = parser.parse_args()
+
+    server, state = start_stub_server(
+        port=args.port, latency=args.latency, jitter=args.jitter, capacity=args.capacity,
+        error_rate_429=args.error_rate_429, error_rate_5xx=args.error_rate_5xx, retry_after=args.retry_after
+    )
+    print(f"🧪 桩模型服务已启动: http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n📊 统计: {state.stats}")
+
+
+if __name__ == "__main__":
+    main()
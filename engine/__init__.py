@@ -1,8 +1,16 @@
 # This file makes the engine directory a Python package
-from . import base_engine
-from . import gpt
+# 子模块按需导入：engine.gpt 依赖较重的openai SDK，只在实际创建GPTEngine时加载
+import importlib
 
 __all__ = [
     'base_engine',
     'gpt',
-]
\ No newline at end of file
+    'stub',
+    'factory',
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
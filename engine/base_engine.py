@@ -1,6 +1,17 @@
 from abc import abstractmethod
 
 
+# 调用用途：交互式对话优先于后台评分
+PURPOSE_CHAT = "chat"
+PURPOSE_SCORING = "scoring"
+
+# 结构化输出：要求模型只返回JSON对象（不支持的引擎忽略该参数）
+RESPONSE_FORMAT_JSON = {"type": "json_object"}
+
+# 未设置 MODEL_NAME 时使用的模型
+DEFAULT_MODEL_NAME = "deepseek-chat"
+
+
 class Engine:
     def __init__(self):
         pass
@@ -10,6 +21,12 @@ class Engine:
         pass
 
     @abstractmethod
-    def get_response(self, memories):
+    def get_response(self, memories, purpose=PURPOSE_CHAT, response_format=None):
         pass
-    
\ No newline at end of file
+
+    def warm_up(self, request=False):
+        """
+        启动预热：建立到模型服务的连接等（默认无需预热）
+        request=True 时额外发起一次极小的请求
+        """
+        return None
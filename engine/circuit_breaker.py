@@ -0,0 +1,114 @@
+"""
+模型服务熔断器
+连续失败达到阈值后断开，期间调用立即失败（评分转为本地降级评分），
+冷却时间过后进入半开状态放行一个探测请求，成功则恢复
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, List
+
+
+class CircuitOpenError(Exception):
+    """熔断器断开，模型服务暂不可用"""
+
+
+class CircuitBreaker:
+    """熔断器"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str = "", failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+        self._stats = {"rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        """断开超过冷却时间后视为半开（调用方持有锁）"""
+        if self._state == self.OPEN and time.time() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self) -> None:
+        """调用前检查，断开时抛出CircuitOpenError"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+            self._stats["rejected"] += 1
+        raise CircuitOpenError(f"模型服务熔断中 ({self.name})，请稍后重试")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._half_open_calls = 0
+
+    def release_probe(self) -> None:
+        """调用未到达模型服务（本地原因失败），不改变状态，只归还半开探测名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.time()
+                self._stats["opened"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """熔断器状态"""
+        with self._lock:
+            state = self._current_state()
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "opened_at": datetime.fromtimestamp(self._opened_at).isoformat() if self._opened_at else None,
+                "retry_in_seconds": round(max(0.0, self._opened_at + self.recovery_timeout - time.time()), 1)
+                if state == self.OPEN else 0,
+                **self._stats
+            }
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model_base: str, model_name: str, **kwargs) -> CircuitBreaker:
+    """按(模型地址, 模型名)获取进程级熔断器"""
+    key = (model_base, model_name)
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(name=f"{model_name}@{model_base}", **kwargs)
+        return _breakers[key]
+
+
+def get_all_breakers() -> List[Dict[str, Any]]:
+    """所有熔断器状态（用于健康检查）"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.snapshot() for breaker in breakers]
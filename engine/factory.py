@@ -0,0 +1,28 @@
+import os
+
+DEFAULT_ENGINE_STORE = "data/engine_responses.sqlite"
+
+
+def create_engine(**kwargs):
+    """
+    按 MODEL_PROVIDER 创建默认引擎
+    - openai（默认）: OpenAI兼容的模型服务
+    - stub: 离线桩引擎（按 STUB_* 环境变量配置），用于CI、基准测试和不联网的前端调试
+    - record: 调用模型并把响应录制到 ENGINE_STORE_PATH，已录制的请求直接复用
+    - replay: 只从 ENGINE_STORE_PATH 回放，未录制的请求报错
+    """
+    provider = os.getenv("MODEL_PROVIDER", "openai").lower()
+    if provider == "stub":
+        from .stub import StubEngine
+        return StubEngine.from_env()
+
+    if provider in ("record", "replay"):
+        from .record_replay import RecordingEngine, ReplayEngine, get_response_store
+        store = get_response_store(os.getenv("ENGINE_STORE_PATH", DEFAULT_ENGINE_STORE))
+        if provider == "replay":
+            return ReplayEngine(store)
+        from .gpt import GPTEngine
+        return RecordingEngine(GPTEngine(**kwargs), store)
+
+    from .gpt import GPTEngine
+    return GPTEngine(**kwargs)
@@ -1,29 +1,191 @@
-from openai import OpenAI
-from .base_engine import Engine
+from .base_engine import Engine, PURPOSE_CHAT, DEFAULT_MODEL_NAME
+from .rate_limiter import get_rate_limiter, estimate_tokens, RateLimitTimeout
+from .resilience import (RetryPolicy, call_with_retry, hedged_call, get_latency_tracker, classify_error,
+                         DeadlineExceeded, LocalDeadlineExceeded)
+from .circuit_breaker import get_circuit_breaker, CircuitOpenError
+from .usage import record_usage
+from observability.metrics import ENGINE_CALL_SECONDS, ENGINE_TOKENS
+from observability.tracing import span, traced
 import os
+import threading
 import time
 
+# 对冲请求至少需要这么多延迟样本，p95才有意义
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.5
+
+# 拒绝过response_format参数的模型服务 (模型地址, 模型名)，之后不再发送
+_json_mode_unsupported = set()
+
+
+def _is_response_format_error(error):
+    """400错误是否由response_format参数引起（上下文过长、内容审核等其他400不算）"""
+    if getattr(error, "param", None) == "response_format":
+        return True
+    body = getattr(error, "body", None)
+    return "response_format" in str(body if body is not None else getattr(error, "message", ""))
+
+# 同一模型服务的所有引擎实例共用一个客户端（连接池），(模型地址, API key, 超时) → (OpenAI, httpx客户端)
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+
+def _get_shared_client(model_base, api_key, timeout):
+    key = (model_base, api_key, timeout)
+    client = _shared_clients.get(key)
+    if client is None:
+        with _shared_clients_lock:
+            client = _shared_clients.get(key)
+            if client is None:
+                from openai import OpenAI, DefaultHttpxClient
+                # 观察每个原始响应，SDK内部重试掉的429也计入限速器
+                http_client = DefaultHttpxClient(event_hooks={"response": [GPTEngine._observe_response]})
+                client = (OpenAI(api_key=api_key, base_url=model_base, timeout=timeout,
+                                 max_retries=0, http_client=http_client),
+                          http_client)
+                _shared_clients[key] = client
+    return client
+
 class GPTEngine(Engine):
     
-    def __init__(self, model_name=None, model_base=None, streaming=False, timeout=30):
+    def __init__(self, model_name=None, model_base=None, streaming=False, timeout=30,
+                 max_attempts=None, deadline=None, hedge=None):
        
         super().__init__()
 
         
-        self._model_name = model_name or os.getenv("MODEL_NAME", "deepseek-chat")
+        self._model_name = model_name or os.getenv("MODEL_NAME", DEFAULT_MODEL_NAME)
         self._model_base = model_base or os.getenv("MODEL_BASE", "https://api.deepseek.com")
         self._api_key = os.getenv("API_KEY", "sk-d3ed372f11114bbeaf9bedfc7cdc0d60")
         self._timeout = timeout
-        self._client = OpenAI(
-            api_key=self._api_key,
-            base_url=self._model_base,
-            timeout=self._timeout  # 添加超时设置
+        # 重试由弹性层统一负责，按错误类型分类并受整体截止时间约束
+        self._retry_policy = RetryPolicy(
+            max_attempts=max_attempts or int(os.getenv("MODEL_MAX_ATTEMPTS", 3)),
+            deadline=deadline or float(os.getenv("MODEL_DEADLINE", timeout * 2))
         )
+        # 评分请求使用JSON模式（服务不支持时自动回退）
+        self._json_mode = os.getenv("MODEL_JSON_MODE", "true").lower() == "true"
+        # 对话路径的对冲请求，默认关闭（会增加调用量）
+        self._hedge = hedge if hedge is not None else os.getenv("MODEL_HEDGE", "false").lower() == "true"
+        # 同一模型服务的所有引擎实例共用一个熔断器
+        self._breaker = get_circuit_breaker(
+            self._model_base, self._model_name,
+            failure_threshold=int(os.getenv("MODEL_BREAKER_THRESHOLD", 5)),
+            recovery_timeout=float(os.getenv("MODEL_BREAKER_RECOVERY", 30))
+        )
+    
+    @property
+    def _client(self):
+        """openai客户端在首次调用时创建（导入和构造引擎都不加载openai SDK），同一模型服务共用"""
+        return _get_shared_client(self._model_base, self._api_key, self._timeout)[0]
+    
+    def warm_up(self, request=False):
+        """
+        创建共享客户端并建立到模型服务的连接（TLS握手完成后连接留在池中供首个请求复用）
+        request=True 时再发起一次极小的对话请求；返回耗时（秒）
+        """
+        start = time.time()
+        http_client = _get_shared_client(self._model_base, self._api_key, self._timeout)[1]
+        # 任何HTTP状态都说明连接已建立，响应读完后连接归还连接池
+        http_client.get(self._model_base, timeout=self._timeout).close()
+        if request:
+            self.get_response([{"role": "user", "content": "ping"}], purpose=PURPOSE_CHAT)
+        return time.time() - start
+    
+    @staticmethod
+    def _observe_response(response):
+        """httpx响应钩子：将429反馈给进程级限速器"""
+        if response.status_code == 429:
+            get_rate_limiter().record_throttled()
+    
+    def _latency_tracker(self, purpose):
+        return get_latency_tracker(self._model_base, self._model_name, purpose)
+    
+    def _hedge_delay(self, purpose):
+        """对冲触发延迟：近期p95，样本不足或未启用时不对冲"""
+        if not self._hedge or purpose != PURPOSE_CHAT:
+            return None
+        tracker = self._latency_tracker(purpose)
+        if len(tracker) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, tracker.percentile(0.95))
+    
+    def _use_json_mode(self, response_format):
+        return (response_format is not None and self._json_mode
+                and (self._model_base, self._model_name) not in _json_mode_unsupported)
     
-    def get_response(self, memories):
-        """获取AI响应（带性能优化）"""
+    def _create_completion(self, memories, purpose, remaining=None, response_format=None):
+        """发起一次模型请求（单次尝试）"""
+        from openai import BadRequestError
+        timeout = self._timeout if remaining is None else max(0.1, min(self._timeout, remaining))
+        extra = {"response_format": response_format} if self._use_json_mode(response_format) else {}
+        attempt_start = time.time()
+        # 等待调用许可的时间也计入整体截止时间；排队超时是本地原因，不计入熔断
+        try:
+            with span("engine.attempt", purpose=purpose, model=self._model_name), \
+                    get_rate_limiter().slot(purpose, estimate_tokens(memories), timeout=remaining) as permit:
+                with span("engine.http_call"):
+                    try:
+                        response = self._client.chat.completions.create(
+                            model=self._model_name,
+                            messages=memories,
+                            timeout=timeout,
+                            **extra
+                        )
+                    except BadRequestError as e:
+                        if not extra or not _is_response_format_error(e):
+                            raise
+                        # 服务不支持JSON模式：记住并以普通模式重发，结果由调用方的容错解析处理
+                        _json_mode_unsupported.add((self._model_base, self._model_name))
+                        print(f"⚠️ 模型服务不支持JSON模式，已回退为普通输出: {self._model_name}")
+                        response = self._client.chat.completions.create(
+                            model=self._model_name,
+                            messages=memories,
+                            timeout=timeout
+                        )
+                if response.usage is not None:
+                    permit.record_usage(response.usage.total_tokens)
+                    record_usage(response.usage.prompt_tokens or 0, response.usage.completion_tokens or 0)
+                    ENGINE_TOKENS.observe(response.usage.prompt_tokens or 0, purpose=purpose,
+                                          model=self._model_name, kind="prompt")
+                    ENGINE_TOKENS.observe(response.usage.completion_tokens or 0, purpose=purpose,
+                                          model=self._model_name, kind="completion")
+                else:
+                    content = response.choices[0].message.content or ""
+                    record_usage(estimate_tokens(memories, completion_tokens=0), int(len(content) / 1.5),
+                                 estimated=True)
+        except RateLimitTimeout as e:
+            raise LocalDeadlineExceeded(f"等待模型调用许可超过整体截止时间: {e}") from e
+        self._latency_tracker(purpose).record(time.time() - attempt_start)
+        return response
+    
+    @staticmethod
+    def _log_retry(attempt, error, delay):
+        print(f"🔁 AI调用第{attempt}次失败，{delay:.2f}秒后重试: {error}")
+    
+    @staticmethod
+    def _is_provider_failure(error):
+        """服务端不可用类错误才计入熔断（请求本身有误的4xx、本地排队超时不算）"""
+        if isinstance(error, LocalDeadlineExceeded):
+            return False
+        return isinstance(error, DeadlineExceeded) or classify_error(error)[0]
+    
+    @property
+    def circuit_breaker(self):
+        return self._breaker
+    
+    @traced("GPTEngine.get_response")
+    def get_response(self, memories, purpose=PURPOSE_CHAT, response_format=None):
+        """获取AI响应（带性能优化，经进程级限速器调度，失败分类重试，熔断时立即失败）"""
         start_time = time.time()
         
+        # 熔断断开时直接抛出CircuitOpenError，不再等待超时
+        try:
+            self._breaker.before_call()
+        except CircuitOpenError:
+            ENGINE_CALL_SECONDS.observe(0.0, purpose=purpose, model=self._model_name, outcome="circuit_open")
+            raise
+        
         try:
             # 限制对话历史长度以提升性能
             max_history = 20  # 最多保留20轮对话
@@ -36,26 +198,41 @@ class GPTEngine(Engine):
                 else:
                     memories = recent_memories
             
-            response = self._client.chat.completions.create(
-                model=self._model_name,
-                messages=memories,
-                timeout=self._timeout
-            )
+            hedge_delay = self._hedge_delay(purpose)
+            
+            def attempt(remaining):
+                return hedged_call(lambda: self._create_completion(memories, purpose, remaining, response_format),
+                                   hedge_delay)
+            
+            try:
+                response = call_with_retry(attempt, self._retry_policy, on_retry=self._log_retry)
+            except Exception as e:
+                if isinstance(e, LocalDeadlineExceeded):
+                    # 请求未到达模型服务，不能说明服务状态：只归还半开探测名额
+                    self._breaker.release_probe()
+                elif self._is_provider_failure(e):
+                    self._breaker.record_failure()
+                else:
+                    self._breaker.record_success()
+                raise
+            self._breaker.record_success()
             
             end_time = time.time()
             response_time = end_time - start_time
+            ENGINE_CALL_SECONDS.observe(response_time, purpose=purpose, model=self._model_name, outcome="success")
             
             # 记录性能日志（如果响应时间过长）
-            if response_time > 5.0:
-                print(f"⚠️ 慢响应警告: AI调用耗时 {response_time:.2f}秒")
-            elif response_time > 10.0:
+            if response_time > 10.0:
                 print(f"❌ 极慢响应: AI调用耗时 {response_time:.2f}秒")
+            elif response_time > 5.0:
+                print(f"⚠️ 慢响应警告: AI调用耗时 {response_time:.2f}秒")
             
             return response.choices[0].message.content
             
         except Exception as e:
             end_time = time.time()
             response_time = end_time - start_time
+            ENGINE_CALL_SECONDS.observe(response_time, purpose=purpose, model=self._model_name, outcome="error")
             print(f"❌ AI调用失败 (耗时{response_time:.2f}s): {e}")
             raise e
     
@@ -0,0 +1,252 @@
+"""
+模型调用限速与自适应并发控制
+同一进程内所有对话和评分调用共用一个API Key，这里统一做：
+- 令牌桶：每分钟请求数(RPM)和每分钟token数(TPM)
+- AIMD自适应并发窗口：成功且延迟正常时加性增大，429或延迟恶化时乘性减小（延迟按用途分别与各自的基线比较）
+- 严格优先级：有对话请求在等待时，评分请求不得获取调用许可，且窗口中保留少量槽位只给对话使用
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+
+from .base_engine import PURPOSE_CHAT, PURPOSE_SCORING
+
+
+# 数值越小优先级越高
+PRIORITIES = {PURPOSE_CHAT: 0, PURPOSE_SCORING: 1}
+
+
+def estimate_tokens(messages: List[Dict[str, str]], completion_tokens: int = 256) -> int:
+    """粗略估算一次调用消耗的token数（中文约1.5字符/token），调用完成后按实际用量修正"""
+    chars = sum(len(msg.get("content") or "") for msg in messages)
+    return int(chars / 1.5) + completion_tokens
+
+
+class RateLimitTimeout(Exception):
+    """等待调用许可超时"""
+
+
+class TokenBucket:
+    """令牌桶，容量为一分钟的额度，按速率连续补充"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """获取amount个令牌还需等待的秒数"""
+        self._refill()
+        # 单次请求超过容量时只要求桶满，避免永远等待
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """按实际用量修正（amount为负时补扣）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """AIMD并发窗口"""
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 32,
+                 latency_tolerance: float = 2.0, backoff_ratio: float = 0.5, slow_backoff_ratio: float = 0.9):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.slow_backoff_ratio = slow_backoff_ratio
+        # 用途 → 延迟基线：简短的对话回复和较长的评分（JSON）回复延迟差别很大，共用基线会使评分调用总被当作"变慢"
+        self.baseline_latency: Dict[str, float] = {}
+
+    @property
+    def window(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    def on_success(self, latency: float, purpose: str = PURPOSE_CHAT) -> None:
+        # 基线取该用途近期最小延迟的慢速跟随值，排队造成的延迟上升会触发减窗
+        baseline = self.baseline_latency.get(purpose)
+        if baseline is None or latency < baseline:
+            baseline = latency
+        else:
+            baseline = baseline * 0.99 + latency * 0.01
+        self.baseline_latency[purpose] = baseline
+
+        if latency > baseline * self.latency_tolerance:
+            self.limit = max(self.minimum, self.limit * self.slow_backoff_ratio)
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttled(self) -> None:
+        self.limit = max(self.minimum, self.limit * self.backoff_ratio)
+
+
+class Permit:
+    """一次调用许可，调用方可回填实际token用量"""
+
+    def __init__(self, purpose: str, estimated_tokens: int):
+        self.purpose = purpose
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+        self.started_at = time.monotonic()
+        # 调用成功完成才用其延迟调整窗口；失败（如很快返回的429）的延迟不能代表正常延迟
+        self.ok = False
+
+    def record_usage(self, total_tokens: Optional[int]) -> None:
+        self.actual_tokens = total_tokens
+
+
+class RateLimiter:
+    """进程级模型调用限速器"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 initial_concurrency: int = 8, min_concurrency: int = 1, max_concurrency: int = 32,
+                 chat_reserved_slots: int = 1):
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._concurrency = AdaptiveConcurrency(initial_concurrency, min_concurrency, max_concurrency)
+        self._chat_reserved_slots = chat_reserved_slots
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = {purpose: 0 for purpose in PRIORITIES}
+        self._stats = {"acquired": 0, "throttled": 0, "timeouts": 0}
+
+    def _higher_priority_waiting(self, purpose: str) -> bool:
+        rank = PRIORITIES.get(purpose, len(PRIORITIES))
+        return any(count > 0 for other, count in self._waiting.items() if PRIORITIES[other] < rank)
+
+    def _window_for(self, purpose: str) -> int:
+        window = self._concurrency.window
+        if purpose == PURPOSE_CHAT:
+            return window
+        # 窗口缩到最小时也至少允许一个后台调用，避免评分完全饿死
+        return max(1, window - self._chat_reserved_slots)
+
+    def acquire(self, purpose: str = PURPOSE_CHAT, estimated_tokens: int = 0,
+                timeout: Optional[float] = None) -> Permit:
+        """阻塞直到获得调用许可"""
+        if purpose not in PRIORITIES:
+            purpose = PURPOSE_SCORING
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._condition:
+            self._waiting[purpose] += 1
+            try:
+                while True:
+                    if self._higher_priority_waiting(purpose) or self._in_flight >= self._window_for(purpose):
+                        wait = None
+                    else:
+                        wait = max(
+                            self._requests.delay_for(1) if self._requests else 0.0,
+                            self._tokens.delay_for(estimated_tokens) if self._tokens else 0.0
+                        )
+                        if wait <= 0:
+                            if self._requests:
+                                self._requests.consume(1)
+                            if self._tokens:
+                                self._tokens.consume(estimated_tokens)
+                            self._in_flight += 1
+                            self._stats["acquired"] += 1
+                            return Permit(purpose, estimated_tokens)
+
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise RateLimitTimeout(f"等待模型调用许可超时 ({purpose})")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                self._waiting[purpose] -= 1
+                # 等待者集合变化可能解除低优先级请求的阻塞
+                self._condition.notify_all()
+
+    def release(self, permit: Permit) -> None:
+        """归还许可，并根据延迟和实际用量调整窗口与令牌桶"""
+        latency = time.monotonic() - permit.started_at
+        with self._condition:
+            self._in_flight -= 1
+            if permit.ok:
+                self._concurrency.on_success(latency, permit.purpose)
+            if self._tokens and permit.actual_tokens is not None:
+                self._tokens.refund(permit.estimated_tokens - permit.actual_tokens)
+            self._condition.notify_all()
+
+    def record_throttled(self) -> None:
+        """记录一次服务端429响应（包括SDK内部重试中的429），乘性缩小并发窗口"""
+        with self._condition:
+            self._stats["throttled"] += 1
+            self._concurrency.on_throttled()
+
+    @contextmanager
+    def slot(self, purpose: str = PURPOSE_CHAT, estimated_tokens: int = 0, timeout: Optional[float] = None):
+        """获取许可的上下文管理器"""
+        permit = self.acquire(purpose, estimated_tokens, timeout)
+        try:
+            yield permit
+            permit.ok = True
+        finally:
+            self.release(permit)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前限速状态"""
+        with self._condition:
+            return {
+                "in_flight": self._in_flight,
+                "concurrency_window": self._concurrency.window,
+                "baseline_latency": dict(self._concurrency.baseline_latency),
+                "waiting": dict(self._waiting),
+                "requests_available": round(self._requests.tokens, 1) if self._requests else None,
+                "tokens_available": round(self._tokens.tokens, 1) if self._tokens else None,
+                **self._stats
+            }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _env_number(name: str, cast=float):
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取进程级限速器（首次使用时从环境变量创建）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    requests_per_minute=_env_number("MODEL_RPM"),
+                    tokens_per_minute=_env_number("MODEL_TPM"),
+                    initial_concurrency=_env_number("MODEL_CONCURRENCY", int) or 8,
+                    min_concurrency=_env_number("MODEL_MIN_CONCURRENCY", int) or 1,
+                    max_concurrency=_env_number("MODEL_MAX_CONCURRENCY", int) or 32,
+                    chat_reserved_slots=_env_number("MODEL_CHAT_RESERVED", int) or 1
+                )
+    return _rate_limiter
+
+
+def configure_rate_limiter(**kwargs) -> RateLimiter:
+    """替换进程级限速器（用于测试和基准）"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = RateLimiter(**kwargs)
+    return _rate_limiter
@@ -0,0 +1,166 @@
+"""
+录制/回放引擎
+RecordingEngine 包装真实引擎，把 请求哈希 → 响应 写入本地SQLite（响应zlib压缩）；
+ReplayEngine 直接从存储返回响应，不访问模型。
+
+输入不变时（相同的模型、用途、输出格式和消息列表），调整阈值后重新评分历史会话无需再次调用模型；
+回放同时为基准测试提供真实的响应内容。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from .base_engine import Engine, PURPOSE_CHAT, DEFAULT_MODEL_NAME
+
+
+class ReplayMissError(KeyError):
+    """回放存储中没有该请求的响应"""
+
+
+def request_key(memories, model="", purpose="", response_format=None):
+    """
+    请求的规范化哈希：模型、用途、输出格式 + 消息列表（只取role和content，忽略其他字段和键顺序）
+    不同模型或配置的录制互不覆盖，切换配置后回放不会返回其他配置的输出
+    """
+    canonical = json.dumps({
+        "model": model or "",
+        "purpose": purpose or "",
+        "response_format": response_format,
+        "messages": [[m.get("role"), m.get("content")] for m in memories]
+    }, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseStore:
+    """请求哈希 → 响应 的SQLite存储，线程安全"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, purpose TEXT, model TEXT, response BLOB, created_at REAL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def put(self, key, response, purpose="", model=""):
+        blob = zlib.compress(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, purpose, model, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, purpose, model, blob, time.time())
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _StoreEngine(Engine):
+    """录制与回放引擎的公共部分"""
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store if isinstance(store, ResponseStore) else ResponseStore(store)
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+
+class RecordingEngine(_StoreEngine):
+    """
+    录制引擎：调用内部引擎并保存响应
+    reuse=True 时已录制的请求直接返回存储的响应（输入不变不重复付费）
+    """
+
+    def __init__(self, inner, store, reuse=True):
+        super().__init__(store)
+        self.inner = inner
+        self.reuse = reuse
+
+    def warm_up(self, request=False):
+        # 预热请求不录制
+        return self.inner.warm_up(request)
+
+    def get_response(self, memories, purpose=PURPOSE_CHAT, response_format=None):
+        model = getattr(self.inner, "_model_name", "")
+        key = request_key(memories, model, purpose, response_format)
+        if self.reuse:
+            cached = self.store.get(key)
+            if cached is not None:
+                self._count("hits")
+                return cached
+
+        self._count("misses")
+        response = self.inner.get_response(memories, purpose=purpose, response_format=response_format)
+        if response is not None:
+            self.store.put(key, response, purpose, model)
+        return response
+
+
+class ReplayEngine(_StoreEngine):
+    """
+    回放引擎：只从存储返回响应
+    未录制的请求交给fallback引擎（如有，并录制其响应），否则抛出ReplayMissError
+    model_name: 按哪个模型的录制回放，默认取fallback引擎的模型，否则为 MODEL_NAME
+    """
+
+    def __init__(self, store, fallback=None, model_name=None):
+        super().__init__(store)
+        self.fallback = fallback
+        self.model_name = (model_name or getattr(fallback, "_model_name", None)
+                           or os.getenv("MODEL_NAME", DEFAULT_MODEL_NAME))
+
+    def warm_up(self, request=False):
+        return self.fallback.warm_up(request) if self.fallback is not None else None
+
+    def get_response(self, memories, purpose=PURPOSE_CHAT, response_format=None):
+        key = request_key(memories, self.model_name, purpose, response_format)
+        cached = self.store.get(key)
+        if cached is not None:
+            self._count("hits")
+            return cached
+
+        self._count("misses")
+        if self.fallback is None:
+            raise ReplayMissError(f"回放存储中没有该请求的响应: {key[:12]}")
+        response = self.fallback.get_response(memories, purpose=purpose, response_format=response_format)
+        if response is not None:
+            self.store.put(key, response, purpose, self.model_name)
+        return response
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_response_store(path):
+    """按路径共享存储连接（同一进程的所有会话共用）"""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ResponseStore(path)
+        return _stores[path]
@@ -0,0 +1,179 @@
+"""
+模型调用弹性层
+- 分类重试：超时、连接错误、5xx、429（遵循Retry-After）可重试，其余4xx直接失败
+- 全抖动指数退避，且所有重试受整体截止时间约束
+- 对冲请求：交互式对话在超过近期p95延迟仍未返回时再发一个相同请求，取先返回者
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, Tuple, Dict, Any
+
+
+class DeadlineExceeded(Exception):
+    """整体截止时间内未能完成调用"""
+
+
+class LocalDeadlineExceeded(DeadlineExceeded):
+    """请求发出前就已超过截止时间（如在本地限速器排队），与模型服务状态无关，不计入熔断"""
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    """解析Retry-After / retry-after-ms响应头（秒数或HTTP日期）"""
+    if headers is None:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def classify_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    """
+    判断异常是否可重试
+
+    Returns:
+        (是否可重试, 服务端要求的等待秒数)
+    """
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True, None
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        if status == 429:
+            return True, _parse_retry_after(error.response.headers if error.response is not None else None)
+        if status >= 500 or status == 408:
+            return True, None
+        return False, None
+    return False, None
+
+
+class RetryPolicy:
+    """重试策略"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 deadline: Optional[float] = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次失败后的全抖动退避时间"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def call_with_retry(fn: Callable[[Optional[float]], Any], policy: RetryPolicy,
+                    classify: Callable[[Exception], Tuple[bool, Optional[float]]] = classify_error,
+                    on_retry: Optional[Callable[[int, Exception, float], None]] = None) -> Any:
+    """
+    按策略重试调用
+
+    fn接收本次尝试可用的剩余时间（秒，None表示不限），用于收紧单次请求超时
+    """
+    deadline = time.monotonic() + policy.deadline if policy.deadline else None
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic() if deadline else None
+        if remaining is not None and remaining <= 0:
+            # 尚未发出过请求时超时是本地原因，之前的尝试失败（服务端错误）后超时才是服务端原因
+            error = LocalDeadlineExceeded if attempt == 0 else DeadlineExceeded
+            raise error(f"模型调用超过整体截止时间 {policy.deadline}秒")
+        try:
+            return fn(remaining)
+        except Exception as e:
+            attempt += 1
+            retryable, retry_after = classify(e)
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+
+            delay = policy.backoff(attempt - 1)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if deadline and time.monotonic() + delay >= deadline:
+                raise
+            if on_retry:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计，用于确定对冲请求的触发时间"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_trackers: Dict[Tuple[str, ...], LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(*key: str) -> LatencyTracker:
+    """按(模型地址, 模型名, 用途)获取进程级延迟统计"""
+    with _trackers_lock:
+        if key not in _trackers:
+            _trackers[key] = LatencyTracker()
+        return _trackers[key]
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+def hedged_call(fn: Callable[[], Any], hedge_delay: Optional[float]) -> Any:
+    """
+    对冲调用：首个请求在hedge_delay秒内未返回时再发起一个相同请求，返回先成功者
+
+    两个请求都失败时抛出首个请求的异常；落后的请求在后台自然结束
+    """
+    if hedge_delay is None:
+        return fn()
+
+    # 复制调用方上下文，使追踪span在对冲线程中挂到同一请求下
+    primary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result()
+
+    secondary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+    pending = {primary, secondary}
+    first_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            if first_error is None:
+                first_error = future.exception()
+    raise first_error
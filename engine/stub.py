@@ -0,0 +1,131 @@
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+from .base_engine import Engine, PURPOSE_CHAT, PURPOSE_SCORING
+from .usage import record_usage
+
+
+class StubEngineError(ConnectionError):
+    """桩引擎注入的模拟调用失败（模拟模型服务不可用）"""
+
+
+class StubEngine(Engine):
+    """
+    离线桩引擎：不访问网络，按可配置的延迟分布返回预设回复，用于基准测试和离线评分
+
+    - latency_distribution: fixed / uniform / normal / lognormal，latency为均值（lognormal为中位数），
+      latency_jitter为半宽、标准差或对数标准差
+    - tokens_per_second: 设置后按回复长度额外模拟生成耗时
+    - failure_rate: 以该概率抛出StubEngineError
+    - seed: 固定随机种子，使延迟和失败序列可复现
+    """
+
+    # 录制/回放按模型名区分存储中的响应
+    _model_name = "stub"
+    DEFAULT_CHAT_REPLY = "医生，我这几天一直不太舒服。"
+    DEFAULT_SCORING_RESULT = {
+        "semantic_match": 75,
+        "information_coverage": 70,
+        "professionalism": 80,
+        "completeness": 70,
+        "overall_score": 72.5,
+        "is_match": True,
+        "confidence": 0.8,
+        "reasoning": "桩引擎固定评估结果",
+        "suggestions": ""
+    }
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, latency=0.0, chat_reply=None, scoring_result=None, latency_distribution="fixed",
+                 latency_jitter=0.0, tokens_per_second=None, failure_rate=0.0, seed=None):
+        super().__init__()
+        if latency_distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"不支持的延迟分布: {latency_distribution}")
+        self._latency = latency
+        self._chat_reply = chat_reply or self.DEFAULT_CHAT_REPLY
+        self._scoring_result = scoring_result or self.DEFAULT_SCORING_RESULT
+        self._scoring_reply = json.dumps(self._scoring_result, ensure_ascii=False)
+        self._distribution = latency_distribution
+        self._jitter = latency_jitter
+        self._tokens_per_second = tokens_per_second
+        self._failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.call_count = 0
+        self.failure_count = 0
+
+    @classmethod
+    def from_env(cls):
+        """按 STUB_* 环境变量创建（MODEL_PROVIDER=stub 时使用）"""
+        seed = os.getenv("STUB_SEED")
+        tokens_per_second = os.getenv("STUB_TOKENS_PER_SECOND")
+        return cls(
+            latency=float(os.getenv("STUB_LATENCY", 0.0)),
+            latency_distribution=os.getenv("STUB_LATENCY_DISTRIBUTION", "fixed"),
+            latency_jitter=float(os.getenv("STUB_LATENCY_JITTER", 0.0)),
+            tokens_per_second=float(tokens_per_second) if tokens_per_second else None,
+            failure_rate=float(os.getenv("STUB_FAILURE_RATE", 0.0)),
+            seed=int(seed) if seed else None
+        )
+
+    @staticmethod
+    def add_parser_args(parser):
+        parser.add_argument("--stub-latency", type=float, default=0.0,
+                            help="桩引擎每次调用的模拟延迟（秒）")
+
+    @staticmethod
+    def is_scoring_request(memories):
+        """根据系统提示判断是否为评分请求"""
+        return bool(memories) and memories[0].get("role") == "system" and "评估" in memories[0].get("content", "")
+
+    @staticmethod
+    def count_tokens(text):
+        """与限速器相同的粗略估算（中文约1.5字符/token）"""
+        return max(1, int(len(text) / 1.5))
+
+    def _sample_latency(self):
+        """按配置的分布抽取一次延迟（调用方持有锁）"""
+        if self._distribution == "uniform":
+            return self._rng.uniform(self._latency - self._jitter, self._latency + self._jitter)
+        if self._distribution == "normal":
+            return self._rng.gauss(self._latency, self._jitter)
+        if self._distribution == "lognormal" and self._latency > 0:
+            return self._rng.lognormvariate(math.log(self._latency), self._jitter)
+        return self._latency
+
+    def _batch_scoring_reply(self, memories):
+        """批量评分请求（系统提示要求results数组）按 [编号] 问题点逐项返回预设结果"""
+        ids = re.findall(r"^\[(\d+)\]", memories[-1].get("content", ""), re.MULTILINE)
+        results = [dict(self._scoring_result, id=int(i)) for i in ids]
+        return json.dumps({"results": results}, ensure_ascii=False)
+
+    def get_response(self, memories, purpose=PURPOSE_CHAT, response_format=None):
+        if purpose == PURPOSE_SCORING or self.is_scoring_request(memories):
+            if '"results"' in memories[0].get("content", ""):
+                reply = self._batch_scoring_reply(memories)
+            else:
+                reply = self._scoring_reply
+        else:
+            reply = self._chat_reply
+
+        with self._lock:
+            self.call_count += 1
+            delay = max(0.0, self._sample_latency())
+            failed = self._failure_rate > 0 and self._rng.random() < self._failure_rate
+            if failed:
+                self.failure_count += 1
+        if self._tokens_per_second:
+            delay += self.count_tokens(reply) / self._tokens_per_second
+
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise StubEngineError("桩引擎注入的模拟失败")
+        prompt_text = "".join(m.get("content") or "" for m in memories)
+        record_usage(self.count_tokens(prompt_text), self.count_tokens(reply), estimated=True)
+        return reply
@@ -0,0 +1,63 @@
+"""
+token用量统计
+评分等后台任务在 track_usage() 作用域内运行，作用域内（含通过 contextvars.copy_context
+提交到线程池的任务）的所有模型调用把prompt/completion token数累加到同一个 TokenUsage。
+服务端返回了usage时记录实际值，桩引擎等无法获得实际值时记录估算值并单独计数。
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_current_usage: ContextVar[Optional["TokenUsage"]] = ContextVar("token_usage", default=None)
+
+
+class TokenUsage:
+    """一次任务（如一次评分）累计的token用量，线程安全"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self.estimated_calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_tokens: int, completion_tokens: int, estimated: bool = False) -> None:
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls += 1
+            if estimated:
+                self.estimated_calls += 1
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "calls": self.calls,
+                "estimated_calls": self.estimated_calls
+            }
+
+
+@contextmanager
+def track_usage(usage: Optional[TokenUsage] = None):
+    """在作用域内统计模型调用的token用量"""
+    usage = usage or TokenUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(prompt_tokens: int, completion_tokens: int, estimated: bool = False) -> None:
+    """由引擎在每次实际发起的调用后调用；不在统计作用域内时为空操作"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens, estimated)
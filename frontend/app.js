@@ -65,8 +65,13 @@ class APIClient {
         return this.request(`/sp/session/${sessionId}/info`);
     }
 
-    static async getHistory(sessionId) {
-        return this.request(`/sp/session/${sessionId}/history`);
+    // since: 已有的轮数，只获取之后的新轮次；limit: 每页轮数
+    static async getHistory(sessionId, { since, limit } = {}) {
+        const params = new URLSearchParams();
+        if (since !== undefined) params.set('since', since);
+        if (limit !== undefined) params.set('limit', limit);
+        const query = params.toString();
+        return this.request(`/sp/session/${sessionId}/history${query ? `?${query}` : ''}`);
     }
 
     static async getSessions() {
@@ -109,6 +114,28 @@ class APIClient {
         return this.request(`/scoring/report/${sessionId}`);
     }
 
+    static async startScoreReportJob(sessionId) {
+        return this.request(`/scoring/report/${sessionId}/jobs`, {
+            method: 'POST'
+        });
+    }
+
+    static async getScoreReportJob(jobId) {
+        return this.request(`/scoring/jobs/${jobId}`);
+    }
+
+    static streamScoreReportJob(jobId) {
+        return new EventSource(`${API_BASE_URL}/scoring/jobs/${jobId}/stream`);
+    }
+
+    static streamSessionEvents(sessionId) {
+        return new EventSource(`${API_BASE_URL}/events/session/${sessionId}`);
+    }
+
+    static streamDashboardEvents() {
+        return new EventSource(`${API_BASE_URL}/events/dashboard`);
+    }
+
     static async getScoreSummary(sessionId) {
         return this.request(`/scoring/summary/${sessionId}`);
     }
@@ -175,6 +202,12 @@ class LoadingManager {
 class SPApp {
     constructor() {
         this.examReports = [];
+        this.sessionEvents = null;   // 当前会话的推送连接
+        this.shownTurns = 0;         // 当前会话已显示的对话轮数
+        this.sending = false;
+        this.ownScoreJobs = new Set();
+        this.pollTimer = null;
+        this.refreshTimer = null;
         this.init();
     }
 
@@ -184,9 +217,101 @@ class SPApp {
         await this.loadPresets();
         await this.loadPrompts();
         await this.loadSessions();
+        this.subscribeDashboard();
         this.updateUI();
     }
 
+    // 会话列表由服务器推送变化时刷新；不支持或连接失败时退回每30秒轮询
+    subscribeDashboard() {
+        if (typeof EventSource === 'undefined') {
+            this.startPolling();
+            return;
+        }
+
+        const source = APIClient.streamDashboardEvents();
+        ['session_created', 'sessions_created', 'session_activity', 'session_scored', 'session_deleted', 'session_expired'].forEach(type => {
+            source.addEventListener(type, () => this.scheduleSessionRefresh());
+        });
+        source.onopen = () => {
+            this.stopPolling();
+            // 断线期间的变化可能已超出服务器缓冲，重连后整体刷新一次
+            this.scheduleSessionRefresh();
+        };
+        source.onerror = () => {
+            // 浏览器会自动重连，重连成功前先轮询
+            this.startPolling();
+        };
+    }
+
+    scheduleSessionRefresh() {
+        // 多个学生同时对话时合并为一次刷新
+        if (this.refreshTimer) return;
+        this.refreshTimer = setTimeout(async () => {
+            this.refreshTimer = null;
+            await this.loadSessions();
+        }, 1000);
+    }
+
+    startPolling() {
+        if (this.pollTimer) return;
+        this.pollTimer = setInterval(async () => {
+            if (AppState.isConnected) {
+                await this.loadSessions();
+            }
+        }, 30000);
+    }
+
+    stopPolling() {
+        if (this.pollTimer) {
+            clearInterval(this.pollTimer);
+            this.pollTimer = null;
+        }
+    }
+
+    // 订阅当前会话：其他窗口中的新对话、评分完成、会话过期/删除
+    subscribeSession(sessionId) {
+        if (this.sessionEvents) {
+            this.sessionEvents.close();
+            this.sessionEvents = null;
+        }
+        if (typeof EventSource === 'undefined') return;
+
+        const source = APIClient.streamSessionEvents(sessionId);
+        this.sessionEvents = source;
+
+        source.addEventListener('turn', (e) => {
+            if (AppState.currentSession?.session_id !== sessionId) return;
+            const turn = JSON.parse(e.data);
+            // 本窗口发送的消息由发送请求的响应显示
+            if (!this.sending && turn.turn_index >= this.shownTurns) {
+                this.addMessage('user', turn.user_message);
+                this.addMessage('patient', turn.sp_response);
+            }
+            this.shownTurns = Math.max(this.shownTurns, turn.turn_index + 1);
+        });
+
+        source.addEventListener('score_completed', (e) => {
+            const event = JSON.parse(e.data);
+            if (!this.ownScoreJobs.has(event.job_id)) {
+                NotificationManager.show('该会话的评分报告已生成', 'info');
+            }
+        });
+
+        ['session_expired', 'session_deleted'].forEach(type => {
+            source.addEventListener(type, () => {
+                source.close();
+                if (this.sessionEvents === source) {
+                    this.sessionEvents = null;
+                }
+                if (AppState.currentSession?.session_id !== sessionId) return;
+                NotificationManager.show(type === 'session_expired' ? '会话已过期' : '会话已被删除', 'warning');
+                AppState.currentSession = null;
+                this.loadSessions();
+                this.updateUI();
+            });
+        });
+    }
+
     bindEvents() {
         // 数据源切换
         document.querySelectorAll('input[name="dataSource"]').forEach(radio => {
@@ -503,6 +628,8 @@ class SPApp {
         AppState.currentSession = session;
         this.updateSessionList();
         this.showChatInterface(session);
+        this.shownTurns = 0;
+        this.subscribeSession(sessionId);
         this.loadChatHistory();
     }
 
@@ -543,6 +670,7 @@ class SPApp {
             this.addMessage('user', item.user_message);
             this.addMessage('patient', item.sp_response);
         });
+        this.shownTurns = Math.max(this.shownTurns, history.length);
 
         this.scrollToBottom();
     }
@@ -560,6 +688,7 @@ class SPApp {
         // 显示加载状态
         const loadingMessage = this.addMessage('patient', '思考中...', true);
 
+        this.sending = true;
         try {
             const result = await APIClient.sendMessage(AppState.currentSession.session_id, message);
             
@@ -570,6 +699,7 @@ class SPApp {
             
             if (result.success) {
                 this.addMessage('patient', result.data.sp_response);
+                this.shownTurns = Math.max(this.shownTurns, result.data.turn_index + 1);
                 
                 // 更新会话消息计数
                 const session = AppState.sessions.find(s => s.session_id === AppState.currentSession.session_id);
@@ -583,6 +713,8 @@ class SPApp {
                 loadingMessage.remove();
             }
             NotificationManager.show(`发送消息失败: ${error.message}`, 'error');
+        } finally {
+            this.sending = false;
         }
     }
 
@@ -718,6 +850,12 @@ class SPApp {
         const confirmed = confirm(`确定要删除会话 "${AppState.currentSession.patient_name}" 吗？`);
         if (!confirmed) return;
 
+        // 本窗口删除的会话不再提示"会话已被删除"
+        if (this.sessionEvents) {
+            this.sessionEvents.close();
+            this.sessionEvents = null;
+        }
+
         LoadingManager.show();
         try {
             const result = await APIClient.deleteSession(AppState.currentSession.session_id);
@@ -805,20 +943,107 @@ class SPApp {
             return;
         }
 
-        LoadingManager.show();
         try {
-            const result = await APIClient.getScoreReport(AppState.currentSession.session_id);
-            if (result.success) {
-                this.displayScoreReport(result.data);
+            const result = await APIClient.startScoreReportJob(AppState.currentSession.session_id);
+            if (!result.success) {
+                return;
+            }
+
+            const job = result.data;
+            this.ownScoreJobs.add(job.job_id);
+            if (job.status === 'completed') {
+                const jobResult = await APIClient.getScoreReportJob(job.job_id);
+                this.displayScoreReport(jobResult.data.report);
                 document.getElementById('scoreModal').classList.add('show');
+                return;
+            }
+
+            this.displayScoreProgress(job);
+            document.getElementById('scoreModal').classList.add('show');
+
+            if (typeof EventSource === 'undefined') {
+                await this.pollScoreReportJob(job.job_id);
+            } else {
+                this.streamScoreReportJob(job.job_id);
             }
         } catch (error) {
             NotificationManager.show('获取评分报告失败', 'error');
-        } finally {
-            LoadingManager.hide();
         }
     }
 
+    streamScoreReportJob(jobId) {
+        const source = APIClient.streamScoreReportJob(jobId);
+        const matched = [];
+
+        source.addEventListener('progress', (e) => {
+            const event = JSON.parse(e.data);
+            if (event.is_match && !matched.includes(event.question)) {
+                matched.push(event.question);
+            }
+            this.displayScoreProgress(event, matched);
+        });
+
+        source.addEventListener('completed', (e) => {
+            source.close();
+            this.displayScoreReport(JSON.parse(e.data).report);
+        });
+
+        source.addEventListener('failed', (e) => {
+            source.close();
+            NotificationManager.show(`评分失败: ${JSON.parse(e.data).error}`, 'error');
+        });
+
+        source.onerror = () => {
+            // 流中断时退回轮询
+            source.close();
+            this.pollScoreReportJob(jobId);
+        };
+    }
+
+    async pollScoreReportJob(jobId) {
+        try {
+            while (true) {
+                const result = await APIClient.getScoreReportJob(jobId);
+                const job = result.data;
+                if (job.status === 'completed') {
+                    this.displayScoreReport(job.report);
+                    return;
+                }
+                if (job.status === 'failed') {
+                    NotificationManager.show(`评分失败: ${job.error}`, 'error');
+                    return;
+                }
+                this.displayScoreProgress(job);
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+        } catch (error) {
+            NotificationManager.show('获取评分报告失败', 'error');
+        }
+    }
+
+    displayScoreProgress(progress, matched = []) {
+        const container = document.getElementById('scoreModalContent');
+        const total = progress.total_pairs || 0;
+        const done = progress.evaluated_pairs || 0;
+        const percentage = total > 0 ? (done / total * 100) : 0;
+
+        container.innerHTML = `
+            <div style="text-align: center; margin-bottom: 20px;">
+                <div style="font-size: 18px; margin-bottom: 10px;">🧠 正在生成评分报告...</div>
+                <div style="color: #666; margin-bottom: 10px;">已评估 ${done} / ${total}</div>
+                <div style="background: #e0e0e0; border-radius: 10px; height: 8px; overflow: hidden;">
+                    <div style="background: #2196f3; height: 100%; width: ${percentage}%; transition: width 0.3s;"></div>
+                </div>
+            </div>
+            ${matched.length > 0 ? `
+                <h4 style="color: #4caf50;">✅ 已匹配的问题 (${matched.length})</h4>
+                <ul style="margin: 0; padding-left: 20px;">
+                    ${matched.map(question => `<li style="color: #4caf50; margin-bottom: 8px;">${question}</li>`).join('')}
+                </ul>
+            ` : ''}
+        `;
+    }
+
     displayScoreReport(report) {
         const container = document.getElementById('scoreModalContent');
         const score = report.score_summary;
@@ -848,6 +1073,7 @@ class SPApp {
                     ${score.evaluation.comment}
                 </div>
                 ${isIntelligentScoring ? '<div style="color: #2196f3; font-size: 14px; margin-bottom: 10px;">🧠 AI智能评分系统</div>' : ''}
+                ${score.degraded ? `<div style="background: #fff3e0; color: #e65100; font-size: 14px; padding: 8px; border-radius: 6px;">⚠️ AI服务暂不可用，其中 ${score.degraded_evaluations} 项评估使用了本地降级评分，结果仅供参考</div>` : ''}
             </div>
             
             <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-bottom: 20px;">
@@ -995,10 +1221,3 @@ let app;
 document.addEventListener('DOMContentLoaded', () => {
     app = new SPApp();
 });
-
-// 定期刷新会话列表
-setInterval(async () => {
-    if (app && AppState.isConnected) {
-        await app.loadSessions();
-    }
-}, 30000); // 每30秒刷新一次
@@ -1,78 +1,287 @@
 #!/usr/bin/env python3
 """
 前端静态文件服务器
-用于在开发环境中提供前端文件服务
+启动时把前端文件全部读入内存并预先压缩（gzip，安装了brotli时另有br），多线程处理请求：
+- ETag 为内容哈希，支持 If-None-Match 条件请求（304）
+- 页面中引用的本地脚本/样式改写为 app.js?v=<内容哈希>，带版本号的请求可长期缓存，
+  页面本身和不带版本号的请求每次向服务器验证
+- 文件修改后（按 FRONTEND_RELOAD_INTERVAL 秒检查一次，0为不检查）重新加载
 """
 
+import gzip
+import hashlib
 import os
+import re
 import sys
+import threading
 import time
 import http.server
-import socketserver
-import webbrowser
 from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+    '.svg': 'image/svg+xml',
+    '.txt': 'text/plain; charset=utf-8',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.ico': 'image/x-icon',
+    '.woff2': 'font/woff2'
+}
+# 文本类资源才压缩，太小的文件压缩收益不抵开销
+COMPRESSIBLE = ('.html', '.js', '.css', '.json', '.svg', '.txt')
+MIN_COMPRESS_SIZE = 512
+STATIC_EXTENSIONS = ('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg', '.woff2')
+
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDATE = 'no-cache'
+
+# 页面中的本地资源引用：src="app.js" / href="styles.css"
+ASSET_REFERENCE = re.compile(r'((?:src|href)=")([^":?#]+\.(?:js|css))(")')
+
+
+class Asset:
+    """一个文件的内存副本及其预压缩版本"""
+
+    __slots__ = ('content_type', 'digest', 'variants')
+
+    def __init__(self, path: str, body: bytes):
+        ext = os.path.splitext(path)[1].lower()
+        self.content_type = CONTENT_TYPES[ext]
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        # 编码 → (内容, ETag)；不同编码的字节不同，ETag也不同
+        self.variants = {'identity': (body, f'"{self.digest}"')}
+        if ext in COMPRESSIBLE and len(body) >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = (compressed, f'"{self.digest}-gzip"')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants['br'] = (compressed, f'"{self.digest}-br"')
+
+    def select(self, accept_encoding: str):
+        """按 Accept-Encoding 选择版本：br > gzip > 原始"""
+        accepted = {token.split(';')[0].strip() for token in accept_encoding.lower().split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+    def matches(self, if_none_match: str) -> bool:
+        """If-None-Match 中任一ETag对应本文件当前内容（任一编码）即视为未修改"""
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag.strip('"').split('-')[0] == self.digest:
+                return True
+        return False
+
+
+class AssetCache:
+    """前端目录的内存快照，文件变化时整体重建（页面引用的版本号依赖资源哈希）"""
+
+    def __init__(self, root: Path, reload_interval: float = 1.0):
+        self.root = root
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._assets = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self.load()
+
+    def _scan(self):
+        """(相对路径, 修改时间, 大小) 列表，作为目录快照的签名"""
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(('.', '__'))]
+            for name in filenames:
+                if os.path.splitext(name)[1].lower() not in CONTENT_TYPES:
+                    continue
+                full = os.path.join(dirpath, name)
+                stat = os.stat(full)
+                entries.append((os.path.relpath(full, self.root).replace(os.sep, '/'), stat.st_mtime_ns, stat.st_size))
+        return sorted(entries)
+
+    def load(self):
+        signature = self._scan()
+        raw = {}
+        for relpath, _, _ in signature:
+            with open(self.root / relpath, 'rb') as f:
+                raw[relpath] = f.read()
+
+        assets = {relpath: Asset(relpath, body) for relpath, body in raw.items() if not relpath.endswith('.html')}
+        # 页面中引用的本地资源加上内容哈希版本号
+        for relpath, body in raw.items():
+            if relpath.endswith('.html'):
+                base = os.path.dirname(relpath)
+
+                def versioned(match):
+                    target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, '/')
+                    asset = assets.get(target)
+                    if asset is None:
+                        return match.group(0)
+                    return f'{match.group(1)}{match.group(2)}?v={asset.digest[:8]}{match.group(3)}'
+
+                html = ASSET_REFERENCE.sub(versioned, body.decode('utf-8'))
+                assets[relpath] = Asset(relpath, html.encode('utf-8'))
+
+        with self._lock:
+            self._assets = assets
+            self._signature = signature
+            self._checked_at = time.time()
+        return len(assets)
+
+    def refresh_if_stale(self):
+        """距上次检查超过 reload_interval 秒时检查文件是否变化"""
+        if self.reload_interval <= 0 or time.time() - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if time.time() - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = time.time()
+        if self._scan() != self._signature:
+            count = self.load()
+            print(f"🔄 前端文件已变化，重新加载 {count} 个文件")
+
+    def get(self, relpath: str):
+        self.refresh_if_stale()
+        return self._assets.get(relpath)
+
+    @property
+    def total_bytes(self):
+        return sum(len(a.variants['identity'][0]) for a in self._assets.values())
+
+    def __len__(self):
+        return len(self._assets)
+
+
+def create_handler(cache: AssetCache):
+    class FrontendRequestHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 空闲的keep-alive连接超时后释放线程
+        timeout = 15
 
-def start_frontend_server(port=8080):
-    """启动前端服务器"""
-    frontend_dir = Path(__file__).parent
-    os.chdir(frontend_dir)
-    
-    class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         def end_headers(self):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
             super().end_headers()
-        
+
+        def _resolve(self, path):
+            """请求路径 → 资源；不存在的静态资源返回None（404），其他路径回退到index.html（前端路由）"""
+            relpath = path.lstrip('/') or 'index.html'
+            asset = cache.get(relpath)
+            if asset is None and not relpath.endswith(STATIC_EXTENSIONS) and not path.startswith('/api'):
+                asset = cache.get('index.html')
+            return asset
+
+        def _serve(self, head_only=False):
+            url = urlsplit(self.path)
+            asset = self._resolve(url.path)
+            if asset is None:
+                body = b'Not Found'
+                self.send_response(404)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if not head_only:
+                    self.wfile.write(body)
+                return
+
+            # 带有与当前内容一致的版本号时可长期缓存，否则每次验证
+            version = parse_qs(url.query).get('v', [''])[0]
+            cache_control = CACHE_IMMUTABLE if version and asset.digest.startswith(version) else CACHE_REVALIDATE
+            encoding, (body, etag) = asset.select(self.headers.get('Accept-Encoding', ''))
+
+            if_none_match = self.headers.get('If-None-Match')
+            if if_none_match and asset.matches(if_none_match):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', cache_control)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', asset.content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            if not head_only:
+                self.wfile.write(body)
+
         def do_GET(self):
-            """处理GET请求，支持SPA路由"""
-            # 如果请求根路径，直接返回index.html
-            if self.path == '/':
-                self.path = '/index.html'
-            
-            # 检查文件是否存在，如果不存在且不是API请求，返回index.html
-            # 这样可以支持前端路由
-            if not os.path.exists(self.path[1:]) and not self.path.startswith('/api'):
-                # 如果是请求静态资源文件但不存在，返回404
-                if any(self.path.endswith(ext) for ext in ['.js', '.css', '.png', '.jpg', '.ico']):
-                    super().do_GET()
-                    return
-                # 否则返回index.html，支持前端路由
-                self.path = '/index.html'
-            
-            super().do_GET()
-        
+            self._serve()
+
+        def do_HEAD(self):
+            self._serve(head_only=True)
+
         def do_OPTIONS(self):
             """处理OPTIONS请求，用于CORS预检"""
             self.send_response(200)
+            self.send_header('Content-Length', '0')
             self.end_headers()
-        
+
         def log_message(self, format, *args):
             """自定义日志格式"""
             timestamp = time.strftime('%H:%M:%S')
             print(f"[{timestamp}] {self.address_string()} - {format % args}")
-    
+
+    return FrontendRequestHandler
+
+
+class FrontendServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # 考试开始时大量学生同时打开页面
+    request_queue_size = 256
+
+
+def start_frontend_server(port=8080):
+    """启动前端服务器"""
+    frontend_dir = Path(__file__).parent
+    cache = AssetCache(frontend_dir, reload_interval=float(os.environ.get('FRONTEND_RELOAD_INTERVAL', 1.0)))
+
     try:
-        with socketserver.TCPServer(("", port), CORSHTTPRequestHandler) as httpd:
+        with FrontendServer(("", port), create_handler(cache)) as httpd:
             print("🌐 AI标准化病人前端服务")
             print("=" * 40)
             print(f"📍 服务地址: http://localhost:{port}")
             print(f"📂 服务目录: {frontend_dir}")
+            print(f"📦 已加载 {len(cache)} 个文件（{cache.total_bytes / 1024:.1f} KB），"
+                  f"压缩: gzip{' + br' if brotli is not None else ''}")
             print("=" * 40)
             print("💡 使用说明:")
-            print("  1. 确保后端服务正在运行 (端口8080)")
+            print("  1. 确保后端服务正在运行 (端口3000)")
             print("  2. 在浏览器中打开前端地址")
             print("  3. 创建会话开始与AI病人对话")
             print("=" * 40)
             print("⌨️  按 Ctrl+C 停止服务")
             print()
-            
+
             httpd.serve_forever()
-            
+
     except KeyboardInterrupt:
         print("\n👋 前端服务已停止")
     except OSError as e:
-        if e.errno == 48:  # Address already in use
+        if e.errno in (48, 98):  # Address already in use (macOS / Linux)
             print(f"❌ 端口 {port} 已被占用，请尝试其他端口")
             print(f"   使用方法: python {sys.argv[0]} [端口号]")
         else:
@@ -83,7 +292,7 @@ def start_frontend_server(port=8080):
 def main():
     """主函数"""
     port = 8080
-    
+
     # 检查命令行参数
     if len(sys.argv) > 1:
         try:
@@ -91,16 +300,16 @@ def main():
         except ValueError:
             print("❌ 端口号必须是数字")
             sys.exit(1)
-    
+
     # 检查前端文件是否存在
     frontend_dir = Path(__file__).parent
     index_file = frontend_dir / 'index.html'
-    
+
     if not index_file.exists():
         print("❌ 未找到 index.html 文件")
         print(f"   请确保在 {frontend_dir} 目录下运行此脚本")
         sys.exit(1)
-    
+
     start_frontend_server(port)
 
 if __name__ == '__main__':
@@ -0,0 +1,265 @@
+"""
+批量评分模块
+考试结束后对整个班级的会话/导出记录统一评分：
+相同的(问题点, 医生消息)评估在学生之间去重，所有AI调用经同一个限速线程池调度，
+结果按输入顺序逐条产出，便于流式写入JSONL/CSV
+"""
+
+import contextvars
+import csv
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+
+from engine.usage import TokenUsage, track_usage
+from modules.intelligent_scoring import IntelligentScoringAgent, IntelligentScoringSystem
+from modules.score_aggregation import ItemColumns, aggregate_cohort
+from observability.metrics import CACHE_REQUESTS
+
+
+CSV_FIELDS = [
+    "session_id", "patient_name", "recommended_score", "perfect_score", "partial_score",
+    "asked_questions", "total_questions", "conversation_count", "level", "error"
+]
+
+
+class _Throttle:
+    """简单的全局请求间隔限速器（每分钟请求数）"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self._interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_time)
+            self._next_time = scheduled + self._interval
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def load_transcripts(path: str) -> List[Dict[str, Any]]:
+    """从JSON数组或JSONL文件加载导出的会话记录"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    if not content:
+        return []
+    if content.startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+class BatchGrader:
+    """批量评分器"""
+
+    def __init__(self, engine=None, max_workers: int = 8, requests_per_minute: Optional[float] = None,
+                 threshold: float = 60.0, include_context_in_key: bool = False,
+                 default_case_data: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            engine: AI引擎，默认创建GPTEngine
+            max_workers: 并发AI调用数
+            requests_per_minute: 全局每分钟请求上限，None表示不限速
+            threshold: 匹配阈值
+            include_context_in_key: 评估是否使用对话上下文。False时评估不发送上下文，
+                相同的(问题点, 消息)在学生之间共用一次评估，结果与记录顺序无关；
+                True时上下文同时进入去重键（去重率大幅降低）
+            default_case_data: 记录中未携带病例数据时使用的病例
+        """
+        if engine is None:
+            from engine.factory import create_engine
+            engine = create_engine()
+        self.engine = engine
+        self.max_workers = max_workers
+        self.threshold = threshold
+        self.include_context_in_key = include_context_in_key
+        self.default_case_data = default_case_data
+        self._agent = IntelligentScoringAgent(engine)
+        self._throttle = _Throttle(requests_per_minute)
+        self.stats: Dict[str, Any] = {}
+
+    def _build_scoring_system(self, transcript: Dict[str, Any]) -> IntelligentScoringSystem:
+        """根据导出记录重建评分系统（不触发任何AI调用）"""
+        case_data = transcript.get("case_data")
+        if case_data is None and transcript.get("preset_file"):
+            from backend.services.preset_service import PresetService
+            preset_path = PresetService.get_preset_path(transcript["preset_file"])
+            with open(preset_path, 'r', encoding='utf-8') as f:
+                case_data = json.load(f)
+        if case_data is None:
+            case_data = self.default_case_data
+        if case_data is None:
+            raise ValueError("记录缺少 case_data 或 preset_file")
+
+        system = IntelligentScoringSystem(case_data, threshold=self.threshold, engine=self.engine)
+        messages = transcript.get("messages") or transcript.get("conversation_history") or []
+        for msg in messages:
+            if msg.get("role") in ("user", "assistant"):
+                system.record_message(msg.get("content", ""), msg["role"])
+        return system
+
+    def _evaluation_key(self, item, message: str, context: str) -> Tuple[str, str, str, str]:
+        """去重键，最后一项是评估实际使用的上下文（不使用上下文时为空）"""
+        return (item.question, item.answer, message, context if self.include_context_in_key else "")
+
+    def _evaluate(self, item, message: str, context: str, usage: TokenUsage) -> Dict[str, Any]:
+        self._throttle.wait()
+        with track_usage(usage):
+            return self._agent.evaluate_question_match(
+                doctor_question=message,
+                target_question=item.question,
+                target_answer=item.answer,
+                context=context,
+                keywords=item.keywords
+            )
+
+    def grade(self, transcripts: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        对所有记录评分，按输入顺序逐条产出结果
+
+        先规划全部(问题点, 消息)评估并去重提交到线程池，再按记录顺序等待结果，
+        因此前面的学生完成后即可写出，无需等待整个班级
+        """
+        start_time = time.time()
+        planned = []  # (transcript, system, [(message, item, key)]) 或 (transcript, None, error)
+        futures: Dict[Tuple[str, str, str, str], Future] = {}
+        total_pairs = 0
+        usage = TokenUsage()
+        # 每次评分的汇总数据用局部变量，同一评分器被并发复用时互不影响
+        cohort_columns: List[ItemColumns] = []
+        category_index: Dict[str, int] = {}
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-grade")
+        finished = False
+        try:
+            for transcript in transcripts:
+                if transcript.get("error"):
+                    planned.append((transcript, None, transcript["error"]))
+                    continue
+                try:
+                    system = self._build_scoring_system(transcript)
+                except Exception as e:
+                    planned.append((transcript, None, str(e)))
+                    continue
+
+                pairs = []
+                for message, context in system.build_message_contexts(max_context=5):
+                    for item in system.question_items:
+                        key = self._evaluation_key(item, message, context)
+                        if key not in futures:
+                            # 只发送键中的上下文，共用结果的学生得到同一输入的评估
+                            futures[key] = pool.submit(contextvars.copy_context().run, self._evaluate,
+                                                       item, message, key[3], usage)
+                        pairs.append((message, item, key))
+                total_pairs += len(pairs)
+                planned.append((transcript, system, pairs))
+
+            self.stats = {
+                "sessions": len(planned),
+                "total_pairs": total_pairs,
+                "unique_evaluations": len(futures),
+                "deduplicated_evaluations": total_pairs - len(futures)
+            }
+            CACHE_REQUESTS.inc(len(futures), cache="batch_evaluation", result="miss")
+            CACHE_REQUESTS.inc(total_pairs - len(futures), cache="batch_evaluation", result="hit")
+
+            for transcript, system, pairs in planned:
+                yield self._collect_result(transcript, system, pairs, futures, cohort_columns, category_index)
+            finished = True
+        finally:
+            # 客户端断开（GeneratorExit）或出错时取消排队中的评估，不等待其完成
+            pool.shutdown(wait=finished, cancel_futures=not finished)
+
+        self.stats["elapsed_seconds"] = round(time.time() - start_time, 3)
+        self.stats["token_usage"] = usage.to_dict()
+        cohort = aggregate_cohort(cohort_columns)
+        cohort.pop("scores", None)
+        self.stats["cohort"] = cohort
+
+    def _collect_result(self, transcript, system, pairs, futures, cohort_columns, category_index) -> Dict[str, Any]:
+        session_id = transcript.get("session_id", "")
+        if system is None:
+            return {"session_id": session_id, "error": pairs}
+
+        try:
+            for message, item, key in pairs:
+                item.apply_evaluation(message, futures[key].result())
+            report = system.get_detailed_report()
+            cohort_columns.append(ItemColumns.from_items(system.question_items, category_index))
+        except Exception as e:
+            return {"session_id": session_id, "error": str(e)}
+
+        return {
+            "session_id": session_id,
+            "patient_name": report["case_info"]["patient_name"],
+            "score_summary": report["score_summary"],
+            "conversation_count": report["conversation_count"],
+            "missed_questions": [item["question"] for item in report["missed_questions"]],
+            "partially_matched_questions": [item["question"] for item in report["partially_matched_questions"]],
+            "error": None
+        }
+
+
+def to_csv_row(result: Dict[str, Any]) -> Dict[str, Any]:
+    """将评分结果展开为CSV行"""
+    summary = result.get("score_summary") or {}
+    return {
+        "session_id": result.get("session_id", ""),
+        "patient_name": result.get("patient_name", ""),
+        "recommended_score": summary.get("recommended_score", ""),
+        "perfect_score": summary.get("perfect_score", ""),
+        "partial_score": summary.get("partial_score", ""),
+        "asked_questions": summary.get("asked_questions", ""),
+        "total_questions": summary.get("total_questions", ""),
+        "conversation_count": result.get("conversation_count", ""),
+        "level": (summary.get("evaluation") or {}).get("level", ""),
+        "error": result.get("error") or ""
+    }
+
+
+def iter_formatted(results: Iterable[Dict[str, Any]], fmt: str = "jsonl") -> Iterator[str]:
+    """将评分结果逐条格式化为JSONL或CSV文本"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(to_csv_row(result))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.getvalue():
+            yield buffer.getvalue()
+    else:
+        for result in results:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+
+def write_results(results: Iterable[Dict[str, Any]], output_path: str, fmt: Optional[str] = None) -> int:
+    """将评分结果流式写入文件，格式默认由扩展名决定，返回写入条数"""
+    if fmt is None:
+        fmt = "csv" if os.path.splitext(output_path)[1].lower() == ".csv" else "jsonl"
+
+    count = 0
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+        for result in results:
+            if writer:
+                writer.writerow(to_csv_row(result))
+            else:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            count += 1
+    return count
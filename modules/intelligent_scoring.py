@@ -3,12 +3,86 @@
 使用项目Engine进行AI Agent评判
 """
 
-import json
-import re
+import os
+import sys
 import time
+from collections import deque
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+from engine.base_engine import PURPOSE_SCORING, RESPONSE_FORMAT_JSON
+from engine.circuit_breaker import CircuitOpenError
+from engine.resilience import DeadlineExceeded, classify_error
+from engine.usage import track_usage
+from modules.structured_output import parse_json_object, validate_schema, PARSE_FAILED
+from observability.metrics import SCORING_PAIRS, SCORING_RUN_SECONDS, SCORING_RUN_TOKENS, SCORING_PARSE
+from observability.tracing import traced
+
+
+# 评分结果字段模式：分数裁剪到范围内，缺失或无法识别的字段使用默认值
+SCORE_DIMENSIONS = ["semantic_match", "information_coverage", "professionalism", "completeness"]
+SCORING_RESULT_SCHEMA = {
+    **{field: {"type": "number", "default": 0.0, "min": 0, "max": 100} for field in SCORE_DIMENSIONS},
+    "overall_score": {"type": "number", "default": 0.0, "min": 0, "max": 100},
+    "is_match": {"type": "bool", "default": False},
+    "confidence": {"type": "number", "default": 0.5, "min": 0, "max": 1},
+    "reasoning": {"type": "string", "default": "无详细评估"},
+    "suggestions": {"type": "string", "default": ""}
+}
+# 批量回复中的一项必须包含全部分数字段才采用，否则（如被截断）该问题点单独补评
+BATCH_REQUIRED_FIELDS = SCORE_DIMENSIONS + ["overall_score"]
+
+
+# 评分规则与输出格式对所有请求相同，作为共享的系统消息（前缀一致，便于服务端前缀缓存）
+_SCORING_RUBRIC = """你是医学问诊评估专家，评估医生的问题是否有效询问了目标问题点。
+各维度0-100分：semantic_match 语义匹配度；information_coverage 能否获取目标信息；professionalism 医学专业性；completeness 是否完整覆盖目标信息点。
+规则：用词不同但能获取相同医学信息应给高分；考虑医学术语的同义词和不同表达；部分匹配给相应分数，不要求字面一致；考虑临床问诊习惯。"""
+_SCORING_FIELDS = ("semantic_match, information_coverage, professionalism, completeness, "
+                   "overall_score（四个维度的加权平均）, is_match（overall_score>=60）, confidence（0-1）, "
+                   "reasoning（简要理由）, suggestions（改进建议，可为空）")
+SCORING_SYSTEM_PROMPT = f"{_SCORING_RUBRIC}\n只返回JSON对象，字段：{_SCORING_FIELDS}。"
+# 批量模式：一次请求评估同一条消息对多个问题点的匹配，消息和上下文只发送一次
+SCORING_BATCH_SYSTEM_PROMPT = (f"{_SCORING_RUBRIC}\n用户会给出一条医生询问和多个编号的目标问题点，逐个评估。"
+                               f'只返回JSON对象 {{"results": [...]}}，每个目标问题点一项，字段：id（编号）, {_SCORING_FIELDS}。')
+
+# 最佳匹配分达到该值但未过阈值时按比例给部分分
+PARTIAL_MATCH_FLOOR = 30
+
+# 每次批量评分请求包含的问题点数，1为逐个评估
+DEFAULT_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", "1"))
+
+# 本地评估的原因（fallback_reason）：只有模型服务不可用（熔断、超时、连接错误、5xx/429）时结果标记为降级，
+# 报告不缓存、稍后重新评分；无法解析回复、请求本身有误等重试也不会改变的失败只记录原因
+FALLBACK_CIRCUIT_OPEN = "circuit_open"
+FALLBACK_PROVIDER_UNAVAILABLE = "provider_unavailable"
+FALLBACK_PARSE_FAILED = "parse_failed"
+FALLBACK_ERROR = "error"
+DEGRADED_FALLBACK_REASONS = {FALLBACK_CIRCUIT_OPEN, FALLBACK_PROVIDER_UNAVAILABLE}
+
+
+def _fallback_reason(error: Exception) -> str:
+    """模型调用异常 → 本地评估原因"""
+    if isinstance(error, CircuitOpenError):
+        return FALLBACK_CIRCUIT_OPEN
+    if isinstance(error, (DeadlineExceeded, ConnectionError, TimeoutError)) or classify_error(error)[0]:
+        return FALLBACK_PROVIDER_UNAVAILABLE
+    return FALLBACK_ERROR
+
+
+def _pair_mode(result: Dict[str, Any]) -> str:
+    """SCORING_PAIRS 指标的mode标签"""
+    if result.get("degraded"):
+        return "degraded"
+    return "fallback" if result.get("fallback_reason") else "ai"
+
+
+def _char_bigrams(text: str) -> set:
+    """去除标点空白后的字符二元组集合（中文没有空格分词，按字符比较）"""
+    chars = [ch for ch in text.lower() if ch.isalnum()]
+    if len(chars) < 2:
+        return set(chars)
+    return {chars[i] + chars[i + 1] for i in range(len(chars) - 1)}
+
 
 class IntelligentScoringAgent:
     """智能评分Agent，使用项目Engine进行AI判断"""
@@ -16,13 +90,15 @@ class IntelligentScoringAgent:
     def __init__(self, engine=None):
         # 使用传入的engine或创建默认engine
         if engine is None:
-            from engine.gpt import GPTEngine
-            self.engine = GPTEngine()
+            from engine.factory import create_engine
+            self.engine = create_engine()
         else:
             self.engine = engine
         
+    @traced("IntelligentScoringAgent.evaluate_question_match")
     def evaluate_question_match(self, doctor_question: str, target_question: str, 
-                              target_answer: str = "", context: str = "") -> Dict[str, Any]:
+                              target_answer: str = "", context: str = "",
+                              keywords: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         评估医生问题是否匹配目标问题点
         
@@ -31,89 +107,161 @@ class IntelligentScoringAgent:
             target_question: 目标隐藏问题
             target_answer: 预期的标准答案
             context: 对话上下文
+            keywords: 问题点关键词，AI不可用时用于本地降级评估
             
         Returns:
             评估结果，包含匹配度、得分、理由等
         """
         
-        prompt = f"""
-你是一个医学问诊评估专家。请评估医生的问题是否有效询问了目标信息点。
-
-目标问题点: {target_question}
-标准答案: {target_answer}
-医生询问: {doctor_question}
-对话上下文: {context}
-
-请从以下几个维度评估:
-1. 语义匹配度(0-100): 医生问题与目标问题的语义相似程度
-2. 信息获取度(0-100): 医生问题能否获取到目标信息
-3. 专业性(0-100): 问题的医学专业性和准确性
-4. 完整性(0-100): 问题是否完整覆盖了目标信息点
-
-评估规则:
-- 即使用词不同，但能获取相同医学信息的问题应该给高分
-- 考虑医学术语的同义词和不同表达方式
-- 部分匹配也应该给予相应分数，不要求100%字面匹配
-- 考虑临床实际情况下的问诊习惯
-
-请返回JSON格式，格式如下：
-{{
-  "semantic_match": 85,
-  "information_coverage": 90,
-  "professionalism": 80,
-  "completeness": 75,
-  "overall_score": 82.5,
-  "is_match": true,
-  "confidence": 0.9,
-  "reasoning": "详细的评估理由",
-  "suggestions": "改进建议（如有）"
-}}
-
-overall_score是四个维度的加权平均(权重可以根据重要性调整)
-is_match: overall_score >= 60 为true
-confidence: 评估的置信度(0-1)
-"""
-
         try:
             # 使用项目engine进行AI调用
-            messages = [
-                {"role": "system", "content": "你是一个专业的医学问诊评估专家，擅长分析医生问诊质量。"},
-                {"role": "user", "content": prompt}
-            ]
+            messages = self.build_messages(doctor_question, target_question, target_answer, context)
             
-            response_text = self.engine.get_response(messages)
+            response_text = self.engine.get_response(messages, purpose=PURPOSE_SCORING,
+                                                     response_format=RESPONSE_FORMAT_JSON)
             
-            # 尝试解析JSON
-            try:
-                # 提取JSON部分
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                else:
-                    # 如果没有找到JSON，构建默认结果
-                    result = self._create_fallback_result(doctor_question, target_question)
-            except json.JSONDecodeError:
-                result = self._create_fallback_result(doctor_question, target_question)
-                
-            # 确保所有必需字段存在
-            result = self._validate_result(result)
+            # 容错解析：代码块、前后说明文字、截断输出都尽量还原，避免浪费已付费的调用
+            parsed, parse_method = parse_json_object(response_text)
+            # 四个维度分数不全（如截断后修复出的部分对象）按解析失败处理，不用部分维度算总分
+            result = self._validate_result(parsed) if parsed is not None else None
+            if result is None:
+                parse_method = PARSE_FAILED
+            SCORING_PARSE.inc(outcome=parse_method)
             
-            return result
+            if result is None:
+                result = self._create_fallback_result(doctor_question, target_question, keywords,
+                                                      FALLBACK_PARSE_FAILED)
             
+        except CircuitOpenError:
+            # 模型服务熔断中，立即使用本地评估，不再等待超时
+            result = self._create_fallback_result(doctor_question, target_question, keywords,
+                                                  FALLBACK_CIRCUIT_OPEN)
         except Exception as e:
             print(f"AI评估出错: {e}")
-            return self._create_fallback_result(doctor_question, target_question)
+            result = self._create_fallback_result(doctor_question, target_question, keywords,
+                                                  _fallback_reason(e))
+        
+        SCORING_PAIRS.inc(mode=_pair_mode(result))
+        return result
+    
+    @staticmethod
+    def build_messages(doctor_question: str, target_question: str, target_answer: str = "",
+                       context: str = "") -> List[Dict[str, str]]:
+        """
+        构建评分请求：固定的评分规则放在系统消息中，每个(消息, 问题点)对只发送可变部分；
+        同一条消息的上下文和询问放在问题点之前，对各问题点的请求前缀相同
+        """
+        lines = []
+        if context:
+            lines.append(f"对话上下文:\n{context}")
+        lines.append(f"医生询问: {doctor_question}")
+        lines.append(f"目标问题点: {target_question}")
+        if target_answer:
+            lines.append(f"标准答案: {target_answer}")
+        return [
+            {"role": "system", "content": SCORING_SYSTEM_PROMPT},
+            {"role": "user", "content": "\n".join(lines)}
+        ]
+    
+    @staticmethod
+    def build_batch_messages(doctor_question: str, items: List["IntelligentQuestionItem"],
+                             context: str = "") -> List[Dict[str, str]]:
+        """构建批量评分请求，消息和上下文只出现一次，问题点按 [编号] 列出"""
+        lines = []
+        if context:
+            lines.append(f"对话上下文:\n{context}")
+        lines.append(f"医生询问: {doctor_question}")
+        lines.append("目标问题点:")
+        for index, item in enumerate(items, 1):
+            lines.append(f"[{index}] {item.question}" + (f"（标准答案: {item.answer}）" if item.answer else ""))
+        return [
+            {"role": "system", "content": SCORING_BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": "\n".join(lines)}
+        ]
+    
+    @traced("IntelligentScoringAgent.evaluate_items")
+    def evaluate_items(self, doctor_question: str, items: List["IntelligentQuestionItem"],
+                       context: str = "") -> List[Dict[str, Any]]:
+        """
+        一次请求评估一条消息对多个问题点的匹配
+        
+        回复中缺失或无法解析的问题点单独调用 evaluate_question_match 补评；
+        模型调用失败时全部使用本地降级评估
+        
+        Returns:
+            与items顺序一致的评估结果列表
+        """
+        if len(items) == 1:
+            item = items[0]
+            return [self.evaluate_question_match(doctor_question, item.question, item.answer, context, item.keywords)]
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        try:
+            messages = self.build_batch_messages(doctor_question, items, context)
+            response_text = self.engine.get_response(messages, purpose=PURPOSE_SCORING,
+                                                     response_format=RESPONSE_FORMAT_JSON)
+            parsed, parse_method = parse_json_object(response_text)
+            entries = parsed.get("results") if parsed is not None else None
+            if not isinstance(entries, list):
+                parse_method = PARSE_FAILED
+                entries = []
+            SCORING_PARSE.inc(outcome=parse_method)
+            
+            for position, entry in enumerate(entries):
+                if not isinstance(entry, dict) or not all(field in entry for field in BATCH_REQUIRED_FIELDS):
+                    continue
+                index = str(entry.get("id", ""))
+                index = int(index) - 1 if index.isdigit() else position
+                if 0 <= index < len(items) and results[index] is None:
+                    result = self._validate_result(entry)
+                    if result is None:
+                        continue
+                    result.pop("id", None)
+                    results[index] = result
+                    SCORING_PAIRS.inc(mode="ai")
+        except CircuitOpenError:
+            return [self._fallback_for_item(doctor_question, item, FALLBACK_CIRCUIT_OPEN) for item in items]
+        except Exception as e:
+            print(f"AI批量评估出错: {e}")
+            reason = _fallback_reason(e)
+            return [self._fallback_for_item(doctor_question, item, reason) for item in items]
+        
+        for index, item in enumerate(items):
+            if results[index] is None:
+                results[index] = self.evaluate_question_match(doctor_question, item.question, item.answer,
+                                                              context, item.keywords)
+        return results
     
-    def _create_fallback_result(self, doctor_question: str, target_question: str) -> Dict[str, Any]:
-        """创建备用评估结果（基于简单规则）"""
-        # 简单的关键词匹配作为备用方案
+    def _fallback_for_item(self, doctor_question: str, item: "IntelligentQuestionItem",
+                           reason: str) -> Dict[str, Any]:
+        result = self._create_fallback_result(doctor_question, item.question, item.keywords, reason)
+        SCORING_PAIRS.inc(mode=_pair_mode(result))
+        return result
+    
+    def _create_fallback_result(self, doctor_question: str, target_question: str,
+                                keywords: Optional[List[str]] = None,
+                                reason: str = FALLBACK_PROVIDER_UNAVAILABLE) -> Dict[str, Any]:
+        """
+        创建备用评估结果（基于本地关键词和字符相似度）
+        结果记录原因 fallback_reason，模型服务不可用时另外标记为降级
+        """
         doctor_lower = doctor_question.lower()
         target_lower = target_question.lower()
         
-        # 基本匹配检查
+        # 词匹配（适用于有空格分词的文本）
         common_words = set(doctor_lower.split()) & set(target_lower.split())
-        match_ratio = len(common_words) / max(len(set(target_lower.split())), 1)
+        word_ratio = len(common_words) / max(len(set(target_lower.split())), 1)
+        
+        # 字符二元组Dice相似度（适用于中文）
+        doctor_bigrams = _char_bigrams(doctor_lower)
+        target_bigrams = _char_bigrams(target_lower)
+        similarity = 2 * len(doctor_bigrams & target_bigrams) / max(len(doctor_bigrams) + len(target_bigrams), 1)
         
+        # 关键词命中，命中两个即视为完全覆盖
+        keyword_hits = [kw for kw in (keywords or []) if kw and kw.lower() in doctor_lower]
+        keyword_ratio = min(len(keyword_hits) / 2, 1.0) if keywords else 0.0
+        
+        match_ratio = max(word_ratio, similarity, keyword_ratio)
         score = min(match_ratio * 100, 85)  # 最高85分
         is_match = score >= 50
         
@@ -125,37 +273,25 @@ confidence: 评估的置信度(0-1)
             "overall_score": score,
             "is_match": is_match,
             "confidence": 0.6,
-            "reasoning": f"备用评估：基于关键词匹配度 {match_ratio:.2f}",
-            "suggestions": "建议使用更具体的医学术语"
+            "reasoning": f"本地降级评估：匹配度 {match_ratio:.2f}（字符相似度 {similarity:.2f}，关键词命中 {len(keyword_hits)}）",
+            "suggestions": "建议使用更具体的医学术语",
+            "fallback_reason": reason,
+            "degraded": reason in DEGRADED_FALLBACK_REASONS
         }
     
-    def _validate_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
-        """验证和修正评估结果"""
-        required_fields = {
-            "semantic_match": 0,
-            "information_coverage": 0,
-            "professionalism": 0,
-            "completeness": 0,
-            "overall_score": 0,
-            "is_match": False,
-            "confidence": 0.5,
-            "reasoning": "无详细评估",
-            "suggestions": ""
-        }
-        
-        for field, default_value in required_fields.items():
-            if field not in result:
-                result[field] = default_value
-        
-        # 确保分数在合理范围内
-        for score_field in ["semantic_match", "information_coverage", "professionalism", "completeness", "overall_score"]:
-            if score_field in result:
-                result[score_field] = max(0, min(100, float(result[score_field])))
-        
-        # 确保置信度在0-1之间
-        result["confidence"] = max(0, min(1, float(result["confidence"])))
-        
-        return result
+    def _validate_result(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按字段模式校验和修正评估结果；四个维度分数缺失或无法识别时返回None"""
+        validated, missing = validate_schema(result, SCORING_RESULT_SCHEMA)
+        if any(field in missing for field in SCORE_DIMENSIONS):
+            return None
+        
+        # 缺少总分时按四个维度的平均值补齐，缺少匹配结论时按总分判断
+        if "overall_score" in missing:
+            validated["overall_score"] = sum(validated[field] for field in SCORE_DIMENSIONS) / len(SCORE_DIMENSIONS)
+        if "is_match" in missing:
+            validated["is_match"] = validated["overall_score"] >= 60
+        
+        return validated
 
 
 class IntelligentQuestionItem:
@@ -177,23 +313,45 @@ class IntelligentQuestionItem:
         self.best_match_score = 0
         self.is_asked = False
         self.asked_messages = []
+        self.degraded_evaluations = 0  # 使用本地降级评估的次数
         
         # AI Agent - 使用传入的engine
         self.scoring_agent = IntelligentScoringAgent(engine)
     
+    def clone(self, engine=None) -> "IntelligentQuestionItem":
+        """以本问题点为模板创建未评估的新问题点（批量创建会话时使用）"""
+        return IntelligentQuestionItem(
+            question=self.question,
+            answer=self.answer,
+            weight=self.weight,
+            category=self.category,
+            keywords=self.keywords,
+            description=self.description,
+            threshold=self.threshold,
+            engine=engine
+        )
+    
     def evaluate_message(self, message: str, context: str = "") -> Dict[str, Any]:
         """评估消息是否匹配此问题点"""
         evaluation = self.scoring_agent.evaluate_question_match(
             doctor_question=message,
             target_question=self.question,
             target_answer=self.answer,
-            context=context
+            context=context,
+            keywords=self.keywords
         )
+        return self.apply_evaluation(message, evaluation)
+    
+    def apply_evaluation(self, message: str, evaluation: Dict[str, Any]) -> Dict[str, Any]:
+        """记录一次已完成的评估结果并更新匹配状态（批量评分可复用共享的评估结果）"""
+        evaluation = dict(evaluation)
         
         # 记录评估结果
         evaluation["timestamp"] = datetime.now().isoformat()
         evaluation["message"] = message
         self.evaluations.append(evaluation)
+        if evaluation.get("degraded"):
+            self.degraded_evaluations += 1
         
         # 更新最佳匹配分数
         if evaluation["overall_score"] > self.best_match_score:
@@ -216,7 +374,7 @@ class IntelligentQuestionItem:
         """获取部分得分（基于最佳匹配分数）"""
         if self.best_match_score >= self.threshold:
             return self.weight  # 完全得分
-        elif self.best_match_score >= 30:  # 部分匹配
+        elif self.best_match_score >= PARTIAL_MATCH_FLOOR:  # 部分匹配
             return self.weight * (self.best_match_score / 100)
         else:
             return 0  # 无匹配
@@ -227,6 +385,7 @@ class IntelligentQuestionItem:
         self.best_match_score = 0
         self.is_asked = False
         self.asked_messages = []
+        self.degraded_evaluations = 0
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -242,6 +401,7 @@ class IntelligentQuestionItem:
             "best_match_score": self.best_match_score,
             "partial_score": self.get_partial_score(),
             "asked_messages": self.asked_messages,
+            "degraded_evaluations": self.degraded_evaluations,
             "evaluations": self.evaluations[-3:]  # 只保留最近3次评估
         }
 
@@ -249,14 +409,23 @@ class IntelligentQuestionItem:
 class IntelligentScoringSystem:
     """智能评分系统"""
     
-    def __init__(self, case_data: Dict[str, Any], threshold: float = 60.0, engine=None):
+    def __init__(self, case_data: Dict[str, Any], threshold: float = 60.0, engine=None,
+                 batch_size: Optional[int] = None,
+                 question_templates: Optional[List["IntelligentQuestionItem"]] = None):
         self.case_data = case_data
         self.threshold = threshold
         self.engine = engine  # 保存engine引用
+        self.batch_size = max(1, batch_size if batch_size is not None else DEFAULT_BATCH_SIZE)
         self.question_items: List[IntelligentQuestionItem] = []
         self.total_weight = 0
         self.conversation_history = []
-        self._initialize_questions()
+        self.token_usage = None  # 最近一次评分计算的token用量
+        if question_templates is not None:
+            # 同一病例的其他会话已解析过问题点，直接复制
+            self.question_items = [item.clone(engine) for item in question_templates]
+            self.total_weight = sum(item.weight for item in self.question_items)
+        else:
+            self._initialize_questions()
     
     def _initialize_questions(self):
         """初始化隐藏问题"""
@@ -308,6 +477,7 @@ class IntelligentScoringSystem:
                 self.question_items.append(question_item)
                 self.total_weight += question_item.weight
     
+    @traced("IntelligentScoringSystem.record_message")
     def record_message(self, message: str, role: str = "user"):
         """仅记录对话消息，不进行评分计算（用于性能优化）"""
         # 只记录对话历史
@@ -317,6 +487,7 @@ class IntelligentScoringSystem:
             "timestamp": datetime.now().isoformat()
         })
 
+    @traced("IntelligentScoringSystem.process_message")
     def process_message(self, message: str, role: str = "user"):
         """处理对话消息（实时评分版本，已弃用）"""
         # 记录对话历史
@@ -335,8 +506,15 @@ class IntelligentScoringSystem:
             for question_item in self.question_items:
                 question_item.evaluate_message(message, context)
     
-    def calculate_scores_from_history(self):
-        """从对话历史中批量计算评分（延迟计算优化）"""
+    @traced("IntelligentScoringSystem.calculate_scores_from_history")
+    def calculate_scores_from_history(self, progress_callback=None):
+        """
+        从对话历史中批量计算评分（延迟计算优化）
+        
+        Args:
+            progress_callback: 可选回调，每评估完一个(消息, 问题点)对调用一次，
+                参数为 (evaluated_pairs, total_pairs, question_item, evaluation)
+        """
         print("🔄 开始从对话历史计算评分...")
         start_time = time.time()
         
@@ -353,17 +531,37 @@ class IntelligentScoringSystem:
         
         print(f"📊 分析 {len(user_messages)} 条用户消息中...")
         
-        # 为每条用户消息构建上下文并评估
-        for i, user_msg in enumerate(user_messages):
-            # 构建该消息的上下文（包括之前的对话）
-            context = self._build_context_for_message(i, max_context=5)
-            
-            # 评估每个问题点
-            for question_item in self.question_items:
-                question_item.evaluate_message(user_msg["content"], context)
+        total_pairs = len(user_messages) * len(self.question_items)
+        evaluated_pairs = 0
+        
+        with track_usage() as usage:
+            # 每条用户消息的上下文只构建一次，供该消息的所有问题点共用
+            for message, context in self.build_message_contexts(max_context=5):
+                if self.batch_size > 1:
+                    # 批量模式：每批问题点一次请求
+                    for start in range(0, len(self.question_items), self.batch_size):
+                        batch = self.question_items[start:start + self.batch_size]
+                        agent = batch[0].scoring_agent
+                        for question_item, result in zip(batch, agent.evaluate_items(message, batch, context)):
+                            evaluation = question_item.apply_evaluation(message, result)
+                            evaluated_pairs += 1
+                            if progress_callback:
+                                progress_callback(evaluated_pairs, total_pairs, question_item, evaluation)
+                    continue
+                
+                # 评估每个问题点
+                for question_item in self.question_items:
+                    evaluation = question_item.evaluate_message(message, context)
+                    evaluated_pairs += 1
+                    if progress_callback:
+                        progress_callback(evaluated_pairs, total_pairs, question_item, evaluation)
         
         end_time = time.time()
         calculation_time = end_time - start_time
+        SCORING_RUN_SECONDS.observe(calculation_time)
+        self.token_usage = usage.to_dict()
+        SCORING_RUN_TOKENS.observe(usage.prompt_tokens, kind="prompt")
+        SCORING_RUN_TOKENS.observe(usage.completion_tokens, kind="completion")
         
         # 统计评分结果
         asked_count = sum(1 for item in self.question_items if item.is_asked)
@@ -371,26 +569,37 @@ class IntelligentScoringSystem:
         
         print(f"✅ 评分计算完成!")
         print(f"   ⏱️ 计算耗时: {calculation_time:.2f}秒")
+        print(f"   🔢 Token用量: prompt {usage.prompt_tokens} / completion {usage.completion_tokens}"
+              f"（{usage.calls}次调用）")
         print(f"   📈 已询问问题: {asked_count}/{total_count}")
         if total_count > 0:
             print(f"   🎯 完成率: {(asked_count/total_count*100):.1f}%")
         else:
             print(f"   ⚠️ 没有找到评分问题，请检查病例数据中的hidden_questions字段")
 
-    def _build_context_for_message(self, message_index: int, max_context: int = 5) -> str:
-        """为指定消息构建上下文"""
-        # 获取该消息及之前的对话记录
-        context_messages = self.conversation_history[:message_index + 1]
+    def get_total_pairs(self) -> int:
+        """获取一次完整评分需要评估的(消息, 问题点)对数量"""
+        user_count = sum(1 for msg in self.conversation_history if msg["role"] == "user")
+        return user_count * len(self.question_items)
+
+    def build_message_contexts(self, max_context: int = 5) -> List[Tuple[str, str]]:
+        """
+        一次遍历对话历史，为每条用户（医生）消息构建上下文
         
-        # 取最近的max_context条消息
-        recent_messages = context_messages[-max_context:]
-        context_parts = []
+        上下文为该消息之前最近的max_context条对话（消息本身单独作为"医生询问"发送，不再重复），
+        相同的上下文字符串经驻留共享同一对象
         
-        for msg in recent_messages:
+        Returns:
+            [(消息内容, 上下文)]，按消息顺序
+        """
+        contexts = []
+        window = deque(maxlen=max_context)
+        for msg in self.conversation_history:
+            if msg["role"] == "user":
+                contexts.append((msg["content"], sys.intern("\n".join(window))))
             role_name = "医生" if msg["role"] == "user" else "病人"
-            context_parts.append(f"{role_name}: {msg['content']}")
-        
-        return "\n".join(context_parts)
+            window.append(f"{role_name}: {msg['content']}")
+        return contexts
 
     def _build_context(self, max_messages: int = 5) -> str:
         """构建对话上下文"""
@@ -412,62 +621,36 @@ class IntelligentScoringSystem:
                 "message": "没有隐藏问题，满分"
             }
         
-        # 计算完全匹配分数
-        perfect_score = sum(item.weight for item in self.question_items if item.is_asked)
-        perfect_percentage = (perfect_score / self.total_weight) * 100
-        
-        # 计算部分匹配分数（新增）
-        partial_score = sum(item.get_partial_score() for item in self.question_items)
-        partial_percentage = (partial_score / self.total_weight) * 100
-        
-        # 按分类统计
-        category_stats = {}
-        for item in self.question_items:
-            if item.category not in category_stats:
-                category_stats[item.category] = {
-                    "total_questions": 0,
-                    "asked_questions": 0,
-                    "total_weight": 0,
-                    "asked_weight": 0,
-                    "partial_weight": 0,
-                    "avg_match_score": 0
-                }
-            
-            stats = category_stats[item.category]
-            stats["total_questions"] += 1
-            stats["total_weight"] += item.weight
-            stats["partial_weight"] += item.get_partial_score()
-            
-            if item.is_asked:
-                stats["asked_questions"] += 1
-                stats["asked_weight"] += item.weight
-        
-        # 计算各分类的完成率
-        for category, stats in category_stats.items():
-            if stats["total_weight"] > 0:
-                stats["perfect_completion_rate"] = (stats["asked_weight"] / stats["total_weight"]) * 100
-                stats["partial_completion_rate"] = (stats["partial_weight"] / stats["total_weight"]) * 100
-            else:
-                stats["perfect_completion_rate"] = 100
-                stats["partial_completion_rate"] = 100
-            
-            # 计算平均匹配分数
-            category_items = [item for item in self.question_items if item.category == category]
-            if category_items:
-                stats["avg_match_score"] = sum(item.best_match_score for item in category_items) / len(category_items)
+        from modules.score_aggregation import ItemColumns
+        return self._score_from_columns(ItemColumns.from_items(self.question_items))
+    
+    def _score_from_columns(self, columns) -> Dict[str, Any]:
+        """由问题点列式数据（ItemColumns）一次汇总出评分结果"""
+        from modules.score_aggregation import aggregate
+        totals = aggregate(columns)
+        perfect_percentage = totals["perfect_percentage"]
+        partial_percentage = totals["partial_percentage"]
+        perfect_score = totals["perfect_weight"]
+        partial_score = totals["partial_weight"]
+        category_stats = totals["category_stats"]
+        # 模型服务不可用时使用了本地降级评估的次数
+        degraded_evaluations = totals["degraded_evaluations"]
         
         return {
             "perfect_score": round(perfect_percentage, 2),
             "partial_score": round(partial_percentage, 2),
             "recommended_score": round(partial_percentage, 2),  # 推荐使用部分分数
-            "asked_questions": len([item for item in self.question_items if item.is_asked]),
-            "total_questions": len(self.question_items),
+            "asked_questions": totals["asked_questions"],
+            "total_questions": totals["total_questions"],
             "perfect_weight": perfect_score,
             "partial_weight": partial_score,
             "total_weight": self.total_weight,
             "category_stats": category_stats,
             "evaluation": self._get_evaluation(partial_percentage),
-            "scoring_method": "intelligent_partial_matching"
+            "scoring_method": "intelligent_partial_matching",
+            "degraded": degraded_evaluations > 0,
+            "degraded_evaluations": degraded_evaluations,
+            "token_usage": self.token_usage
         }
     
     def _get_evaluation(self, percentage: float) -> Dict[str, str]:
@@ -495,21 +678,16 @@ class IntelligentScoringSystem:
     
     def get_detailed_report(self) -> Dict[str, Any]:
         """获取详细评分报告"""
-        score_result = self.calculate_score()
-        
-        # 分类问题
-        fully_matched = []  # 完全匹配
-        partially_matched = []  # 部分匹配
-        missed_questions = []  # 未匹配
-        
-        for item in self.question_items:
-            item_dict = item.to_dict()
-            if item.is_asked:
-                fully_matched.append(item_dict)
-            elif item.best_match_score >= 30:  # 有一定匹配度但未达到阈值
-                partially_matched.append(item_dict)
-            else:
-                missed_questions.append(item_dict)
+        # numpy较重，首次生成报告时才导入，不拖慢服务启动
+        from modules.score_aggregation import ItemColumns
+        columns = ItemColumns.from_items(self.question_items)
+        score_result = self.calculate_score() if self.total_weight == 0 else self._score_from_columns(columns)
+        
+        # 分类问题：完全匹配 / 部分匹配（有一定匹配度但未达到阈值）/ 未匹配
+        partial_mask = ~columns.asked & (columns.best >= PARTIAL_MATCH_FLOOR)
+        fully_matched = [self.question_items[i].to_dict() for i in columns.asked.nonzero()[0]]
+        partially_matched = [self.question_items[i].to_dict() for i in partial_mask.nonzero()[0]]
+        missed_questions = [self.question_items[i].to_dict() for i in (~columns.asked & ~partial_mask).nonzero()[0]]
         
         return {
             "score_summary": score_result,
@@ -518,6 +696,7 @@ class IntelligentScoringSystem:
             "missed_questions": missed_questions,
             "conversation_count": len([msg for msg in self.conversation_history if msg["role"] == "user"]),
             "report_time": datetime.now().isoformat(),
+            "degraded": score_result.get("degraded", False),
             "case_info": {
                 "patient_name": self.case_data.get("basics", {}).get("name", "Unknown"),
                 "disease": self.case_data.get("disease", "Unknown"),
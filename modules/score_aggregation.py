@@ -0,0 +1,142 @@
+"""
+评分汇总
+把问题点整理成列式数组（权重、最佳匹配分、阈值、是否问到、分类编码），
+一次向量化计算得到总分和各分类统计；多个会话的列拼接后可一次算出整个班级的统计
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from modules.intelligent_scoring import PARTIAL_MATCH_FLOOR
+
+
+class ItemColumns:
+    """问题点的列式表示，每个数组长度为问题点数"""
+
+    __slots__ = ("weight", "best", "threshold", "asked", "degraded", "category_codes", "categories")
+
+    def __init__(self, weight, best, threshold, asked, degraded, category_codes, categories: List[str]):
+        self.weight = weight
+        self.best = best
+        self.threshold = threshold
+        self.asked = asked
+        self.degraded = degraded
+        self.category_codes = category_codes
+        self.categories = categories
+
+    @classmethod
+    def from_items(cls, items: Sequence[Any], category_index: Optional[Dict[str, int]] = None) -> "ItemColumns":
+        """
+        从问题点对象构建列
+
+        Args:
+            items: IntelligentQuestionItem 列表
+            category_index: 分类 → 编码，多会话共用同一映射时传入（按首次出现顺序编码）
+        """
+        index = {} if category_index is None else category_index
+        # 一次遍历取出所有数值字段，再按列切分
+        rows = np.array([(item.weight, item.best_match_score, item.threshold, item.is_asked,
+                          item.degraded_evaluations, index.setdefault(item.category, len(index)))
+                         for item in items], dtype=np.float64).reshape(len(items), 6)
+        return cls(
+            weight=rows[:, 0],
+            best=rows[:, 1],
+            threshold=rows[:, 2],
+            asked=rows[:, 3].astype(bool),
+            degraded=rows[:, 4].astype(np.int64),
+            category_codes=rows[:, 5].astype(np.int64),
+            categories=list(index)
+        )
+
+    @classmethod
+    def concat(cls, columns: Sequence["ItemColumns"]) -> "ItemColumns":
+        """拼接多个会话的列（各会话需使用同一分类映射构建）"""
+        categories = max((c.categories for c in columns), key=len, default=[])
+        return cls(
+            weight=np.concatenate([c.weight for c in columns]),
+            best=np.concatenate([c.best for c in columns]),
+            threshold=np.concatenate([c.threshold for c in columns]),
+            asked=np.concatenate([c.asked for c in columns]),
+            degraded=np.concatenate([c.degraded for c in columns]),
+            category_codes=np.concatenate([c.category_codes for c in columns]),
+            categories=categories
+        )
+
+    def __len__(self):
+        return len(self.weight)
+
+    def partial_weights(self):
+        """每个问题点的部分得分：过阈值得全部权重，达到下限按最佳匹配分比例，否则为0"""
+        return np.where(self.best >= self.threshold, self.weight,
+                        np.where(self.best >= PARTIAL_MATCH_FLOOR, self.weight * (self.best / 100), 0.0))
+
+
+def _category_stats(columns: ItemColumns, partial) -> Dict[str, Dict[str, Any]]:
+    """按分类编码一次汇总各项统计（独热矩阵乘以数值列），分类按首次出现顺序输出"""
+    one_hot = columns.category_codes[:, None] == np.arange(len(columns.categories))
+    values = np.column_stack((np.ones(len(columns)), columns.asked, columns.weight,
+                              columns.weight * columns.asked, partial, columns.best))
+    sums = (one_hot.T.astype(np.float64) @ values).tolist()
+
+    stats = {}
+    for category, (count, asked, weight, asked_weight, partial_weight, best_sum) in zip(columns.categories, sums):
+        if count == 0:
+            continue
+        stats[category] = {
+            "total_questions": int(count),
+            "asked_questions": int(asked),
+            "total_weight": weight,
+            "asked_weight": asked_weight,
+            "partial_weight": partial_weight,
+            "avg_match_score": best_sum / count,
+            "perfect_completion_rate": asked_weight / weight * 100 if weight > 0 else 100,
+            "partial_completion_rate": partial_weight / weight * 100 if weight > 0 else 100
+        }
+    return stats
+
+
+def aggregate(columns: ItemColumns) -> Dict[str, Any]:
+    """单个会话的总分与分类统计（一次向量化计算）"""
+    partial = columns.partial_weights()
+    total_weight = float(columns.weight.sum())
+    perfect_weight = float(columns.weight[columns.asked].sum())
+    partial_weight = float(partial.sum())
+    return {
+        "perfect_weight": perfect_weight,
+        "partial_weight": partial_weight,
+        "total_weight": total_weight,
+        "perfect_percentage": perfect_weight / total_weight * 100 if total_weight else 100.0,
+        "partial_percentage": partial_weight / total_weight * 100 if total_weight else 100.0,
+        "asked_questions": int(columns.asked.sum()),
+        "total_questions": len(columns),
+        "degraded_evaluations": int(columns.degraded.sum()),
+        "category_stats": _category_stats(columns, partial)
+    }
+
+
+def aggregate_cohort(sessions: Sequence[ItemColumns]) -> Dict[str, Any]:
+    """
+    多个会话一次汇总：各会话的部分得分率，以及全体问题点按分类合并的完成率
+
+    各会话的列需用同一个 category_index 构建，分类编码才一致
+    """
+    if not sessions:
+        return {"sessions": 0, "scores": [], "mean_score": 0.0, "median_score": 0.0, "category_stats": {}}
+
+    merged = ItemColumns.concat(sessions)
+    session_codes = np.repeat(np.arange(len(sessions)), [len(c) for c in sessions])
+    partial = merged.partial_weights()
+    weight_by_session = np.bincount(session_codes, weights=merged.weight, minlength=len(sessions))
+    partial_by_session = np.bincount(session_codes, weights=partial, minlength=len(sessions))
+    scores = np.divide(partial_by_session * 100, weight_by_session,
+                       out=np.full(len(sessions), 100.0), where=weight_by_session > 0)
+    return {
+        "sessions": len(sessions),
+        "scores": [round(float(score), 2) for score in scores],
+        "mean_score": round(float(scores.mean()), 2),
+        "median_score": round(float(np.median(scores)), 2),
+        "p10_score": round(float(np.percentile(scores, 10)), 2),
+        "p90_score": round(float(np.percentile(scores, 90)), 2),
+        "category_stats": _category_stats(merged, partial)
+    }
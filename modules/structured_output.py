@@ -0,0 +1,203 @@
+"""
+结构化输出解析
+从模型回复中提取JSON对象：去掉Markdown代码块，按括号配对找到第一个完整对象，
+对截断的输出补全未闭合的字符串和括号；再按字段模式做类型转换、范围裁剪和默认值填充
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+PARSE_DIRECT = "direct"      # 整段回复即合法JSON
+PARSE_EXTRACTED = "extracted"  # 从前后文字或代码块中提取
+PARSE_REPAIRED = "repaired"    # 截断或尾逗号等问题已修复
+PARSE_FAILED = "failed"
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _scan(text: str, start: int = 0) -> Tuple[int, List[str], bool, bool]:
+    """
+    从start处扫描JSON文本，跟踪字符串和括号嵌套
+
+    Returns:
+        (首个对象闭合处的下标或-1, 未闭合括号栈, 是否停在字符串内, 是否停在转义符后)
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return i, stack, False, False
+    return -1, stack, in_string, escaped
+
+
+def _drop_unterminated_scalar(fragment: str) -> str:
+    """
+    片段以未终止的数字或字面量结尾时（如 "overall_score": 8 可能原本是85），
+    去掉这最后一个字段，只保留后面跟着 , } ] 的完整值
+    """
+    stripped = fragment.rstrip()
+    if not stripped or stripped[-1] in ',:{["}]':
+        return fragment
+    # 最后一个字符串外的 , { [ 之后即是被截断的字段
+    last = -1
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(stripped):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in ",{[":
+            last = i
+    if last < 0:
+        return ""
+    return stripped[:last] if stripped[last] == "," else stripped[:last + 1]
+
+
+def _close(fragment: str) -> str:
+    """补全截断片段：丢弃未终止的数字/字面量字段，闭合字符串，去掉悬空的逗号/冒号，再按嵌套闭合括号"""
+    _, stack, in_string, escaped = _scan(fragment)
+    if not in_string:
+        fragment = _drop_unterminated_scalar(fragment)
+        _, stack, _, _ = _scan(fragment)
+    if escaped:
+        fragment = fragment[:-1]
+    if in_string:
+        fragment += '"'
+    return re.sub(r"[,:\s]+$", "", fragment) + "".join(reversed(stack))
+
+
+def _repair_candidates(fragment: str, max_cuts: int = 5):
+    """截断对象的修复候选：先直接补全，再逐次回退到上一个逗号丢弃不完整的字段"""
+    yield _close(fragment)
+    for _ in range(max_cuts):
+        cut = fragment.rfind(",")
+        if cut <= 0:
+            return
+        fragment = fragment[:cut]
+        yield _close(fragment)
+
+
+def parse_json_object(text: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    从模型回复中解析第一个JSON对象
+
+    Returns:
+        (解析结果或None, 解析方式 direct/extracted/repaired/failed)
+    """
+    if not text:
+        return None, PARSE_FAILED
+
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            result = json.loads(stripped)
+            if isinstance(result, dict):
+                return result, PARSE_DIRECT
+        except json.JSONDecodeError:
+            pass
+
+    fence = _FENCE.search(stripped)
+    body = fence.group(1) if fence else stripped
+    start = body.find("{")
+    if start < 0:
+        return None, PARSE_FAILED
+
+    end, _, _, _ = _scan(body, start)
+    if end >= 0:
+        candidates = [(body[start:end + 1], PARSE_EXTRACTED)]
+    else:
+        candidates = [(candidate, PARSE_REPAIRED) for candidate in _repair_candidates(body[start:])]
+
+    for candidate, method in candidates:
+        for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+            try:
+                result = json.loads(attempt)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(result, dict):
+                return result, method if attempt is candidate else PARSE_REPAIRED
+    return None, PARSE_FAILED
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        return float(match.group()) if match else None
+    return None
+
+
+def _to_bool(value: Any) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ("true", "yes", "是", "1", "匹配"):
+            return True
+        if lowered in ("false", "no", "否", "0", "不匹配"):
+            return False
+    return None
+
+
+def validate_schema(data: Dict[str, Any], schema: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    按字段模式校验并规范化结果
+
+    schema: {字段: {"type": "number"|"bool"|"string", "default": 默认值, "min": 下限, "max": 上限}}
+
+    Returns:
+        (规范化后的结果, 缺失或无法识别而使用了默认值的字段列表)
+    """
+    result = dict(data)
+    issues = []
+    for field, spec in schema.items():
+        kind = spec["type"]
+        value = data.get(field)
+        if kind == "number":
+            converted = _to_number(value)
+            if converted is not None:
+                if "min" in spec:
+                    converted = max(spec["min"], converted)
+                if "max" in spec:
+                    converted = min(spec["max"], converted)
+        elif kind == "bool":
+            converted = _to_bool(value)
+        else:
+            converted = value if isinstance(value, str) else (None if value is None else str(value))
+
+        if converted is None:
+            converted = spec["default"]
+            issues.append(field)
+        result[field] = converted
+    return result, issues
@@ -0,0 +1 @@
+# 可观测性：进程内指标
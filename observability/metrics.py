@@ -0,0 +1,281 @@
+"""
+进程内指标
+提供计数器、仪表和直方图，按Prometheus文本格式导出（/metrics），
+直方图同时保留最近样本窗口，用于直接给出p50/p95/p99
+"""
+import math
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认延迟分桶（秒），覆盖从毫秒级接口到分钟级评分
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    # Prometheus文本格式的特殊值写法
+    if math.isnan(value):
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """带标签的指标基类，每组标签值对应一个子指标"""
+
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for key, child in sorted(self._items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"]
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def get(self) -> float:
+        return self._value
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    TYPE = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self.labels(**labels).inc(amount)
+
+
+class _GaugeChild(_Value):
+    def __init__(self):
+        super().__init__()
+        self._function: Optional[Callable[[], float]] = None
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """导出时调用函数取值（如当前会话数）"""
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return math.nan
+        return self._value
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    TYPE = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float, **labels) -> None:
+        self.labels(**labels).set(value)
+
+    def set_function(self, function: Callable[[], float], **labels) -> None:
+        self.labels(**labels).set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float], window: int):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            self._sum += value
+            self._count += 1
+            self._recent.append(value)
+
+    def state(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count, sorted(self._recent)
+
+
+class Histogram(_Metric):
+    """分桶直方图，额外保留最近window个样本计算分位数"""
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, window: int = 2048):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self.window)
+
+    def observe(self, value: float, **labels) -> None:
+        self.labels(**labels).observe(value)
+
+    def _render_child(self, key, child) -> List[str]:
+        counts, total, count, _ = child.state()
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def summary(self) -> List[Dict]:
+        """各标签组合的样本数、均值和近期分位数"""
+        result = []
+        for key, child in sorted(self._items()):
+            _, total, count, recent = child.state()
+            entry = {"labels": dict(zip(self.labelnames, key)), "count": count,
+                     "mean": round(total / count, 4) if count else 0.0}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = round(recent[min(len(recent) - 1, int(q * len(recent)))], 4) if recent else 0.0
+            result.append(entry)
+        return result
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标重复注册时返回已有实例"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, object]:
+        """JSON友好的快照，直方图给出分位数"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                result[metric.name] = metric.summary()
+            else:
+                result[metric.name] = [{"labels": dict(zip(metric.labelnames, key)), "value": child.get()}
+                                       for key, child in sorted(metric._items())]
+        return result
+
+
+REGISTRY = MetricsRegistry()
+
+# 模型调用
+ENGINE_CALL_SECONDS = REGISTRY.histogram(
+    "sp_engine_call_seconds", "模型调用耗时（含重试），按用途、模型和结果区分",
+    ["purpose", "model", "outcome"])
+ENGINE_TOKENS = REGISTRY.histogram(
+    "sp_engine_tokens", "单次模型调用的token数，kind为prompt或completion",
+    ["purpose", "model", "kind"], buckets=TOKEN_BUCKETS)
+
+# 评分
+SCORING_PAIRS = REGISTRY.counter(
+    "sp_scoring_pairs_total", "已评估的(消息, 问题点)对数，mode为ai、degraded（模型服务不可用）或fallback（其他原因的本地评估）", ["mode"])
+SCORING_PARSE = REGISTRY.counter(
+    "sp_scoring_parse_total", "评分回复的解析结果，outcome为direct/extracted/repaired/failed", ["outcome"])
+SCORING_RUN_SECONDS = REGISTRY.histogram(
+    "sp_scoring_run_seconds", "一次完整评分计算的耗时")
+SCORING_RUN_TOKENS = REGISTRY.histogram(
+    "sp_scoring_run_tokens", "一次完整评分计算消耗的token数，kind为prompt或completion",
+    ["kind"], buckets=(1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000))
+CACHE_REQUESTS = REGISTRY.counter(
+    "sp_cache_requests_total", "缓存查询次数，result为hit或miss", ["cache", "result"])
+
+# 会话与HTTP
+ACTIVE_SESSIONS = REGISTRY.gauge("sp_active_sessions", "当前活跃的SP会话数")
+SESSIONS_CREATED = REGISTRY.counter("sp_sessions_created_total", "累计创建的SP会话数")
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "sp_http_request_seconds", "HTTP请求处理耗时，按蓝图、方法和状态码区分",
+    ["blueprint", "method", "status"])
@@ -0,0 +1,260 @@
+"""
+轻量请求追踪
+通过contextvars在API → 服务 → 病人 → 引擎 → 评分之间传递当前span，
+慢请求的完整span树保存在内存环形缓冲区中（可选写入JSONL文件）。
+
+未采样的请求只多一次contextvar读取，span()直接返回共享的空上下文。
+
+环境变量:
+    TRACE_SAMPLE_RATE  采样率 0~1，默认0（关闭；请求头 X-Trace: 1 可强制采样）
+    TRACE_SLOW_MS      超过该耗时的追踪进入缓冲区，默认1000
+    TRACE_BUFFER_SIZE  缓冲区保留的慢追踪数，默认100
+    TRACE_EXPORT_PATH  设置后慢追踪同时追加写入该JSONL文件
+"""
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# 单个追踪最多记录的span数，超出部分只计数（评分一次可能有上百个评估对）
+MAX_SPANS_PER_TRACE = 500
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """追踪中的一个计时片段"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "duration", "attributes", "error", "_token")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration = time.time() - self.start
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # 在其他上下文中结束（如流式响应结束时），只需清除当前span
+            _current_span.set(None)
+        self.trace.add_span(self)
+        if self.parent_id is None:
+            self.trace.finish(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round((self.duration or 0.0) * 1000, 2),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class _NoopSpan:
+    """未采样时使用的空span"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """一次请求（或后台任务）的完整追踪"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span) -> None:
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def finish(self, root: Span) -> None:
+        self.duration = root.duration
+        get_tracer().record(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start_time": datetime.fromtimestamp(self.start).isoformat(),
+            "duration_ms": round((self.duration or 0.0) * 1000, 2),
+            "span_count": len(spans),
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict() for span in spans]
+        }
+
+
+class Tracer:
+    """采样决策与慢追踪缓冲区"""
+
+    def __init__(self, sample_rate: float = 0.0, slow_threshold: float = 1.0, buffer_size: int = 100,
+                 export_path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.export_path = export_path
+        self._slow_traces = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._stats = {"sampled": 0, "slow": 0}
+
+    def should_sample(self, force: bool = False) -> bool:
+        return force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def record(self, trace: Trace) -> None:
+        """追踪结束：超过慢阈值的进入缓冲区并导出"""
+        with self._lock:
+            self._stats["sampled"] += 1
+            if (trace.duration or 0.0) < self.slow_threshold:
+                return
+            self._stats["slow"] += 1
+            self._slow_traces.append(trace)
+        if self.export_path:
+            self._export(trace)
+
+    def _export(self, trace: Trace) -> None:
+        try:
+            line = json.dumps(trace.to_dict(), ensure_ascii=False)
+            with self._lock, open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️ 追踪导出失败: {e}")
+
+    def recent_slow_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近的慢追踪摘要（最新在前）"""
+        with self._lock:
+            traces = list(self._slow_traces)[-limit:]
+        return [{
+            "trace_id": t.trace_id,
+            "name": t.name,
+            "start_time": datetime.fromtimestamp(t.start).isoformat(),
+            "duration_ms": round((t.duration or 0.0) * 1000, 2),
+            "span_count": len(t.spans)
+        } for t in reversed(traces)]
+
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for trace in self._slow_traces:
+                if trace.trace_id == trace_id:
+                    return trace.to_dict()
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "slow_threshold_ms": round(self.slow_threshold * 1000),
+                "buffered": len(self._slow_traces),
+                "export_path": self.export_path,
+                **self._stats
+            }
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """获取进程级追踪器（首次调用时按环境变量创建）"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(
+                    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", 0)),
+                    slow_threshold=float(os.getenv("TRACE_SLOW_MS", 1000)) / 1000.0,
+                    buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", 100)),
+                    export_path=os.getenv("TRACE_EXPORT_PATH") or None
+                )
+    return _tracer
+
+
+def configure_tracer(**kwargs) -> Tracer:
+    """替换进程级追踪器（测试和基准使用）"""
+    global _tracer
+    with _tracer_lock:
+        _tracer = Tracer(**kwargs)
+    return _tracer
+
+
+def start_trace(name: str, force: bool = False, **attributes):
+    """开始一个新追踪，返回根span；未采样时返回空span"""
+    if not get_tracer().should_sample(force):
+        return NOOP_SPAN
+    return Span(Trace(name), name, None, attributes)
+
+
+def span(name: str, **attributes):
+    """在当前追踪下开始子span；当前请求未被采样时返回空span"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def traced(name: Optional[str] = None):
+    """函数装饰器：调用包在同名span中"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace_id() -> Optional[str]:
+    """当前追踪ID，未采样时为None"""
+    current = _current_span.get()
+    return current.trace.trace_id if current is not None else None
@@ -30,8 +30,12 @@ os.environ['OPENAI_API_KEY'] = "sk-pkas0IqXTrYRK17XxTu7sLxW3yAtPvHxuVzj6n4usoMpD
 
 
 class ServiceManager:
-    def __init__(self):
+    def __init__(self, production=False):
         self.project_root = Path(__file__).parent
+        # 生产模式用 backend/serve.py（多线程WSGI服务器）代替Flask开发服务器
+        self.production = production
+        # 生产模式停止时会等待进行中的请求，留出优雅停止时间
+        self.backend_stop_timeout = float(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 30)) + 5 if production else 5
         self.backend_process = None
         self.frontend_process = None
         self.running = True
@@ -102,6 +106,7 @@ class ServiceManager:
         # 检查关键文件
         required_files = [
             'backend/app.py',
+            'backend/serve.py',
             'frontend/index.html',
             'frontend/server.py'
         ]
@@ -144,11 +149,14 @@ class ServiceManager:
         """启动后端服务"""
         self.logger.info("启动后端服务...")
         
-        backend_script = self.project_root / 'backend' / 'app.py'
+        if self.production:
+            backend_cmd = [self.python_cmd, str(self.project_root / 'backend' / 'serve.py'), '--port', '3000']
+        else:
+            backend_cmd = [self.python_cmd, str(self.project_root / 'backend' / 'app.py')]
         
         try:
             self.backend_process = subprocess.Popen(
-                [self.python_cmd, str(backend_script)],
+                backend_cmd,
                 cwd=str(self.project_root),
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
@@ -160,11 +168,9 @@ class ServiceManager:
             # 启动输出监控
             self._log_process_output(self.backend_process, self.backend_logger, "Backend")
             
-            # 等待后端启动
+            # 等待后端就绪（轮询健康检查，而不是固定等待）
             self.logger.info("等待后端服务启动...")
-            time.sleep(3)
-            
-            if self.backend_process.poll() is None:
+            if self.wait_until_ready('backend', self.backend_process):
                 self.backend_logger.info("后端服务启动成功 (端口: 3000)")
                 return True
             else:
@@ -197,11 +203,9 @@ class ServiceManager:
             # 启动输出监控
             self._log_process_output(self.frontend_process, self.frontend_logger, "Frontend")
             
-            # 等待前端启动
+            # 等待前端就绪
             self.logger.info("等待前端服务启动...")
-            time.sleep(2)
-            
-            if self.frontend_process.poll() is None:
+            if self.wait_until_ready('frontend', self.frontend_process):
                 self.frontend_logger.info("前端服务启动成功 (端口: 8080)")
                 return True
             else:
@@ -214,19 +218,40 @@ class ServiceManager:
             self.frontend_logger.error(f"详细错误信息:\n{traceback.format_exc()}")
             return False
     
-    def check_service_health(self, service_type):
-        """检查服务健康状态"""
+    def check_service_health(self, service_type, timeout=5, probe='ready'):
+        """
+        检查服务健康状态
+        后端 probe='ready' 使用就绪检查（预热完成前和优雅停止期间返回503，用于启动等待），
+        probe='live' 使用存活检查（只要进程能处理请求即返回200，用于运行期监控）
+        """
         try:
             if service_type == 'backend':
-                response = requests.get('http://localhost:3000/api/health', timeout=5)
+                response = requests.get(f'http://localhost:3000/api/health/{probe}', timeout=timeout)
                 return response.status_code == 200
             elif service_type == 'frontend':
-                response = requests.get('http://localhost:8080', timeout=5)
+                response = requests.get('http://localhost:8080', timeout=timeout)
                 return response.status_code == 200
         except:
             return False
         return False
     
+    def wait_until_ready(self, service_type, process, timeout=None, interval=0.1):
+        """
+        轮询健康检查直到服务就绪
+        进程提前退出或超过 timeout（默认 STARTUP_TIMEOUT 环境变量，30秒）返回False
+        """
+        timeout = timeout or float(os.environ.get('STARTUP_TIMEOUT', 30))
+        start = time.time()
+        while time.time() - start < timeout:
+            if process.poll() is not None:
+                return False
+            if self.check_service_health(service_type, timeout=1):
+                self.logger.info(f"{service_type} 就绪，耗时 {time.time() - start:.2f}秒")
+                return True
+            time.sleep(interval)
+        self.logger.error(f"{service_type} 在 {timeout:.0f} 秒内未就绪")
+        return False
+    
     def restart_service(self, service_type):
         """重启指定服务"""
         if service_type == 'backend':
@@ -240,7 +265,7 @@ class ServiceManager:
             if self.backend_process:
                 try:
                     self.backend_process.terminate()
-                    self.backend_process.wait(timeout=5)
+                    self.backend_process.wait(timeout=self.backend_stop_timeout)
                 except:
                     try:
                         self.backend_process.kill()
@@ -289,10 +314,17 @@ class ServiceManager:
         pass
     
     def monitor_services(self):
-        """监控服务状态"""
-        check_interval = 30  # 减少检查频率到30秒
+        """
+        监控服务状态
+        运行期只看存活检查：未就绪（如模型服务熔断、优雅停止中）不代表进程卡死，不应重启；
+        存活检查连续失败 LIVENESS_FAILURE_THRESHOLD 次（默认3次）才重启，偶发超时不触发重启
+        """
+        # 存活检查很轻量（不清理会话、不访问模型服务），可以频繁检查
+        check_interval = float(os.environ.get('MONITOR_INTERVAL', 5))
+        liveness_failure_threshold = max(1, int(os.environ.get('LIVENESS_FAILURE_THRESHOLD', 3)))
         print("🔍 开始监控服务状态...")
         consecutive_failures = {'backend': 0, 'frontend': 0}
+        health_failures = {'backend': 0, 'frontend': 0}
         max_consecutive_failures = 3
         
         while self.running:
@@ -304,10 +336,11 @@ class ServiceManager:
             try:
                 # 检查后端进程状态
                 backend_process_alive = self.backend_process and self.backend_process.poll() is None
-                backend_health = self.check_service_health('backend')
+                backend_health = self.check_service_health('backend', probe='live')
                 
                 if not backend_process_alive:
                     self.logger.error("❌ 后端进程已停止")
+                    health_failures['backend'] = 0
                     consecutive_failures['backend'] += 1
                     if consecutive_failures['backend'] <= max_consecutive_failures:
                         if self.restart_service('backend'):
@@ -316,21 +349,28 @@ class ServiceManager:
                         else:
                             self.logger.error(f"❌ 后端服务重启失败 (尝试 {consecutive_failures['backend']}/{max_consecutive_failures})")
                 elif not backend_health:
-                    consecutive_failures['backend'] += 1
-                    if consecutive_failures['backend'] <= max_consecutive_failures:
-                        self.logger.warning(f"⚠️ 后端健康检查失败 (尝试 {consecutive_failures['backend']}/{max_consecutive_failures})")
-                        if self.restart_service('backend'):
-                            consecutive_failures['backend'] = 0
-                            print("✅ 后端服务重启成功")
+                    health_failures['backend'] += 1
+                    self.logger.warning(f"⚠️ 后端存活检查失败 ({health_failures['backend']}/{liveness_failure_threshold})")
+                    if health_failures['backend'] >= liveness_failure_threshold:
+                        health_failures['backend'] = 0
+                        consecutive_failures['backend'] += 1
+                        if consecutive_failures['backend'] <= max_consecutive_failures:
+                            if self.restart_service('backend'):
+                                consecutive_failures['backend'] = 0
+                                print("✅ 后端服务重启成功")
+                            else:
+                                self.logger.error(f"❌ 后端服务重启失败 (尝试 {consecutive_failures['backend']}/{max_consecutive_failures})")
                 else:
+                    health_failures['backend'] = 0
                     consecutive_failures['backend'] = 0
                 
                 # 检查前端进程状态
                 frontend_process_alive = self.frontend_process and self.frontend_process.poll() is None
-                frontend_health = self.check_service_health('frontend')
+                frontend_health = self.check_service_health('frontend', probe='live')
                 
                 if not frontend_process_alive:
                     self.logger.error("❌ 前端进程已停止")
+                    health_failures['frontend'] = 0
                     consecutive_failures['frontend'] += 1
                     if consecutive_failures['frontend'] <= max_consecutive_failures:
                         if self.restart_service('frontend'):
@@ -339,13 +379,19 @@ class ServiceManager:
                         else:
                             self.logger.error(f"❌ 前端服务重启失败 (尝试 {consecutive_failures['frontend']}/{max_consecutive_failures})")
                 elif not frontend_health:
-                    consecutive_failures['frontend'] += 1
-                    if consecutive_failures['frontend'] <= max_consecutive_failures:
-                        self.logger.warning(f"⚠️ 前端健康检查失败 (尝试 {consecutive_failures['frontend']}/{max_consecutive_failures})")
-                        if self.restart_service('frontend'):
-                            consecutive_failures['frontend'] = 0
-                            print("✅ 前端服务重启成功")
+                    health_failures['frontend'] += 1
+                    self.logger.warning(f"⚠️ 前端存活检查失败 ({health_failures['frontend']}/{liveness_failure_threshold})")
+                    if health_failures['frontend'] >= liveness_failure_threshold:
+                        health_failures['frontend'] = 0
+                        consecutive_failures['frontend'] += 1
+                        if consecutive_failures['frontend'] <= max_consecutive_failures:
+                            if self.restart_service('frontend'):
+                                consecutive_failures['frontend'] = 0
+                                print("✅ 前端服务重启成功")
+                            else:
+                                self.logger.error(f"❌ 前端服务重启失败 (尝试 {consecutive_failures['frontend']}/{max_consecutive_failures})")
                 else:
+                    health_failures['frontend'] = 0
                     consecutive_failures['frontend'] = 0
                 
                 # 只在达到最大重试次数时才退出
@@ -373,7 +419,7 @@ class ServiceManager:
         if self.backend_process:
             try:
                 self.backend_process.terminate()
-                self.backend_process.wait(timeout=5)
+                self.backend_process.wait(timeout=self.backend_stop_timeout)
                 self.backend_logger.info("后端服务已停止")
             except subprocess.TimeoutExpired:
                 self.backend_process.kill()
@@ -400,6 +446,7 @@ class ServiceManager:
         self.logger.info(f"Python版本: {sys.version}")
         self.logger.info(f"工作目录: {self.project_root}")
         self.logger.info(f"Python解释器: {self.python_cmd}")
+        self.logger.info(f"后端服务器: {'生产 (backend/serve.py)' if self.production else 'Flask开发服务器'}")
         self.logger.info("=" * 60)
     
     def run(self):
@@ -601,8 +648,9 @@ def main():
         print("   请解决端口占用问题后重试")
         return
     
-    # 启动服务管理器
-    manager = ServiceManager()
+    # 启动服务管理器（--production 或 BACKEND_SERVER=production 时使用生产服务器）
+    production = '--production' in sys.argv[1:] or os.environ.get('BACKEND_SERVER', '').lower() == 'production'
+    manager = ServiceManager(production=production)
     manager.run()
 
 if __name__ == '__main__':
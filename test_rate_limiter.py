@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+限速器测试
+- 一次很快返回的429之后，正常延迟的成功调用应使窗口恢复增长，而不是被当作"变慢"持续减窗
+- 对话与评分混合流量下，较慢的评分调用不应使窗口持续缩小
+- 在本地限速器排队超时不计入模型服务熔断
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from engine import rate_limiter
+from engine.rate_limiter import RateLimiter, configure_rate_limiter
+from engine.resilience import LocalDeadlineExceeded
+
+
+class FakeClock:
+    """替换限速器的 time.monotonic，按指定延迟推进"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _call(limiter, clock, latency, throttled=False, purpose="chat"):
+    try:
+        with limiter.slot(purpose):
+            clock.now += latency
+            if throttled:
+                limiter.record_throttled()
+                raise RuntimeError("429 Too Many Requests")
+    except RuntimeError:
+        pass
+
+
+def test_throttled_call_does_not_reset_latency_baseline():
+    """429之后窗口只按退避缩小一次，正常调用继续加性增大"""
+    print("🧪 429后自适应窗口恢复测试")
+    clock = FakeClock()
+    original = rate_limiter.time.monotonic
+    rate_limiter.time.monotonic = clock
+    try:
+        limiter = RateLimiter(initial_concurrency=8, max_concurrency=32)
+        for _ in range(40):
+            _call(limiter, clock, 1.0)
+        steady = limiter.snapshot()["concurrency_window"]
+
+        _call(limiter, clock, 0.005, throttled=True)
+        after_throttle = limiter.snapshot()["concurrency_window"]
+        assert after_throttle == max(1, int(limiter._concurrency.limit))
+        assert limiter._concurrency.baseline_latency["chat"] > 0.5, "失败调用的延迟不应计入基线"
+
+        for _ in range(20):
+            _call(limiter, clock, 1.0)
+        recovered = limiter.snapshot()["concurrency_window"]
+    finally:
+        rate_limiter.time.monotonic = original
+
+    print(f"   稳定窗口: {steady}  429后: {after_throttle}  20次正常调用后: {recovered}")
+    assert after_throttle < steady
+    assert recovered > after_throttle, "正常延迟的成功调用应使窗口增长"
+    print("✅ 通过")
+
+
+def test_mixed_purposes_keep_separate_baselines():
+    """短对话（0.5秒）与长评分（3秒）交替时，窗口应持续增长"""
+    print("🧪 对话/评分混合流量窗口测试")
+    clock = FakeClock()
+    original = rate_limiter.time.monotonic
+    rate_limiter.time.monotonic = clock
+    try:
+        limiter = RateLimiter(initial_concurrency=8, max_concurrency=32)
+        start = limiter.snapshot()["concurrency_window"]
+        for _ in range(40):
+            _call(limiter, clock, 0.5, purpose="chat")
+            _call(limiter, clock, 3.0, purpose="scoring")
+        snapshot = limiter.snapshot()
+    finally:
+        rate_limiter.time.monotonic = original
+
+    print(f"   初始窗口: {start}  80次混合调用后: {snapshot['concurrency_window']}  基线: {snapshot['baseline_latency']}")
+    assert snapshot["concurrency_window"] > start, "正常的评分延迟不应被当作排队变慢"
+    print("✅ 通过")
+
+
+def test_limiter_queue_timeout_does_not_open_breaker():
+    """限速器排满时调用以LocalDeadlineExceeded失败，熔断器保持闭合"""
+    print("🧪 本地排队超时与熔断测试")
+    from engine.gpt import GPTEngine
+
+    limiter = configure_rate_limiter(initial_concurrency=1, min_concurrency=1, max_concurrency=1,
+                                     chat_reserved_slots=0)
+    held = limiter.acquire()
+    try:
+        engine = GPTEngine(model_base="http://limiter-queue.test", timeout=0.1, max_attempts=1)
+        engine.circuit_breaker.failure_threshold = 2
+        failures = 0
+        for _ in range(4):
+            try:
+                engine.get_response([{"role": "user", "content": "ping"}])
+            except LocalDeadlineExceeded:
+                failures += 1
+        state = engine.circuit_breaker.state
+    finally:
+        limiter.release(held)
+        configure_rate_limiter()
+
+    print(f"   排队超时: {failures}  熔断器状态: {state}")
+    assert failures == 4
+    assert state == "closed", "本地排队超时不应使熔断器断开"
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    test_throttled_call_does_not_reset_latency_baseline()
+    test_mixed_purposes_keep_separate_baselines()
+    test_limiter_queue_timeout_does_not_open_breaker()